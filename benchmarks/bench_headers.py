@@ -0,0 +1,37 @@
+"""
+Micro-benchmark of header tag decoding.
+
+Builds headers with a growing number of file entries and times decoding
+every tag. Time per entry should stay flat as the entry count grows.
+
+    $ python -m benchmarks.bench_headers
+"""
+
+import io
+import sys
+import timeit
+
+from rpmfile.headers import read_headers
+
+from tests.synthetic import File, build_rpm
+
+
+def decode_all(data):
+    _, (_, header) = read_headers(io.BytesIO(data))
+    for key in header:
+        header[key]
+
+
+def main(counts=(1000, 2000, 4000, 8000, 16000, 32000)):
+    print("%8s %12s %14s" % ("entries", "seconds", "us per entry"))
+    for count in counts:
+        files = [File("/usr/share/bench/%06d" % i, b"x") for i in range(count)]
+        data = build_rpm(files, compression=None)
+        number = max(1, 64000 // count)
+        seconds = min(timeit.repeat(lambda: decode_all(data), number=number, repeat=3))
+        seconds /= number
+        print("%8d %12.6f %14.3f" % (count, seconds, seconds / count * 1e6))
+
+
+if __name__ == "__main__":
+    main(*[tuple(int(c) for c in sys.argv[1:])] if sys.argv[1:] else [])
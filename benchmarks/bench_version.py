@@ -0,0 +1,55 @@
+"""
+Benchmark of sorting EVRs and reducing them to the latest per name.
+
+Generates version strings shaped like those of a distribution, with many
+repeats, and times parsing them into EVRs, sorting them and latest().
+
+    $ python -m benchmarks.bench_version [count]
+"""
+
+import random
+import sys
+import time
+
+from rpmfile.version import EVR, latest
+
+
+def evrs(count, seed=0):
+    rng = random.Random(seed)
+    versions = [
+        "%d.%d.%d" % (rng.randrange(10), rng.randrange(30), rng.randrange(100))
+        for _ in range(2000)
+    ]
+    versions += [v + "~rc%d" % rng.randrange(1, 4) for v in versions[:100]]
+    releases = ["%d.fc%d" % (r, d) for r in range(1, 30) for d in range(36, 42)]
+    return [
+        "%s%s-%s"
+        % (
+            "1:" if rng.random() < 0.05 else "",
+            rng.choice(versions),
+            rng.choice(releases),
+        )
+        for _ in range(count)
+    ]
+
+
+def main(count=1000000):
+    strings = evrs(count)
+    start = time.perf_counter()
+    parsed = [EVR.parse(s) for s in strings]
+    parse = time.perf_counter() - start
+    start = time.perf_counter()
+    parsed.sort(key=lambda evr: evr.key)
+    sort = time.perf_counter() - start
+    packages = [
+        ("pkg%d" % (i % (count // 10 or 1)), evr) for i, evr in enumerate(parsed)
+    ]
+    start = time.perf_counter()
+    latest(packages, keep=3)
+    reduce = time.perf_counter() - start
+    print("%10s %10s %10s %10s" % ("evrs", "parse", "sort", "latest"))
+    print("%10d %9.3fs %9.3fs %9.3fs" % (count, parse, sort, reduce))
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
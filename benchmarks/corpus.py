@@ -0,0 +1,141 @@
+"""
+Generate synthetic RPMs for benchmarking from a handful of parameters.
+
+    $ python -m benchmarks.corpus --files 1000 --size 4096 --compression xz out.rpm
+"""
+
+import argparse
+import random
+
+from tests.synthetic import STRING_ARRAY, File, build_rpm, cpio, directory, xz_blocks
+
+MiB = 1024 * 1024
+
+_words = [
+    b"alpha",
+    b"bravo",
+    b"charlie",
+    b"delta",
+    b"echo",
+    b"foxtrot",
+    b"golf",
+    b"hotel",
+    b"india",
+    b"juliett",
+    b"\x00\x00\x00\x00",
+    b"\x7fELF\x02\x01\x01",
+]
+
+
+def file_sizes(count, size, distribution, rng):
+    """
+    Return `count' file sizes. `size' is the size of every file for the
+    "fixed" distribution, the maximum for "uniform" and the median for
+    "lognormal".
+    """
+    if distribution == "fixed":
+        return [size] * count
+    if distribution == "uniform":
+        return [rng.randint(0, size) for _ in range(count)]
+    if distribution == "lognormal":
+        return [
+            min(int(rng.lognormvariate(0, 1.5) * size), 64 * size) for _ in range(count)
+        ]
+    raise ValueError("unknown size distribution %r" % distribution)
+
+
+def file_data(size, rng, entropy=0.25):
+    """Return `size' bytes that compress about as well as typical binaries"""
+    out = bytearray()
+    while len(out) < size:
+        if rng.random() < entropy:
+            out.extend(rng.randbytes(64))
+        else:
+            out.extend(rng.choice(_words))
+    return bytes(out[:size])
+
+
+def make_rpm(
+    files=100,
+    size=4096,
+    distribution="lognormal",
+    compression="gzip",
+    provides=0,
+    changelog=0,
+    dirs=10,
+    seed=0,
+):
+    """
+    Return the bytes of a synthetic RPM with `files' files spread over
+    `dirs' directories. `provides' adds that many provides entries to make
+    the header bigger and `changelog' sets the number of changelog entries.
+    A `compression' of "xz-blocks" compresses the payload in independent
+    1 MiB blocks like multi-threaded xz.
+    """
+    rng = random.Random(seed)
+    entries = [directory("/usr/share/bench/d%03d" % d) for d in range(dirs)]
+    for i, file_size in enumerate(file_sizes(files, size, distribution, rng)):
+        path = "/usr/share/bench/d%03d/f%06d" % (i % dirs, i)
+        entries.append(File(path, file_data(file_size, rng), mtime=1700000000))
+    extra_tags = {}
+    if provides:
+        extra_tags["provides"] = (
+            STRING_ARRAY,
+            [b"bench-capability-%d" % i for i in range(provides)],
+        )
+    log = [
+        (
+            1700000000 - 86400 * i,
+            "Bench <bench@example.com> - 1.0-%d" % i,
+            "- change %d" % i,
+        )
+        for i in range(changelog)
+    ]
+    payload = None
+    if compression == "xz-blocks":
+        payload = xz_blocks(cpio(entries), MiB)
+        compression = "xz"
+    return build_rpm(
+        entries,
+        name="bench",
+        compression=compression,
+        changelog=log,
+        extra_tags=extra_tags,
+        payload=payload,
+    )
+
+
+def main(*argv):
+    parser = argparse.ArgumentParser(prog="benchmarks.corpus")
+    parser.add_argument("outfile")
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--size", type=int, default=4096)
+    parser.add_argument(
+        "--distribution",
+        default="lognormal",
+        choices=["fixed", "uniform", "lognormal"],
+    )
+    parser.add_argument(
+        "--compression",
+        default="gzip",
+        choices=["gzip", "xz", "xz-blocks", "bzip2", "zstd", "none"],
+    )
+    parser.add_argument("--provides", type=int, default=0)
+    parser.add_argument("--changelog", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv or None)
+    data = make_rpm(
+        files=args.files,
+        size=args.size,
+        distribution=args.distribution,
+        compression=None if args.compression == "none" else args.compression,
+        provides=args.provides,
+        changelog=args.changelog,
+        seed=args.seed,
+    )
+    with open(args.outfile, "wb") as fileobj:
+        fileobj.write(data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Benchmark suite. Builds a corpus of synthetic RPMs, times rpmfile
+operations on each of them in a fresh interpreter and writes wall time,
+throughput and peak RSS to JSON so that runs can be compared.
+
+    $ python -m benchmarks.run -o after.json
+    $ python -m benchmarks.run --compare before.json after.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import rpmfile
+from rpmfile.cli import main as cli_main
+
+from benchmarks.corpus import make_rpm
+
+MiB = 1024 * 1024
+
+CASES = {
+    "small-gzip": dict(files=100, size=4096, compression="gzip"),
+    "many-files-xz": dict(files=5000, size=512, compression="xz"),
+    "large-files-xz-blocks": dict(
+        files=16, size=MiB, distribution="fixed", compression="xz-blocks"
+    ),
+    "large-files-zstd": dict(
+        files=16, size=4 * MiB, distribution="fixed", compression="zstd"
+    ),
+    "big-header-bzip2": dict(
+        files=2000, size=256, compression="bzip2", provides=5000, changelog=2000
+    ),
+}
+
+
+def _payload_size(rpm):
+    return sum(m.size for m in rpm.getmembers())
+
+
+def op_open(path, workdir):
+    with rpmfile.open(path) as rpm:
+        return rpm.data_offset
+
+
+def op_headers(path, workdir):
+    with rpmfile.open(path) as rpm:
+        for key in rpm.headers:
+            rpm.headers[key]
+        return rpm.data_offset
+
+
+def op_getmembers(path, workdir):
+    with rpmfile.open(path) as rpm:
+        return _payload_size(rpm)
+
+
+def op_getmember(path, workdir):
+    with rpmfile.open(path) as rpm:
+        members = rpm.getmembers()
+        for member in members:
+            rpm.getmember(member.name)
+        return _payload_size(rpm)
+
+
+def op_extractfile(path, workdir):
+    with rpmfile.open(path) as rpm:
+        for member in rpm.getmembers():
+            with rpm.extractfile(member) as fileobj:
+                fileobj.read()
+        return _payload_size(rpm)
+
+
+def op_cli_extract(path, workdir):
+    dest = tempfile.mkdtemp(dir=workdir)
+    try:
+        cli_main("-x", "-C", dest, path)
+    finally:
+        shutil.rmtree(dest)
+    with rpmfile.open(path) as rpm:
+        return _payload_size(rpm)
+
+
+def op_cli_list(path, workdir):
+    cli_main("-l", path)
+    return os.path.getsize(path)
+
+
+def op_cli_info(path, workdir):
+    cli_main("-i", path)
+    return os.path.getsize(path)
+
+
+OPERATIONS = {
+    "open": op_open,
+    "headers": op_headers,
+    "getmembers": op_getmembers,
+    "getmember": op_getmember,
+    "extractfile": op_extractfile,
+    "cli-extract": op_cli_extract,
+    "cli-list": op_cli_list,
+    "cli-info": op_cli_info,
+}
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, if known"""
+    # ru_maxrss survives fork() and exec() on Linux, so it would report the
+    # parent's peak; VmHWM belongs to this process alone
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes everywhere but macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def worker(operation, path, repeat):
+    """Time `operation' on `path' in this process and print the result"""
+    function = OPERATIONS[operation]
+    workdir = os.path.dirname(path)
+    times = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            processed = function(path, workdir)
+            times.append(time.perf_counter() - start)
+    json.dump({"times": times, "bytes": processed, "peak_rss": peak_rss()}, sys.stdout)
+
+
+def run(cases, operations, repeat, workdir):
+    results = []
+    for case in cases:
+        try:
+            data = make_rpm(**CASES[case])
+        except ImportError as error:
+            print("skipping %s: %s" % (case, error), file=sys.stderr)
+            continue
+        path = os.path.join(workdir, case + ".rpm")
+        with open(path, "wb") as fileobj:
+            fileobj.write(data)
+        for operation in operations:
+            output = subprocess.check_output(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.run",
+                    "--worker",
+                    operation,
+                    path,
+                    "--repeat",
+                    str(repeat),
+                ]
+            )
+            result = json.loads(output)
+            best = min(result["times"])
+            results.append(
+                {
+                    "case": case,
+                    "operation": operation,
+                    "parameters": CASES[case],
+                    "rpm_size": len(data),
+                    "wall_time": best,
+                    "wall_times": result["times"],
+                    "bytes_per_second": result["bytes"] / best if best else None,
+                    "peak_rss": result["peak_rss"],
+                }
+            )
+            print(
+                "%-18s %-12s %10.4fs %10.1f MiB/s %8.1f MiB RSS"
+                % (
+                    case,
+                    operation,
+                    best,
+                    results[-1]["bytes_per_second"] / MiB,
+                    (result["peak_rss"] or 0) / MiB,
+                ),
+                file=sys.stderr,
+            )
+    return results
+
+
+def compare(before, after):
+    """Print the wall time ratio of every result found in both runs"""
+    with open(before) as fileobj:
+        old = {(r["case"], r["operation"]): r for r in json.load(fileobj)["results"]}
+    with open(after) as fileobj:
+        new = {(r["case"], r["operation"]): r for r in json.load(fileobj)["results"]}
+    for key in sorted(set(old) & set(new)):
+        ratio = new[key]["wall_time"] / old[key]["wall_time"]
+        print(
+            "%-18s %-12s %10.4fs -> %10.4fs  x%.2f"
+            % (key + (old[key]["wall_time"], new[key]["wall_time"], ratio))
+        )
+
+
+def main(*argv):
+    parser = argparse.ArgumentParser(prog="benchmarks.run")
+    parser.add_argument(
+        "-o", "--output", help="Write results to this JSON file", default=None
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--case", dest="cases", action="append", choices=sorted(CASES))
+    parser.add_argument(
+        "--operation", dest="operations", action="append", choices=list(OPERATIONS)
+    )
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    parser.add_argument("--worker", nargs=2, metavar=("OPERATION", "PATH"))
+    args = parser.parse_args(argv or None)
+
+    if args.worker:
+        worker(args.worker[0], args.worker[1], args.repeat)
+        return
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    workdir = tempfile.mkdtemp()
+    try:
+        results = run(
+            args.cases or list(CASES),
+            args.operations or list(OPERATIONS),
+            args.repeat,
+            workdir,
+        )
+    finally:
+        shutil.rmtree(workdir)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as fileobj:
+            json.dump(report, fileobj, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
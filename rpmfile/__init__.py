@@ -1,38 +1,32 @@
 from __future__ import print_function, unicode_literals, absolute_import
-from .headers import get_headers
+from .headers import _run, read_headers
 import sys
 import io
-import gzip
-import bz2
-
-try:
-    import lzma
-except ImportError:
-    pass
-try:
-    import zstandard
-except ImportError:
-    pass
+from collections import ChainMap
+import stat
 import struct
-from rpmfile import cpiofile
+from mmap import mmap as _mmap, ACCESS_READ
+from rpmfile import cpiofile, extract, gzindex
+from rpmfile.deps import _decode
+from rpmfile.extract import extract_many
 from functools import wraps
-from rpmfile.io_extra import _SubFile
+from rpmfile.decompress import open_payload
+
+# the No*Error classes used to be defined here, they are still importable
+# from rpmfile
+from rpmfile.errors import (
+    NoLZMAModuleError,
+    NoZSTANDARDModuleError,
+    NoBytesIOError,
+    RPMError,
+)
+from rpmfile.rpmdefs import PGPHASHALGO, RPMFILE_GHOST
+from rpmfile.tree import _DirTree
+from rpmfile.io_extra import _Digest, _SubFile, _StreamFile, _BufferFile, _seekable
 
 pad = lambda fileobj: (4 - (fileobj.tell() % 4)) % 4
 
 
-class NoLZMAModuleError(NotImplementedError):
-    pass
-
-
-class NoZSTANDARDModuleError(NotImplementedError):
-    pass
-
-
-class NoBytesIOError(NotImplementedError):
-    pass
-
-
 class RPMInfo(object):
     """
     Informational class which holds the details about an
@@ -45,7 +39,15 @@ class RPMInfo(object):
     _new_coder = struct.Struct(b"8s8s8s8s8s8s8s8s8s8s8s8s8s")
 
     def __init__(
-        self, name, file_start, file_size, initial_offset, isdir, issymlink, mode
+        self,
+        name,
+        file_start,
+        file_size,
+        initial_offset,
+        isdir,
+        issymlink,
+        mode,
+        linkname=None,
     ):
         self.name = name
         self.file_start = file_start
@@ -54,6 +56,7 @@ class RPMInfo(object):
         self._isdir = isdir
         self._issymlink = issymlink
         self._mode = mode
+        self.linkname = linkname
 
     @property
     def isdir(self):
@@ -79,18 +82,38 @@ class RPMInfo(object):
 
     @classmethod
     def _read_new(cls, fileobj, magic=None):
+        member = cls._read_new_header(fileobj, magic)
+        fileobj.seek(member.size, 1)
+        fileobj.seek(pad(fileobj), 1)
+        return member
+
+    @classmethod
+    def _read_new_header(cls, fileobj, magic=None):
+        """
+        Read the header of an entry, leaving `fileobj' positioned at the
+        start of the entry's data. Only reads forward.
+        """
+        return _run(cls._parse_new_header(fileobj.tell()), fileobj)
+
+    @classmethod
+    def _parse_new_header(cls, initial_offset):
+        """
+        Parse the header of an entry that starts at `initial_offset' of the
+        archive, right after its magic, like headers._parse_header() does
+        for RPM headers: without doing I/O itself.
+        """
         coder = cls._new_coder
 
-        initial_offset = fileobj.tell()
-        d = coder.unpack_from(fileobj.read(coder.size))
+        d = coder.unpack_from((yield ("read", coder.size)))
 
         namesize = int(d[11], 16)
-        name = fileobj.read(namesize)[:-1].decode("utf-8")
-        fileobj.seek(pad(fileobj), 1)
-        file_start = fileobj.tell()
+        name = _decode((yield ("read", namesize))[:-1])
+        offset = initial_offset + coder.size + namesize
+        padding = (4 - offset % 4) % 4
+        if padding:
+            yield ("read", padding)
+        file_start = offset + padding
         file_size = int(d[6], 16)
-        fileobj.seek(file_size, 1)
-        fileobj.seek(pad(fileobj), 1)
         # https://www.mankier.com/5/cpio under Old Binary Format mode bits
         mode = int(d[1], 16)
         isdir = mode & int("0040000", 8)
@@ -115,14 +138,80 @@ class RPMFile(object):
     can be determined, `mode' is overridden by `fileobj's mode.
     `fileobj' is not closed, when TarFile is closed.
 
+    If `mmap' is true the file is memory-mapped and read without system
+    calls or copies: binary header values are memoryview slices of the
+    mapping, and so are the buffers of members of uncompressed payloads
+    (see extractfile()).
+
+    `fileobj' may also be a pipe, a socket or an HTTP response that can
+    not seek. The payload is then decompressed in a single forward pass:
+    use iter_members(), extractall() or getmembers(source="header"); a
+    member can not be read after the stream has moved past it.
+
+    If `checkpoint_interval' is given, the state of decompression of a
+    gzip compressed payload is kept every `checkpoint_interval' bytes of
+    output, so that reading members in any order never decompresses more
+    than that to reach a member (see save_index()).
+
+    Payloads made of independently compressed blocks, those of bzip2 and
+    of multi-threaded xz, are decompressed on `threads' threads, by default
+    one per CPU.
+
+    `decompressor' selects how the payload is decompressed: None for the
+    in-process modules, "auto" to pipe it through the best installed tool
+    (pigz, xz, lbzip2, zstd, ...) or a backend name from
+    rpmfile.decompress.backends, or a dict of those by compression.
+
+    If `verify' is true the compressed payload is hashed as it is read and
+    checked against the payloaddigest tag when iter_members() reaches the
+    end of the archive, raising RPMError on a mismatch (see
+    verify_payload()).
+
+    A `fileobj' passed in is left open on exit unless `owns_fileobj' is
+    true.
     """
 
-    def __init__(self, name=None, mode="rb", fileobj=None):
+    def __init__(
+        self,
+        name=None,
+        mode="rb",
+        fileobj=None,
+        mmap=False,
+        checkpoint_interval=None,
+        threads=None,
+        decompressor=None,
+        verify=False,
+        owns_fileobj=False,
+    ):
         if mode != "rb":
             raise NotImplementedError("currently the only supported mode is 'rb'")
+        self._ownes_fd = fileobj is None or owns_fileobj
+        self._mapping = None
+        if mmap and not isinstance(fileobj, _BufferFile):
+            if fileobj is None:
+                with io.open(name, mode) as fileobj:
+                    self._mapping = _mmap(fileobj.fileno(), 0, access=ACCESS_READ)
+            else:
+                self._mapping = _mmap(fileobj.fileno(), 0, access=ACCESS_READ)
+            fileobj = _BufferFile(self._mapping)
+            self._ownes_fd = True
         self._fileobj = fileobj or io.open(name, mode)
-        self._header_range, self._headers = get_headers(self._fileobj)
-        self._ownes_fd = fileobj is None
+        self._checkpoint_interval = checkpoint_interval
+        self._threads = threads
+        self._decompressor = decompressor
+        self._verify = verify
+        signature, header = read_headers(self._fileobj)
+        self._signature_range, self._signature_headers = signature
+        self._header_range, self._main_headers = header
+        self._headers = ChainMap(self._main_headers, self._signature_headers)
+
+    @classmethod
+    def frombuffer(cls, buffer):
+        """
+        Open an RPM held in a bytes-like object such as bytes, a memoryview
+        or an mmap. Like the `mmap' mode, it is parsed in place.
+        """
+        return cls(fileobj=_BufferFile(buffer))
 
     @property
     def data_offset(self):
@@ -134,26 +223,111 @@ class RPMFile(object):
 
     @property
     def headers(self):
-        "RPM headers"
+        "RPM headers, the main header's tags merged over the signature's"
         return self._headers
 
+    @property
+    def signature_headers(self):
+        "Tags of the signature header"
+        return self._signature_headers
+
+    @property
+    def main_headers(self):
+        "Tags of the main header"
+        return self._main_headers
+
     def __enter__(self):
         return self
 
     def __exit__(self, *excinfo):
+        if self._data_file is not None:
+            self._data_file.close()
         if self._ownes_fd:
             self._fileobj.close()
+        if self._mapping is not None:
+            # the file object's view was released when it was closed, the
+            # headers keep none either
+            self._signature_headers._drop_views()
+            self._main_headers._drop_views()
+            try:
+                self._mapping.close()
+            except BufferError:
+                # the caller still holds memoryviews of the mapping, it
+                # will be unmapped when they are released
+                pass
 
     _members = None
+    _members_from_header = None
 
-    def getmembers(self):
+    def _header_members(self):
+        """
+        Rebuild the archive members from the file tables of the main
+        header, or return None if the header has no file tables.
+        """
+        headers = self._main_headers
+        sizes = "longfilesizes" if "longfilesizes" in headers else "filesizes"
+        if not all(
+            tag in headers
+            for tag in ("basenames", "dirnames", "dirindexes", sizes, "filemodes")
+        ):
+            return None
+        basenames = headers.getarray("basenames")
+        dirnames = headers.getarray("dirnames")
+        dirindexes = headers.getarray("dirindexes")
+        sizes = headers.getarray(sizes)
+        modes = headers.getarray("filemodes")
+        count = len(basenames)
+        linktos = headers.getarray("filelinktos") if "filelinktos" in headers else None
+        flags = headers.getarray("fileflags") if "fileflags" in headers else None
+
+        # names in the payload are relative, "./usr/bin/foo" for "/usr/bin/foo"
+        dirnames = [("." if d.startswith(b"/") else "") + _decode(d) for d in dirnames]
+        members = []
+        for i in range(count):
+            if flags is not None and flags[i] & RPMFILE_GHOST:
+                # %ghost files are not in the payload
+                continue
+            mode = modes[i]
+            issymlink = stat.S_ISLNK(mode)
+            members.append(
+                RPMInfo(
+                    dirnames[dirindexes[i]] + _decode(basenames[i]),
+                    None,
+                    sizes[i],
+                    None,
+                    stat.S_ISDIR(mode),
+                    issymlink,
+                    mode & 0o777,
+                    linkname=_decode(linktos[i]) if issymlink and linktos else None,
+                )
+            )
+        return members
+
+    def getmembers(self, source="payload"):
         """
         Return the members of the archive as a list of RPMInfo objects. The
         list has the same order as the members in the archive.
+
+        If `source' is "header" the members are rebuilt from the file tables
+        of the main header without decompressing the payload. Their
+        file_start is None, and symlinks carry their target as linkname.
+        The payload is only scanned if the header has no file tables.
         """
+        if source == "header":
+            if self._members_from_header is None:
+                members = self._header_members()
+                if members is None:
+                    return self.getmembers()
+                self._members_from_header = [m for m in members if not m.isdir]
+            return self._members_from_header
+        elif source != "payload":
+            raise ValueError("source must be 'payload' or 'header'")
+
         if self._members is None:
-            self._members = _members = []
+            _members = []
             g = self.data_file
+            if g.tell() != 0:
+                g.seek(0)
             magic = g.read(2)
             while magic:
                 if magic == b"07":
@@ -167,9 +341,54 @@ class RPMFile(object):
                         _members.append(member)
 
                 magic = g.read(2)
-            return _members
+            self._set_members(_members)
         return self._members
 
+    def _set_members(self, members):
+        self._members = members
+        # later occurrences of a name replace earlier ones
+        self._members_by_name = {member.name: member for member in members}
+
+    def iter_members(self):
+        """
+        Iterate over the members of the archive in a single forward pass
+        over the payload, like tarfile's stream mode ('r|'). Yields
+        (RPMInfo, file object) pairs in archive order. Each file object
+        only reads forward and is only valid until the iteration moves on
+        to the next member, so no member ever costs a backward seek (and
+        a restart of decompression) of the payload.
+        """
+        g = self.data_file
+        if g.tell() != 0:
+            g.seek(0)
+        members = []
+        magic = g.read(2)
+        while magic:
+            if magic == b"07":
+                magic += g.read(4)
+                if magic != b"070701":
+                    raise Exception("bad magic number %r" % magic)
+                member = RPMInfo._read_new_header(g, magic)
+
+                if member.name == "TRAILER!!!":
+                    if self._members is None:
+                        self._set_members(members)
+                    if self._verify:
+                        self.verify_payload()
+                    break
+
+                fileobj = _StreamFile(g, member.size, member.mode)
+                if not member.isdir:
+                    members.append(member)
+                    yield member, fileobj
+                fileobj._drain()
+                g.read(pad(g))
+
+            magic = g.read(2)
+
+    def __iter__(self):
+        return self.iter_members()
+
     def getmember(self, name):
         """
         Return an RPMInfo object for member `name'. If `name' can not be
@@ -177,12 +396,49 @@ class RPMFile(object):
         than once in the archive, its last occurrence is assumed to be the
         most up-to-date version.
         """
-        members = self.getmembers()
-        for m in members[::-1]:
-            if m.name == name:
-                return m
+        self.getmembers()
+        try:
+            return self._members_by_name[name]
+        except KeyError:
+            raise KeyError("member %s could not be found" % name)
+
+    _tree = None
+
+    def _get_tree(self):
+        if self._tree is None:
+            # the header's file tables list directories too and need no
+            # decompression, the payload is only scanned without them
+            members = self._header_members()
+            if members is None:
+                members = self.getmembers()
+            self._tree = _DirTree(members)
+        return self._tree
+
+    def exists(self, path):
+        """
+        Return True if `path' is a member of the archive or a directory
+        holding members. `path' may be given as "/usr/bin/foo",
+        "./usr/bin/foo" or "usr/bin/foo".
+        """
+        return self._get_tree().exists(path)
+
+    def listdir(self, path="."):
+        """Return the names of the entries in the archive directory `path'"""
+        return self._get_tree().listdir(path)
+
+    def walk(self, top="."):
+        """
+        Walk the archive's directory tree from `top' like os.walk(),
+        yielding (dirpath, dirnames, filenames) tuples.
+        """
+        return self._get_tree().walk(top)
 
-        raise KeyError("member %s could not be found" % name)
+    def glob(self, pattern):
+        """
+        Return the archive paths matching the shell-style `pattern', with
+        wildcards matching within one path component like glob.glob().
+        """
+        return self._get_tree().glob(pattern)
 
     def extractfile(self, member):
         """
@@ -190,48 +446,154 @@ class RPMFile(object):
         a filename or an RPMInfo object.
         The file-like object is read-only and provides the following
         methods: read(), readline(), readlines(), seek() and tell()
+        When the RPM was opened from a buffer or memory-mapped and its
+        payload is not compressed, getbuffer() returns the member's data
+        as a memoryview without copying it.
         """
-        if not isinstance(member, RPMInfo):
-            member = self.getmember(member)
+        if not isinstance(member, RPMInfo) or member.file_start is None:
+            member = self.getmember(getattr(member, "name", member))
         return _SubFile(self.data_file, member.file_start, member.size, member.mode)
 
+    def extractall(self, path=".", workers=1, max_inflight=64 * 1024 * 1024):
+        """
+        Extract all members to the directory `path' in one pass over the
+        payload. `workers' threads write files to disk while the payload is
+        decompressed, with at most `max_inflight' bytes waiting to be
+        written. Return the list of extracted RPMInfo objects.
+        """
+        return extract.extractall(self, path, workers, max_inflight)
+
+    def save_index(self, path):
+        """
+        Save the member table of the payload to the sidecar file `path',
+        keyed by the RPM's size, modification time and the sha256 of its
+        headers, so that load_index() can skip the scan of the payload.
+        """
+        gzindex.save(path, gzindex.index_key(self), self.getmembers())
+
+    def load_index(self, path):
+        """
+        Load the member table saved by save_index() at `path'. Return
+        False if there is no sidecar or it was saved for another RPM.
+        """
+        members = gzindex.load(path, gzindex.index_key(self), RPMInfo)
+        if members is None:
+            return False
+        self._set_members(members)
+        return True
+
     _data_file = None
+    # the compressed payload as read by the decompressor
+    _payload = None
+
+    def _payload_digest(self):
+        """The expected payload digest and the name of its algorithm"""
+        if "payloaddigest" not in self._main_headers:
+            raise RPMError("there is no payload digest to verify")
+        digest = self._main_headers.getarray("payloaddigest")[0]
+        algo = self._main_headers.get("payloaddigestalgo", 8)
+        if algo not in PGPHASHALGO:
+            raise RPMError("unknown payload digest algorithm %d" % algo)
+        return digest.decode("ascii"), PGPHASHALGO[algo]
+
+    def verify_payload(self):
+        """
+        Check the compressed payload against the payloaddigest tag, raising
+        RPMError if they differ. When the RPM was opened with `verify', the
+        payload was hashed as it was decompressed and only the bytes not
+        read yet, like a compressor's trailer, are read now. Otherwise the
+        payload is read once more, which a stream can not do.
+        """
+        expected, algorithm = self._payload_digest()
+        payload = self._payload
+        if payload is not None and payload._digest is not None:
+            # let the decompressor, which may read from another thread,
+            # finish with its input first
+            while self._data_file.read(1024 * 1024):
+                pass
+        else:
+            if not _seekable(self._fileobj):
+                raise RPMError("a stream can only be verified while it is read")
+            payload = _SubFile(self._fileobj, self.data_offset)
+            payload._digest = _Digest(algorithm)
+        payload._finish_digest()
+        found = payload._digest.hash.hexdigest()
+        if found != expected:
+            raise RPMError(
+                "payload digest mismatch: expected %s, got %s" % (expected, found)
+            )
 
     @property
     def data_file(self):
         """Return the uncompressed raw CPIO data of the RPM archive."""
 
         if self._data_file is None:
-            fileobj = _SubFile(self._fileobj, self.data_offset)
+            streaming = not _seekable(self._fileobj)
+            if streaming:
+                # a pipe, socket or HTTP response, left at the start of the
+                # payload by read_headers() and only ever read forward
+                self._payload = _StreamFile(self._fileobj, None)
+                if self._verify:
+                    self._payload._digest = _Digest(self._payload_digest()[1])
+                fileobj = io.BufferedReader(self._payload)
+                magic = fileobj.peek(6)[:6]
+            else:
+                fileobj = self._payload = _SubFile(self._fileobj, self.data_offset)
+                if self._verify:
+                    fileobj._digest = _Digest(self._payload_digest()[1])
+                magic = fileobj.read(6)
+                fileobj.seek(0)
 
             archive_compression = self.headers.get("archive_compression", b"")
 
-            if archive_compression == b"xz":
-                if not getattr(sys.modules[__name__], "lzma", False):
-                    raise NoLZMAModuleError("lzma module not present")
-                self._data_file = lzma.LZMAFile(fileobj)
-            elif archive_compression == b"zstd":
-                if not getattr(sys.modules[__name__], "zstandard", False):
-                    raise NoZSTANDARDModuleError("zstandard module not present")
-                if not (sys.version_info.major >= 3 and sys.version_info.minor >= 5):
-                    raise NoBytesIOError("Need io.BytesIO (Python >= 3.5)")
-                with zstandard.ZstdDecompressor().stream_reader(fileobj) as zstd_data:
-                    self._data_file = io.BytesIO(zstd_data.read())
-
-            elif archive_compression == b"bzip2":
-                self._data_file = bz2.BZ2File(fileobj)
+            if archive_compression in (b"xz", b"zstd", b"bzip2"):
+                self._data_file = open_payload(
+                    fileobj,
+                    archive_compression.decode(),
+                    self._decompressor,
+                    self._threads,
+                )
+            elif magic == b"070701":
+                # like rpm, accept an uncompressed cpio payload
+                self._data_file = fileobj
+            elif self._checkpoint_interval and not streaming:
+                self._data_file = gzindex.open_gzip(
+                    fileobj, gzindex.GzipIndex(self._checkpoint_interval)
+                )
             else:
-                self._data_file = gzip.GzipFile(fileobj=fileobj)
+                self._data_file = open_payload(
+                    fileobj, "gzip", self._decompressor, self._threads
+                )
 
         return self._data_file
 
 
-def open(name=None, mode="rb", fileobj=None):
+def open(
+    name=None,
+    mode="rb",
+    fileobj=None,
+    mmap=False,
+    checkpoint_interval=None,
+    threads=None,
+    decompressor=None,
+    verify=False,
+    owns_fileobj=False,
+):
     """
     Open an RPM archive for reading. Return
     an appropriate RPMFile class.
     """
-    return RPMFile(name, mode, fileobj)
+    return RPMFile(
+        name,
+        mode,
+        fileobj,
+        mmap=mmap,
+        checkpoint_interval=checkpoint_interval,
+        threads=threads,
+        decompressor=decompressor,
+        verify=verify,
+        owns_fileobj=owns_fileobj,
+    )
 
 
 def main():
@@ -0,0 +1,118 @@
+"""
+The snapshots of rpmfile.depindex and rpmfile.fileindex: sorted string
+tables and uint32 arrays, written as they are in memory and mapped back
+rather than read.
+"""
+
+import array
+import bisect
+import io
+import mmap
+import struct
+import sys
+
+from .errors import RPMError
+
+_VERSION = 1
+_header = struct.Struct("<8sII")
+_section = struct.Struct("<QQ")
+
+
+def _uint32(values=()):
+    # "I" is 4 bytes on every platform Python 3.10 runs on
+    return array.array("I", values)
+
+
+class _Strings(object):
+    """A table of strings stored as one UTF-8 blob and their offsets"""
+
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    @classmethod
+    def build(cls, strings):
+        encoded = [s.encode("utf-8", "surrogateescape") for s in strings]
+        offsets = _uint32([0])
+        total = 0
+        for s in encoded:
+            total += len(s)
+            offsets.append(total)
+        return cls(b"".join(encoded), offsets)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        # bytes, so that a binary search only decodes what it returns
+        return bytes(self._blob[self._offsets[i] : self._offsets[i + 1]])
+
+    def get(self, i):
+        return self[i].decode("utf-8", "surrogateescape")
+
+    def find(self, s):
+        """Return the index of `s', which must be in a sorted table, or -1"""
+        key = s.encode("utf-8", "surrogateescape")
+        i = bisect.bisect_left(self, key)
+        if i < len(self) and self[i] == key:
+            return i
+        return -1
+
+
+def _save(path, magic, strings, arrays):
+    """
+    Write the _Strings tables `strings' and the uint32 `arrays' to `path',
+    as little endian sections aligned to 8 bytes after a table of their
+    offsets and sizes.
+    """
+    sections = []
+    for table in strings:
+        sections += [(table._blob, False), (table._offsets, True)]
+    sections += [(values, True) for values in arrays]
+    views = []
+    for section, ints in sections:
+        if ints and sys.byteorder == "big":
+            section = _uint32(section)
+            section.byteswap()
+        views.append(memoryview(section).cast("B"))
+    offset = _header.size + _section.size * len(views)
+    table = []
+    for view in views:
+        offset += -offset % 8
+        table.append((offset, len(view)))
+        offset += len(view)
+    with io.open(path, "wb") as fileobj:
+        fileobj.write(_header.pack(magic, _VERSION, len(views)))
+        for entry in table:
+            fileobj.write(_section.pack(*entry))
+        for (offset, _), view in zip(table, views):
+            fileobj.write(b"\0" * (offset - fileobj.tell()))
+            fileobj.write(view)
+
+
+def _load(path, magic, count):
+    """
+    Map a file written by _save() with `count' string tables and return
+    the mapping, the string tables and the arrays, which view the mapping.
+    """
+    with io.open(path, "rb") as fileobj:
+        buffer = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+    found, version, sections = _header.unpack_from(buffer)
+    if found != magic or version != _VERSION:
+        raise RPMError("%s is not an index snapshot" % path)
+    view = memoryview(buffer)
+    views = []
+    for i in range(sections):
+        offset, size = _section.unpack_from(buffer, _header.size + i * _section.size)
+        views.append(view[offset : offset + size])
+
+    def ints(section):
+        if sys.byteorder == "big":
+            values = _uint32()
+            values.frombytes(section)
+            values.byteswap()
+            return values
+        return section.cast("I")
+
+    strings = [_Strings(views[2 * i], ints(views[2 * i + 1])) for i in range(count)]
+    return buffer, strings, [ints(v) for v in views[2 * count :]]
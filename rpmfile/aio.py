@@ -0,0 +1,333 @@
+"""
+Reading RPMs from asyncio byte streams.
+
+    rpm = rpmfile.aio.open(reader)
+    headers = await rpm.headers()
+    async for member, stream in rpm.iter_members():
+        data = await stream.read()
+
+`reader' is an asyncio.StreamReader or any object with an `async
+read(n)' method. The lead, the headers and the cpio entries are parsed by
+the same parsers as in the synchronous API, and the payload is
+decompressed incrementally as it arrives. Input is gathered into chunks
+large enough to be worth decompressing in a thread, so the event loop is
+not held up, and each step produces no more output than is asked for.
+"""
+
+import asyncio
+import bz2
+import zlib
+from collections import ChainMap
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+from . import RPMInfo, decompress, pad
+from .errors import NoLZMAModuleError, NoZSTANDARDModuleError, RPMError
+from .headers import _parse_headers
+
+_read_size = 64 * 1024
+
+# compressed input is read until there is at least this much of it, and is
+# then decompressed in a thread, less costs less than the hand-off
+THREAD_THRESHOLD = 256 * 1024
+
+# decompressors that take no output limit are fed this much input at a time
+_slice_size = 1024
+
+
+async def _read(reader, size):
+    """Read `size' bytes from `reader', fewer only at the end of the stream"""
+    chunks = []
+    while size > 0:
+        chunk = await reader.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+async def _run(parser, read):
+    """Run the parser generator `parser' on the coroutine function `read'"""
+    request = next(parser)
+    while True:
+        kind, size = request
+        data = await read(size)
+        try:
+            request = parser.send((data, 0, False) if kind == "store" else data)
+        except StopIteration as stop:
+            return stop.value
+
+
+class _Concatenated(object):
+    """
+    An incremental decompressor of concatenated compressed streams, each
+    decompressed by a new decompressor from `factory', with any zero
+    padding between them skipped.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._decompressor = factory()
+        # input not decompressed yet and output not returned yet, because
+        # of an output limit
+        self._input = b""
+        self._output = b""
+
+    @property
+    def eof(self):
+        return getattr(self._decompressor, "eof", True)
+
+    @property
+    def pending(self):
+        """Whether there is output left without any more input"""
+        if self._input or self._output:
+            return True
+        return not self.eof and not getattr(self._decompressor, "needs_input", True)
+
+    def _step(self, data, limit):
+        """Decompress some of `data', return the output and the rest of it"""
+        d = self._decompressor
+        if hasattr(d, "needs_input"):
+            # lzma, bz2 and compression.zstd keep the rest themselves
+            return d.decompress(data, limit), b""
+        if limit < 0:
+            return d.decompress(data), b""
+        if type(d).__module__ == "zlib":
+            # 0 is no limit for zlib
+            return d.decompress(data, max(limit, 1)), d.unconsumed_tail
+        # zstandard's decompressobj takes no limit, feed it little at a time
+        # and keep what is over the limit for the next call
+        return d.decompress(data[:_slice_size]), data[_slice_size:]
+
+    def decompress(self, data, max_length=-1):
+        """
+        Decompress `data' after the input left over by the last call, into
+        at most `max_length' bytes unless it is negative.
+        """
+        data, self._input = self._input + data, b""
+        output, self._output = bytearray(self._output), b""
+        while max_length < 0 or len(output) < max_length:
+            if self.eof:
+                data = data.lstrip(b"\0")
+                if not data:
+                    break
+                self._decompressor = self._factory()
+            elif not data and not self.pending:
+                break
+            limit = max_length - len(output) if max_length >= 0 else -1
+            chunk, data = self._step(data, limit)
+            output += chunk
+            if self.eof:
+                data = self._decompressor.unused_data + data
+        self._input = data
+        if 0 <= max_length < len(output):
+            self._output = bytes(output[max_length:])
+            del output[max_length:]
+        return bytes(output)
+
+
+class _Plain(object):
+    eof = True
+    pending = False
+
+    def decompress(self, data, max_length=-1):
+        return data
+
+
+def _decompressor(compression):
+    if compression == "xz":
+        if lzma is None:
+            raise NoLZMAModuleError("lzma module not present")
+        return _Concatenated(lzma.LZMADecompressor)
+    if compression == "bzip2":
+        return _Concatenated(bz2.BZ2Decompressor)
+    if compression == "zstd":
+        if decompress.zstd is not None:
+            return _Concatenated(decompress.zstd.ZstdDecompressor)
+        if decompress.zstandard is not None:
+            return _Concatenated(decompress.zstandard.ZstdDecompressor().decompressobj)
+        raise NoZSTANDARDModuleError("zstandard module not present")
+    if compression == "gzip":
+        return _Concatenated(lambda: zlib.decompressobj(16 + zlib.MAX_WBITS))
+    return _Plain()
+
+
+class _Payload(object):
+    """The decompressed payload, read from `reader' as it is needed"""
+
+    def __init__(self, reader, compression, threshold):
+        self._reader = reader
+        self._compression = compression
+        self._threshold = threshold
+        self._decompressor = None
+        self._buffer = bytearray()
+        self._eof = False
+        # whether the input being decompressed is worth a thread
+        self._threaded = False
+        self._pos = 0
+
+    def tell(self):
+        return self._pos
+
+    async def _read_input(self):
+        """Read compressed input until there is `threshold' bytes of it"""
+        chunks = []
+        size = 0
+        while size < self._threshold:
+            chunk = await self._reader.read(_read_size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+        return b"".join(chunks)
+
+    async def _fill(self, size):
+        while len(self._buffer) < size:
+            if self._decompressor is None:
+                chunk = await _read(self._reader, 6)
+                compression = self._compression
+                if compression == "gzip" and chunk[:6] == b"070701":
+                    # like rpm, accept an uncompressed cpio payload
+                    compression = None
+                self._decompressor = _decompressor(compression)
+            elif self._decompressor.pending:
+                chunk = b""
+            elif self._eof:
+                break
+            else:
+                chunk = await self._read_input()
+                if not chunk:
+                    self._eof = True
+                    if not self._decompressor.eof:
+                        raise EOFError(
+                            "Compressed file ended before the "
+                            "end-of-stream marker was reached"
+                        )
+                    break
+                self._threaded = len(chunk) >= self._threshold
+            # no more output than asked for, however well the input compresses
+            max_length = max(size - len(self._buffer), _read_size)
+            if self._threaded:
+                data = await asyncio.to_thread(
+                    self._decompressor.decompress, chunk, max_length
+                )
+            else:
+                data = self._decompressor.decompress(chunk, max_length)
+            self._buffer += data
+
+    async def read(self, size=-1):
+        if size is None or size < 0:
+            while not self._eof:
+                await self._fill(len(self._buffer) + _read_size)
+            size = len(self._buffer)
+        await self._fill(size)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self._pos += len(data)
+        return data
+
+
+class AsyncMemberStream(object):
+    """
+    The data of one archive member, only readable until the iteration over
+    the members moves on.
+    """
+
+    def __init__(self, payload, size, mode):
+        self._payload = payload
+        self._size = size
+        self.mode = mode
+        self._pos = 0
+
+    def tell(self):
+        return self._pos
+
+    async def read(self, size=-1):
+        remaining = self._size - self._pos
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        data = await self._payload.read(size)
+        self._pos += len(data)
+        return data
+
+    async def _drain(self):
+        while self._pos < self._size:
+            if not await self.read(_read_size):
+                break
+
+
+class AsyncRPMFile(object):
+    """
+    An RPM read from the async byte stream `reader'. The stream is read
+    once, forward only: first the headers, then the payload as members are
+    iterated over.
+    """
+
+    def __init__(self, reader, threshold=THREAD_THRESHOLD):
+        self._reader = reader
+        self._threshold = threshold
+        self._headers = None
+        self._iterated = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *excinfo):
+        pass
+
+    async def headers(self):
+        """Return the main header's tags merged over the signature's"""
+        if self._headers is None:
+            signature, header = await _run(
+                _parse_headers(), lambda size: _read(self._reader, size)
+            )
+            self.signature_range, self.signature_headers = signature
+            self.header_range, self.main_headers = header
+            self._headers = ChainMap(self.main_headers, self.signature_headers)
+        return self._headers
+
+    async def iter_members(self):
+        """
+        Iterate over the members of the archive in a single forward pass,
+        yielding (RPMInfo, AsyncMemberStream) pairs. Each stream is only
+        valid until the iteration moves on.
+        """
+        if self._iterated:
+            raise RPMError("the payload of a stream can only be read once")
+        self._iterated = True
+        headers = await self.headers()
+        compression = headers.get("archive_compression", b"gzip").decode()
+        if compression not in ("xz", "bzip2", "zstd"):
+            compression = "gzip"
+        payload = _Payload(self._reader, compression, self._threshold)
+        magic = await payload.read(2)
+        while magic:
+            if magic == b"07":
+                magic += await payload.read(4)
+                if magic != b"070701":
+                    raise Exception("bad magic number %r" % magic)
+                member = await _run(
+                    RPMInfo._parse_new_header(payload.tell()), payload.read
+                )
+                if member.name == "TRAILER!!!":
+                    break
+                stream = AsyncMemberStream(payload, member.size, member.mode)
+                if not member.isdir:
+                    yield member, stream
+                await stream._drain()
+                await payload.read(pad(payload))
+            magic = await payload.read(2)
+
+
+def open(reader, threshold=THREAD_THRESHOLD):
+    """
+    Return an AsyncRPMFile reading the RPM from `reader', an
+    asyncio.StreamReader or any object with an `async read(n)' method.
+    Compressed input is read in chunks of at least `threshold' bytes that
+    are decompressed in a thread.
+    """
+    return AsyncRPMFile(reader, threshold)
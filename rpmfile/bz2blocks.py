@@ -0,0 +1,315 @@
+"""
+Parallel decompression of bzip2 payloads.
+
+A bzip2 stream is a sequence of blocks of at most 900 kB of data that are
+compressed independently. Blocks are not byte aligned and there is no
+index, but each one starts with the 48-bit magic 0x314159265359, so like
+pbzip2 and lbzip2 the compressed data is scanned for it bit by bit. Every
+block found is turned into a stream of its own and decompressed on a
+pool of threads while later blocks are being found.
+
+The magic can also occur by chance inside compressed data. A block split
+at such a place fails to decompress, and reading then carries on with
+bz2.BZ2File from the same offset, so the output is always that of
+bz2.BZ2File.
+"""
+
+import bz2
+import collections
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from .errors import RPMError
+
+_block_magic = 0x314159265359
+_eos_magic = 0x177245385090
+
+_read_size = 1024 * 1024
+
+_Pattern = collections.namedtuple("_Pattern", "kind shift needle head_mask head")
+
+
+def _patterns():
+    """
+    For each magic and each of the 8 bit offsets it can start at within a
+    byte, the bytes it fully covers and the bits it sets in the first,
+    partially covered, byte. The bits it sets in the last byte are not
+    checked: a false match is caught when the block fails to decompress.
+    """
+    patterns = []
+    for kind, magic in (("block", _block_magic), ("eos", _eos_magic)):
+        for shift in range(8):
+            size = (shift + 48 + 7) // 8
+            raw = (magic << (size * 8 - 48 - shift)).to_bytes(size, "big")
+            if shift:
+                patterns.append(_Pattern(kind, shift, raw[1:6], 0xFF >> shift, raw[0]))
+            else:
+                patterns.append(_Pattern(kind, 0, raw, 0, 0))
+    return patterns
+
+
+_all_patterns = _patterns()
+
+
+def _find(buf, pattern, start_bit):
+    """Return the first bit offset >= `start_bit' where `pattern' matches"""
+    shift = pattern.shift
+    # the needle starts at the byte after the one holding the first bit
+    pos = start_bit // 8 + (1 if shift else 0)
+    while True:
+        pos = buf.find(pattern.needle, pos)
+        if pos < 0:
+            return None
+        if shift:
+            if pos - 1 >= 0 and buf[pos - 1] & pattern.head_mask == pattern.head:
+                bit = (pos - 1) * 8 + shift
+                if bit >= start_bit:
+                    return bit
+        elif pos * 8 >= start_bit:
+            return pos * 8
+        pos += 1
+
+
+def _block_stream(level, data, start, end):
+    """
+    Return the bits `start' to `end' of `data', a block and its magic, as
+    a complete bzip2 stream. The combined CRC of a stream of one block is
+    the CRC of that block.
+    """
+    nbits = end - start
+    value = int.from_bytes(data, "big") >> (len(data) * 8 - end)
+    value &= (1 << nbits) - 1
+    crc = (value >> (nbits - 80)) & 0xFFFFFFFF
+    value = (((value << 48) | _eos_magic) << 32) | crc
+    nbits += 80
+    value <<= -nbits % 8
+    return b"BZh" + level + value.to_bytes((nbits + 7) // 8, "big")
+
+
+def _decompress_block(level, data, start, end):
+    return bz2.decompress(_block_stream(level, data, start, end))
+
+
+class _BlockScanner(object):
+    """
+    Find the blocks of the bzip2 streams in `fileobj', only ever holding
+    the compressed bytes of the block being looked at and those read
+    after it.
+    """
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._buffer = bytearray()
+        # offset in the file of self._buffer[0]
+        self._base = 0
+        self._eof = False
+        # per pattern, (next match, end of the bytes searched for it)
+        self._hits = [(None, 0)] * len(_all_patterns)
+
+    def _fill(self, size):
+        """Make the buffer hold at least `size' bytes, if there are that many"""
+        while len(self._buffer) < size and not self._eof:
+            data = self._fileobj.read(_read_size)
+            if not data:
+                self._eof = True
+            self._buffer += data
+
+    def _discard(self, bit):
+        """Drop the buffered bytes before the one holding `bit'"""
+        n = bit // 8 - self._base
+        if n > 0:
+            del self._buffer[:n]
+            self._base += n
+
+    def _search(self, i, start_bit):
+        """
+        Return the bit offset in the file of the first match of pattern
+        `i' at or after `start_bit', or None. Remembers how far each
+        pattern has been searched so no byte is searched twice for it.
+        """
+        hit, searched = self._hits[i]
+        end = self._base + len(self._buffer)
+        if hit is not None and hit >= start_bit:
+            return hit
+        if hit is None and searched >= end:
+            return None
+        if hit is None:
+            # the needle may straddle the end of the last search
+            start_bit = max(start_bit, (searched - 7) * 8)
+        bit = _find(self._buffer, _all_patterns[i], start_bit - self._base * 8)
+        hit = None if bit is None else bit + self._base * 8
+        self._hits[i] = (hit, end)
+        return hit
+
+    def _next_marker(self, start_bit):
+        """Return (bit offset, kind) of the first magic at or after `start_bit'"""
+        while True:
+            found = None
+            for i, pattern in enumerate(_all_patterns):
+                bit = self._search(i, start_bit)
+                if bit is not None and (found is None or bit < found[0]):
+                    found = (bit, pattern.kind)
+            end = self._base + len(self._buffer)
+            # a match ending in the last 7 bytes may be cut short
+            if found is not None and (found[0] // 8 + 7 <= end or self._eof):
+                return found
+            if self._eof:
+                raise RPMError("truncated bzip2 stream")
+            self._fill(len(self._buffer) + _read_size)
+
+    def blocks(self):
+        """
+        Yield (level, data, start, end) for every block, where the block
+        is bits `start' to `end' of the bytes `data'.
+        """
+        stream = 0
+        while True:
+            self._discard(stream * 8)
+            offset = stream - self._base
+            self._fill(offset + 10)
+            header = bytes(self._buffer[offset : offset + 4])
+            if (
+                len(header) < 4
+                or header[:3] != b"BZh"
+                or not b"1" <= header[3:] <= b"9"
+            ):
+                # like bz2.BZ2File, ignore anything after the last stream
+                return
+            level = header[3:]
+            bit, kind = self._next_marker((stream + 4) * 8)
+            if bit != (stream + 4) * 8:
+                raise RPMError("bad bzip2 stream header")
+            while kind == "block":
+                end, next_kind = self._next_marker(bit + 48)
+                first = bit // 8 - self._base
+                last = (end + 7) // 8 - self._base
+                data = bytes(self._buffer[first:last])
+                yield level, data, bit % 8, end - (bit // 8) * 8
+                self._discard(end)
+                bit, kind = end, next_kind
+            # end of stream magic, combined CRC, then padding to a byte
+            stream = (bit + 80 + 7) // 8
+
+
+class _ParallelBZ2File(io.RawIOBase):
+    """
+    A reader of the bzip2 compressed `fileobj' that decompresses up to
+    2 * `threads' blocks ahead on `threads' threads. Seeking backward
+    starts again from the beginning of the stream, like bz2.BZ2File.
+    """
+
+    def __init__(self, fileobj, threads):
+        self._fileobj = fileobj
+        self._start = fileobj.tell()
+        self._threads = threads
+        self._executor = None
+        self._fallback = None
+        self._pos = 0
+        self._rewind()
+
+    def _rewind(self):
+        self._cancel()
+        self._fileobj.seek(self._start)
+        self._blocks = _BlockScanner(self._fileobj).blocks()
+        self._pending = collections.deque()
+        self._buffer = b""
+        # offset of the end of self._buffer in the decompressed data
+        self._out = 0
+
+    def _cancel(self):
+        for future in getattr(self, "_pending", ()):
+            future.cancel()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            while self.read(_read_size):
+                pass
+            offset += self._pos
+        self._pos = max(0, offset)
+        return self._pos
+
+    def _submit(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self._threads)
+        while self._blocks is not None and len(self._pending) < 2 * self._threads:
+            block = next(self._blocks, None)
+            if block is None:
+                self._blocks = None
+                break
+            self._pending.append(self._executor.submit(_decompress_block, *block))
+
+    def _next_block(self):
+        self._submit()
+        if not self._pending:
+            return False
+        # let go of the previous block before waiting for the next one
+        self._buffer = b""
+        self._buffer = self._pending.popleft().result()
+        self._out += len(self._buffer)
+        self._submit()
+        return True
+
+    def _fall_back(self):
+        """Carry on from the current offset with bz2.BZ2File"""
+        self._cancel()
+        self._pending.clear()
+        self._buffer = b""
+        self._fileobj.seek(self._start)
+        self._fallback = bz2.BZ2File(self._fileobj)
+
+    def readinto(self, b):
+        if self._fallback is None:
+            try:
+                if self._pos < self._out - len(self._buffer):
+                    self._rewind()
+                while self._out <= self._pos:
+                    if not self._next_block():
+                        return 0
+            except (OSError, EOFError, RPMError):
+                self._fall_back()
+        if self._fallback is not None:
+            if self._fallback.tell() != self._pos:
+                self._fallback.seek(self._pos)
+            n = self._fallback.readinto(b)
+            self._pos += n
+            return n
+        offset = self._pos - (self._out - len(self._buffer))
+        n = min(len(b), len(self._buffer) - offset)
+        b[:n] = self._buffer[offset : offset + n]
+        self._pos += n
+        return n
+
+    def close(self):
+        self._cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._fallback is not None:
+            self._fallback.close()
+        self._buffer = b""
+        super(_ParallelBZ2File, self).close()
+
+
+def open_bzip2(fileobj, threads=None):
+    """
+    Return a file object of the decompressed contents of the bzip2
+    compressed `fileobj', decompressed on `threads' threads (all CPUs if
+    None). With a single thread this is bz2.BZ2File.
+    """
+    if threads is None:
+        threads = os.cpu_count() or 1
+    if threads > 1 and fileobj.seekable():
+        return io.BufferedReader(_ParallelBZ2File(fileobj, threads))
+    return bz2.BZ2File(fileobj)
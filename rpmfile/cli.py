@@ -4,32 +4,112 @@ from datetime import datetime
 import os
 import io
 import sys
-import shutil
-import tempfile
+import json
 import argparse
 
 import rpmfile
+from rpmfile import scan
 
 
 def console_script_entry_point():
     main(*sys.argv[1:])
 
 
+def scan_console_script_entry_point():
+    scan_main(*sys.argv[1:])
+
+
+def scan_main(*argv):
+    parser = argparse.ArgumentParser(
+        prog="rpmfile-scan",
+        description="Print the headers of each RPM under a directory as JSON",
+    )
+    parser.add_argument("directory")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        help="Number of processes parsing headers, all CPUs by default",
+        default=None,
+    )
+    parser.add_argument(
+        "--cache",
+        dest="cache",
+        help="SQLite database of the headers of files already scanned",
+        default=None,
+    )
+    parser.add_argument(
+        "-t",
+        "--tag",
+        dest="tags",
+        action="append",
+        help="Header tag to output, may be repeated",
+        default=None,
+    )
+    args = parser.parse_args(argv)
+
+    output = {"scanned": 0}
+    for record in scan.scan(
+        args.directory,
+        cache=args.cache,
+        workers=args.jobs,
+        tags=args.tags or scan.DEFAULT_TAGS,
+    ):
+        print(json.dumps(record))
+        output["scanned"] += 1
+
+    return args, output
+
+
+def _extract_many(args):
+    dest = os.path.abspath(args.dest) + os.sep
+    if not os.path.isdir(dest):
+        raise FileNotFoundError(dest + " is not a directory")
+    results = rpmfile.extract_many(
+        args.infile,
+        dest,
+        workers=args.jobs,
+        decompressor=args.decompressor,
+        verify=args.verify,
+    )
+    output = {"extracted": [], "workers": []}
+    for result in results:
+        for rpminfo in result.members:
+            if args.verbose:
+                print(os.path.normpath(os.path.join(dest, rpminfo.name)))
+            output["extracted"].append(rpminfo.name.split("/"))
+    for i, (_, packages, size, seconds) in enumerate(
+        rpmfile.extract.worker_summary(results), 1
+    ):
+        rate = size / seconds if seconds else 0.0
+        print(
+            "worker %d: %d packages, %d bytes in %.2fs, %.1f MiB/s"
+            % (i, packages, size, seconds, rate / (1024 * 1024)),
+            file=sys.stderr,
+        )
+        output["workers"].append((packages, size, seconds, rate))
+    return output
+
+
 def main(*argv):
-    parser = argparse.ArgumentParser(prog="rpmfile")
-    parser.add_argument("infile")
+    parser = argparse.ArgumentParser(
+        prog="rpmfile",
+        epilog="To scan a directory tree of RPMs, use rpmfile-scan.",
+    )
+    parser.add_argument("infile", nargs="+")
     parser.add_argument(
         "-x",
         "--extract",
         dest="extract",
         action="store_true",
-        help="Extract the input RPM",
+        help="Extract the input RPMs",
     )
     parser.add_argument(
         "--max-spool",
         dest="max_spool",
         type=int,
-        help="Max GB for spool file if reading from stdin",
+        help="Ignored, stdin is read as a stream without spooling",
         default=10,
     )
     parser.add_argument(
@@ -40,6 +120,28 @@ def main(*argv):
         help="Extract to this directory when extracting files",
         default=".",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        help="Number of threads writing files when extracting, or of "
+        "processes when extracting several RPMs",
+        default=None,
+    )
+    parser.add_argument(
+        "--decompressor",
+        dest="decompressor",
+        help="Decompress the payload with this backend, 'auto' for the "
+        "fastest installed tool",
+        default=None,
+    )
+    parser.add_argument(
+        "--verify",
+        dest="verify",
+        action="store_true",
+        help="Check the payload digest while extracting",
+    )
     parser.add_argument(
         "-l",
         "--list",
@@ -63,26 +165,28 @@ def main(*argv):
     )
     args = parser.parse_args(argv)
 
+    if len(args.infile) > 1:
+        if not args.extract:
+            parser.error("only --extract takes more than one RPM")
+        if "-" in args.infile:
+            parser.error("standard input can only be extracted on its own")
+        return args, _extract_many(args)
+    args.infile = args.infile[0]
+
     if args.infile == "-":
-        args.infile = sys.stdin
-        if sys.version_info.major >= 3:
-            args.infile = args.infile.buffer
+        # a pipe is read in a single forward pass, files are written as
+        # the payload arrives
+        args.infile = sys.stdin.buffer
     else:
         args.infile = open(args.infile, "rb")
-
-    if args.infile == sys.stdin or args.infile == sys.stdin.buffer:
-        buf = tempfile.SpooledTemporaryFile(max_size=args.max_spool * 1024 * 1024)
-        shutil.copyfileobj(args.infile, buf)
-        buf.seek(0)
-    else:
-        buf = args.infile
+    buf = args.infile
 
     output = {}
 
     if args.list:
         output["list"] = []
         with rpmfile.open(fileobj=buf) as rpm:
-            for rpminfo in rpm.getmembers():
+            for rpminfo in rpm.getmembers(source="header"):
                 print(rpminfo.name)
                 output["list"].append(rpminfo.name.split("/"))
     elif args.info:
@@ -120,37 +224,18 @@ def main(*argv):
         dest = os.path.abspath(args.dest) + os.sep
         if not os.path.isdir(dest):
             raise FileNotFoundError(dest + " is not a directory")
-        with rpmfile.open(fileobj=buf) as rpm:
-            for rpminfo in rpm.getmembers():
-                with rpm.extractfile(rpminfo.name) as rpmfileobj:
-                    dirs = rpminfo.name.split("/")
-                    filename = dirs.pop()
-                    if dirs:
-                        dirs_path = os.path.realpath(os.path.join(dest, *dirs))
-                        if not dirs_path.startswith(dest):
-                            raise ValueError("Attempted path traversal: " + dirs_path)
-                        if not os.path.isdir(dirs_path):
-                            os.makedirs(dirs_path)
-                    target = os.path.realpath(os.path.join(dest, *(dirs + [filename])))
-                    if not target.startswith(dest):
-                        raise ValueError("Attempted path traversal: " + target)
-                    if rpminfo.issymlink:
-                        os.symlink(rpmfileobj.read().decode(), target)
-                    else:
-                        outfile = open(target, "wb")
-                        try:
-                            os.fchmod(outfile.fileno(), rpmfileobj.mode)
-                            shutil.copyfileobj(rpmfileobj, outfile)
-                        finally:
-                            outfile.close()
-                    if args.verbose:
-                        print(target)
-                    output["extracted"].append(rpminfo.name.split("/"))
+        with rpmfile.open(
+            fileobj=buf, decompressor=args.decompressor, verify=args.verify
+        ) as rpm:
+            workers = 1 if args.jobs is None else args.jobs
+            for rpminfo in rpm.extractall(dest, workers=workers):
+                if args.verbose:
+                    print(os.path.normpath(os.path.join(dest, rpminfo.name)))
+                output["extracted"].append(rpminfo.name.split("/"))
 
     else:
         raise Exception("Nothing to do")
 
-    buf.close()
     args.infile.close()
 
     return args, output
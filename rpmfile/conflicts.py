@@ -0,0 +1,137 @@
+"""
+Finding the files that a set of RPMs would install over each other, from
+their headers alone.
+
+    for conflict in rpmfile.conflicts.find_conflicts(paths):
+        print(conflict.path, conflict.first, conflict.second, conflict.reason)
+
+The file tables of all packages are joined on the path with a hash
+table, and only the files of paths that more than one package has are
+compared, the way rpm compares them when installing: a %ghost file, two
+%config files or files of different colors (multilib) never conflict,
+otherwise the file type and permissions, owner, link target and digest
+must be the same.
+"""
+
+import collections
+import io
+import os
+import stat
+
+from .deps import nevra
+from .fileindex import file_table
+from .headers import read_headers
+from .rpmdefs import RPMFILE_CONFIG, RPMFILE_GHOST
+
+Conflict = collections.namedtuple("Conflict", "path first second reason")
+
+
+class _Package(object):
+    """The file attributes of a package, decoded when first needed"""
+
+    def __init__(self, label, headers):
+        self.label = label
+        self._headers = headers
+        self._arrays = {}
+
+    def get(self, tag, i):
+        try:
+            values = self._arrays[tag]
+        except KeyError:
+            values = None
+            if tag in self._headers:
+                values = self._headers.getarray(tag)
+            self._arrays[tag] = values
+        if values is None or i >= len(values):
+            return None
+        return values[i]
+
+
+def _compare(a, i, b, j):
+    """Return why file `i' of `a' and file `j' of `b' conflict, or None"""
+    flags_a, flags_b = a.get("fileflags", i) or 0, b.get("fileflags", j) or 0
+    if (flags_a | flags_b) & RPMFILE_GHOST:
+        return None
+    if flags_a & flags_b & RPMFILE_CONFIG:
+        return None
+    color_a, color_b = a.get("filecolors", i), b.get("filecolors", j)
+    if color_a and color_b and color_a != color_b:
+        return None
+    mode_a, mode_b = a.get("filemodes", i), b.get("filemodes", j)
+    links = stat.S_ISLNK(mode_a or 0) and stat.S_ISLNK(mode_b or 0)
+    if not links and mode_a != mode_b:
+        return "mode"
+    if links or stat.S_ISREG(mode_a or 0):
+        # like rpm, shared directories may have different owners
+        for tag in ("fileusername", "filegroupname"):
+            if a.get(tag, i) != b.get(tag, j):
+                return "owner"
+    if links:
+        if a.get("filelinktos", i) != b.get("filelinktos", j):
+            return "link target"
+    elif stat.S_ISREG(mode_a or 0):
+        if a.get("filemd5s", i) != b.get("filemd5s", j):
+            return "digest"
+    return None
+
+
+def _read(path):
+    with io.open(path, "rb") as fileobj:
+        _, (_, headers) = read_headers(fileobj)
+    return headers
+
+
+def find_conflicts(packages):
+    """
+    Return a Conflict for each pair of files of `packages' that have the
+    same path and would conflict, with the labels of the earlier and later
+    package and the reason, "mode", "owner", "link target" or "digest".
+
+    `packages' are RPM paths, RPMFile objects or (label, main header)
+    pairs, in the order they would be installed. Only the headers are
+    read. The label of a path is the path, that of an RPMFile is its
+    name-version-release.arch.
+    """
+    loaded = []
+    for package in packages:
+        if isinstance(package, (str, bytes, os.PathLike)):
+            loaded.append(_Package(os.fsdecode(package), _read(package)))
+        elif hasattr(package, "main_headers"):
+            headers = package.main_headers
+            loaded.append(_Package(nevra(headers), headers))
+        else:
+            loaded.append(_Package(*package))
+
+    # the join: files by path, only the paths seen more than once are kept
+    # as lists
+    owners = {}
+    shared = []
+    for index, package in enumerate(loaded):
+        dirnames, dirindexes, basenames = file_table(package._headers)
+        for i, basename in enumerate(basenames):
+            path = dirnames[dirindexes[i]] + basename
+            entry = (index, i)
+            found = owners.get(path)
+            if found is None:
+                owners[path] = entry
+            elif isinstance(found, list):
+                found.append(entry)
+            else:
+                owners[path] = [found, entry]
+                shared.append(path)
+
+    conflicts = []
+    for path in shared:
+        files = owners[path]
+        for k, (later, j) in enumerate(files):
+            for earlier, i in files[:k]:
+                if earlier == later:
+                    continue
+                reason = _compare(loaded[earlier], i, loaded[later], j)
+                if reason is not None:
+                    conflicts.append(
+                        Conflict(
+                            path, loaded[earlier].label, loaded[later].label, reason
+                        )
+                    )
+    return conflicts
@@ -0,0 +1,313 @@
+"""
+Streaming readers for compressed RPM payloads.
+
+Readers are chosen from a registry of backends per compression type. Next
+to the in-process modules there are backends that pipe the payload
+through a locally installed, usually multi-threaded, tool such as pigz or
+xz -T0.
+"""
+
+import bz2
+import gzip
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+try:
+    from compression import zstd  # Python >= 3.14
+except ImportError:
+    zstd = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from . import bz2blocks, xzindex
+from .errors import NoLZMAModuleError, NoZSTANDARDModuleError, RPMError
+
+
+class _ZstandardFile(io.RawIOBase):
+    """
+    A seekable, read-only view of a zstd stream decompressed with the
+    zstandard module. Data is decompressed as it is read, so memory use is
+    bounded by the zstd window rather than the size of the payload.
+    Seeking forward decompresses and discards; seeking backward restarts
+    decompression from the start of the stream.
+    """
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._start = fileobj.tell()
+        self._open()
+
+    def _rewind(self):
+        self._fileobj.seek(self._start)
+        self._open()
+
+    def _open(self):
+        self._reader = zstandard.ZstdDecompressor().stream_reader(self._fileobj)
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = self._reader.readinto(b)
+        self._pos += n
+        return n
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            while self.read(io.DEFAULT_BUFFER_SIZE):
+                pass
+            offset += self._pos
+        if offset < self._pos:
+            self._rewind()
+        while self._pos < offset:
+            if not self.read(min(offset - self._pos, io.DEFAULT_BUFFER_SIZE)):
+                break
+        return self._pos
+
+
+def open_zstd(fileobj):
+    """
+    Return a file object streaming the decompressed contents of the zstd
+    compressed `fileobj'. Uses compression.zstd on Python >= 3.14 and falls
+    back to the zstandard module.
+    """
+    if zstd is not None:
+        return zstd.ZstdFile(fileobj)
+    if zstandard is not None:
+        return io.BufferedReader(_ZstandardFile(fileobj))
+    raise NoZSTANDARDModuleError("zstandard module not present")
+
+
+class _PipeFile(io.RawIOBase):
+    """
+    The output of the command `args' fed with the contents of `fileobj'
+    from a thread. Seeking forward reads and discards, seeking backward
+    runs the command again from the start of `fileobj'.
+    """
+
+    def __init__(self, args, fileobj, chunk_size=1024 * 1024):
+        self._args = args
+        self._fileobj = fileobj
+        self._start = fileobj.tell() if fileobj.seekable() else None
+        self._chunk_size = chunk_size
+        self._process = None
+        self._start_process()
+
+    def _start_process(self):
+        if self._start is not None:
+            self._fileobj.seek(self._start)
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            self._args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=self._stderr,
+        )
+        self._feeder = threading.Thread(
+            target=self._feed, args=(self._process.stdin,), daemon=True
+        )
+        self._feeder.start()
+        self._pos = 0
+
+    def _feed(self, stdin):
+        try:
+            while True:
+                data = self._fileobj.read(self._chunk_size)
+                if not data:
+                    break
+                stdin.write(data)
+        except (BrokenPipeError, ValueError):
+            # the command exited early, its exit status tells why
+            pass
+        finally:
+            try:
+                stdin.close()
+            except BrokenPipeError:
+                pass
+
+    def _stop_process(self):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        self._feeder.join()
+        process.wait()
+        self._stderr.close()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = self._process.stdout.readinto(b)
+        if not n:
+            # the command is done with its input, so is the feeder
+            self._feeder.join()
+        if not n and self._process.wait():
+            self._stderr.seek(0)
+            message = self._stderr.read().decode("utf-8", "replace").strip()
+            raise RPMError(
+                "%s exited with status %d: %s"
+                % (self._args[0], self._process.returncode, message)
+            )
+        self._pos += n
+        return n
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            while self.read(io.DEFAULT_BUFFER_SIZE):
+                pass
+            offset += self._pos
+        if offset < self._pos:
+            if self._start is None:
+                raise io.UnsupportedOperation("can not seek backward in a stream")
+            self._stop_process()
+            self._start_process()
+        while self._pos < offset:
+            if not self.read(min(offset - self._pos, io.DEFAULT_BUFFER_SIZE)):
+                break
+        return self._pos
+
+    def close(self):
+        self._stop_process()
+        super(_PipeFile, self).close()
+
+
+def _open_xz(fileobj, threads):
+    if xzindex.lzma is None:
+        raise NoLZMAModuleError("lzma module not present")
+    return xzindex.open_xz(fileobj, threads)
+
+
+def _open_gzip(fileobj, threads):
+    return gzip.GzipFile(fileobj=fileobj)
+
+
+def _open_zstd(fileobj, threads):
+    return open_zstd(fileobj)
+
+
+def _command(*args):
+    """
+    A backend piping the payload through the command `args', with "{T}"
+    in arguments replaced by the number of threads to use (all CPUs if
+    not set).
+    """
+
+    def open_pipe(fileobj, threads):
+        threads = str(threads or os.cpu_count() or 1)
+        command = [arg.replace("{T}", threads) for arg in args]
+        return io.BufferedReader(_PipeFile(command, fileobj))
+
+    open_pipe.command = args[0]
+    return open_pipe
+
+
+# compression -> backend name -> function(fileobj, threads) returning a
+# file object of the decompressed payload. Names are in order of
+# preference for "auto", which falls back to "python".
+backends = {
+    "gzip": {
+        "pigz": _command("pigz", "-dc", "-p", "{T}"),
+        "unpigz": _command("unpigz", "-c", "-p", "{T}"),
+        "python": _open_gzip,
+    },
+    "xz": {
+        "xz": _command("xz", "-dc", "-T{T}"),
+        "python": _open_xz,
+    },
+    "bzip2": {
+        "lbzip2": _command("lbzip2", "-dc", "-n", "{T}"),
+        "pbzip2": _command("pbzip2", "-dc", "-p{T}"),
+        # ahead of plain bzip2, which decompresses on one thread only
+        "python": bz2blocks.open_bzip2,
+        "bzip2": _command("bzip2", "-dc"),
+    },
+    "zstd": {
+        "zstd": _command("zstd", "-dcq"),
+        "python": _open_zstd,
+    },
+}
+
+
+def register(compression, name, factory):
+    """
+    Add the backend `name' for payloads compressed with `compression'.
+    `factory' is called with the compressed payload and the number of
+    threads to use (or None) and returns a file object of the
+    decompressed payload.
+    """
+    backends.setdefault(compression, {})[name] = factory
+
+
+def available(compression):
+    """Return the names of the usable backends for `compression'"""
+    return [
+        name
+        for name, factory in backends.get(compression, {}).items()
+        if getattr(factory, "command", None) is None or shutil.which(factory.command)
+    ]
+
+
+def _choose(compression, decompressor):
+    if isinstance(decompressor, dict):
+        decompressor = decompressor.get(compression)
+    if decompressor is None:
+        decompressor = "python"
+    names = available(compression)
+    if decompressor == "auto":
+        return names[0] if names else "python"
+    if decompressor not in backends.get(compression, {}):
+        # a backend for other compressions, like "xz" for a gzip payload
+        return "python"
+    if decompressor not in names:
+        # the tool is not installed here
+        return "python"
+    return decompressor
+
+
+def open_payload(fileobj, compression, decompressor=None, threads=None):
+    """
+    Return a file object of the decompressed contents of `fileobj',
+    compressed with `compression' ("gzip", "xz", "bzip2" or "zstd").
+
+    `decompressor' picks the backend: None or "python" for the in-process
+    modules, "auto" for the first installed tool, or a backend name, like
+    "pigz". It may also be a dict of such values by compression. Backends
+    whose tool is not installed fall back to "python".
+    """
+    factory = backends[compression][_choose(compression, decompressor)]
+    start = fileobj.tell()
+    try:
+        return factory(fileobj, threads)
+    except OSError:
+        if factory is backends[compression]["python"]:
+            raise
+        # the tool could not be started, nothing was read yet
+        if fileobj.seekable():
+            fileobj.seek(start)
+        return backends[compression]["python"](fileobj, threads)
@@ -0,0 +1,201 @@
+"""
+An index of the dependencies of many RPMs, for questions like "what
+provides libfoo.so.1()(64bit)" or "what requires bash >= 5".
+
+    index = rpmfile.depindex.DepIndex.from_paths(paths, workers=8)
+    index.whatprovides("libfoo.so.1()(64bit)")
+    index.whatrequires("bash", ">=", "5.0")
+    index.save("deps.idx")
+    index = rpmfile.depindex.DepIndex.load("deps.idx")
+
+Capability names, package labels and versions are interned once in
+sorted string tables. Each kind of dependency is a set of parallel
+integer arrays sorted by name id, so a lookup is a binary search. A
+snapshot is these tables and arrays as they are in memory, and loading
+one maps it rather than reading it.
+"""
+
+import bisect
+import concurrent.futures
+import io
+
+from ._snapshot import _load, _save, _Strings, _uint32
+from .deps import KINDS, dependencies, nevra, overlaps
+from .errors import RPMError
+from .headers import read_headers
+from .rpmdefs import RPMSENSE_EQUAL, RPMSENSE_GREATER, RPMSENSE_LESS
+
+_MAGIC = b"RPMDEPIX"
+_kinds = tuple(KINDS)
+
+_operators = {
+    "<": RPMSENSE_LESS,
+    "<=": RPMSENSE_LESS | RPMSENSE_EQUAL,
+    "=": RPMSENSE_EQUAL,
+    "==": RPMSENSE_EQUAL,
+    ">=": RPMSENSE_GREATER | RPMSENSE_EQUAL,
+    ">": RPMSENSE_GREATER,
+}
+
+
+def _flags(operator):
+    if isinstance(operator, int):
+        return operator
+    try:
+        return _operators[operator]
+    except KeyError:
+        raise ValueError("unknown operator %r" % operator)
+
+
+def _read_package(path):
+    with io.open(path, "rb") as fileobj:
+        _, (_, headers) = read_headers(fileobj)
+    return nevra(headers), {kind: dependencies(headers, kind) for kind in _kinds}
+
+
+def _read_chunk(paths):
+    packages = []
+    for path in paths:
+        try:
+            packages.append(_read_package(path))
+        except (OSError, RPMError, EOFError):
+            packages.append(None)
+    return packages
+
+
+class DepIndex(object):
+    """
+    The dependencies of a set of packages, by kind: provides, requires,
+    conflicts, obsoletes and the weak dependencies, see rpmfile.deps.KINDS.
+    Packages are numbered in the order they were added.
+    """
+
+    def __init__(self, names, labels, evrs, tables, buffer=None):
+        self._names = names
+        self._labels = labels
+        self._evrs = evrs
+        # (name ids, package ids, flags, evr ids) by kind
+        self._tables = tables
+        self._buffer = buffer
+
+    @classmethod
+    def build(cls, packages):
+        """
+        Build an index from (label, dependencies) pairs, where dependencies
+        is a dict of (name, flags, version) lists by kind, as returned by
+        rpmfile.deps.dependencies().
+        """
+        labels = []
+        # the name, package, flags and version columns of each kind
+        columns = {kind: ([], [], [], []) for kind in _kinds}
+        for pkg, (label, deps) in enumerate(packages):
+            labels.append(label)
+            for kind, items in deps.items():
+                if items:
+                    names, pkgs, flags, evrs = columns[kind]
+                    item_names, item_flags, item_evrs = zip(*items)
+                    names.extend(item_names)
+                    pkgs.extend([pkg] * len(items))
+                    flags.extend(item_flags)
+                    evrs.extend(item_evrs)
+        # str order is code point order, which is also UTF-8 byte order
+        names = sorted(set().union(*(c[0] for c in columns.values())))
+        name_ids = {name: i for i, name in enumerate(names)}
+        evrs = sorted(set([""]).union(*(c[3] for c in columns.values())))
+        evr_ids = {evr: i for i, evr in enumerate(evrs)}
+        tables = {}
+        for kind, (kind_names, pkgs, flags, kind_evrs) in columns.items():
+            ids = [name_ids[name] for name in kind_names]
+            # a stable sort keeps each name's packages in order
+            order = sorted(range(len(ids)), key=ids.__getitem__)
+            tables[kind] = (
+                _uint32([ids[i] for i in order]),
+                _uint32([pkgs[i] for i in order]),
+                _uint32([flags[i] for i in order]),
+                _uint32([evr_ids[kind_evrs[i]] for i in order]),
+            )
+        return cls(
+            _Strings.build(names), _Strings.build(labels), _Strings.build(evrs), tables
+        )
+
+    @classmethod
+    def from_headers(cls, headers):
+        """Build an index from the main headers of packages"""
+        return cls.build(
+            (nevra(h), {kind: dependencies(h, kind) for kind in _kinds})
+            for h in headers
+        )
+
+    @classmethod
+    def from_paths(cls, paths, workers=None, chunk_size=64):
+        """
+        Build an index of the RPMs at `paths', reading their headers in
+        `workers' processes, all CPUs by default or the calling process
+        with 1. Files that cannot be read are left out.
+        """
+        paths = list(paths)
+        chunks = [paths[i : i + chunk_size] for i in range(0, len(paths), chunk_size)]
+        if workers == 1 or len(chunks) < 2:
+            results = map(_read_chunk, chunks)
+            return cls.build(p for chunk in results for p in chunk if p)
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            results = executor.map(_read_chunk, chunks)
+            return cls.build(p for chunk in results for p in chunk if p)
+
+    def __len__(self):
+        return len(self._labels)
+
+    def label(self, pkg):
+        """Return the label of package `pkg'"""
+        return self._labels.get(pkg)
+
+    def lookup(self, kind, name):
+        """
+        Return the (package id, flags, version) of each dependency of
+        `kind' on `name', in the order of package ids.
+        """
+        name_id = self._names.find(name)
+        if name_id < 0:
+            return []
+        name_ids, pkgs, flags, evrs = self._tables[kind]
+        lo = bisect.bisect_left(name_ids, name_id)
+        hi = bisect.bisect_right(name_ids, name_id, lo)
+        return [(pkgs[i], flags[i], self._evrs.get(evrs[i])) for i in range(lo, hi)]
+
+    def what(self, kind, name, operator=0, version=""):
+        """
+        Return the labels of the packages with a dependency of `kind' on
+        `name' whose range overlaps `operator' `version', like ">=" "1.0",
+        or any range without a version.
+        """
+        flags = _flags(operator)
+        labels = []
+        seen = set()
+        for pkg, dep_flags, evr in self.lookup(kind, name):
+            if pkg not in seen and overlaps(dep_flags, evr, flags, version):
+                seen.add(pkg)
+                labels.append(self._labels.get(pkg))
+        return labels
+
+    def whatprovides(self, name, operator=0, version=""):
+        return self.what("provides", name, operator, version)
+
+    def whatrequires(self, name, operator=0, version=""):
+        return self.what("requires", name, operator, version)
+
+    def save(self, path):
+        """Write a snapshot of the index to `path'"""
+        arrays = [column for kind in _kinds for column in self._tables[kind]]
+        _save(path, _MAGIC, [self._names, self._labels, self._evrs], arrays)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Open a snapshot written by save(). It is mapped into memory and
+        its arrays are used in place.
+        """
+        buffer, strings, arrays = _load(path, _MAGIC, 3)
+        tables = {
+            kind: tuple(arrays[4 * k : 4 * k + 4]) for k, kind in enumerate(_kinds)
+        }
+        return cls(*strings, tables, buffer=buffer)
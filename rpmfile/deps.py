@@ -0,0 +1,100 @@
+"""
+Reading the dependencies and file lists of RPM headers, without the
+payload.
+"""
+
+from .rpmdefs import RPMSENSE_GREATER, RPMSENSE_LESS, RPMSENSE_SENSEMASK
+from .version import compare_evr, split_evr
+
+# the name, flags and version tags of each kind of dependency
+KINDS = {
+    "provides": ("provides", "provideflags", "provideversion"),
+    "requires": ("requirename", "requireflags", "requireversion"),
+    "conflicts": ("conflictname", "conflictflags", "conflictversion"),
+    "obsoletes": ("obsoletes", "obsoleteflags", "obsoleteversion"),
+    "recommends": ("recommendname", "recommendflags", "recommendversion"),
+    "suggests": ("suggestname", "suggestflags", "suggestversion"),
+    "supplements": ("supplementname", "supplementflags", "supplementversion"),
+    "enhances": ("enhancename", "enhanceflags", "enhanceversion"),
+}
+
+
+def _decode(value):
+    # surrogateescape keeps paths that are not UTF-8 apart, as the file
+    # index does
+    return value.decode("utf-8", "surrogateescape")
+
+
+def dependencies(headers, kind):
+    """
+    Return the dependencies of `kind' (a key of KINDS) in `headers' as a
+    list of (name, flags, version) tuples, with an empty version for
+    unversioned ones.
+    """
+    name_tag, flags_tag, version_tag = KINDS[kind]
+    if name_tag not in headers:
+        return []
+    names = headers.getarray(name_tag)
+    flags = headers.getarray(flags_tag) if flags_tag in headers else None
+    versions = headers.getarray(version_tag) if version_tag in headers else None
+    return [
+        (
+            _decode(name),
+            flags[i] if flags is not None else 0,
+            _decode(versions[i]) if versions is not None else "",
+        )
+        for i, name in enumerate(names)
+    ]
+
+
+def overlaps(flags_a, evr_a, flags_b, evr_b):
+    """
+    Return whether the version ranges of two dependencies on the same
+    name overlap, like a provide of `evr_a' with sense `flags_a' and a
+    require of `evr_b' with sense `flags_b'. Unversioned ones match any
+    version.
+    """
+    sense_a = flags_a & RPMSENSE_SENSEMASK
+    sense_b = flags_b & RPMSENSE_SENSEMASK
+    if not (sense_a and sense_b and evr_a and evr_b):
+        return True
+    rc = compare_evr(split_evr(evr_a), split_evr(evr_b))
+    if rc < 0:
+        return bool(sense_a & RPMSENSE_GREATER or sense_b & RPMSENSE_LESS)
+    if rc > 0:
+        return bool(sense_a & RPMSENSE_LESS or sense_b & RPMSENSE_GREATER)
+    return bool(sense_a & sense_b)
+
+
+def nevra(headers):
+    """
+    Return "name-[epoch:]version-release.arch" of `headers', with "src" as
+    the arch of a source package, which like rpm tells apart by it having
+    no sourcerpm tag.
+    """
+    epoch = headers.get("serial")
+    return "%s-%s%s-%s.%s" % (
+        _decode(headers.get("name", b"")),
+        "" if epoch is None else "%d:" % epoch,
+        _decode(headers.get("version", b"")),
+        _decode(headers.get("release", b"")),
+        _decode(headers.get("arch", b"")) if "sourcerpm" in headers else "src",
+    )
+
+
+def filenames(headers):
+    """
+    Return the paths of the files in `headers', from the dirnames,
+    dirindexes and basenames tags or from oldfilenames in old packages.
+    """
+    if "basenames" in headers:
+        basenames = headers.getarray("basenames")
+        dirnames = [_decode(d) for d in headers.getarray("dirnames")]
+        dirindexes = headers.getarray("dirindexes")
+        return [
+            dirnames[dirindexes[i]] + _decode(basename)
+            for i, basename in enumerate(basenames)
+        ]
+    if "oldfilenames" in headers:
+        return [_decode(name) for name in headers.getarray("oldfilenames")]
+    return []
@@ -7,3 +7,15 @@ Created on Jan 10, 2014
 
 class RPMError(Exception):
     pass
+
+
+class NoLZMAModuleError(NotImplementedError):
+    pass
+
+
+class NoZSTANDARDModuleError(NotImplementedError):
+    pass
+
+
+class NoBytesIOError(NotImplementedError):
+    pass
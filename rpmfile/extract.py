@@ -0,0 +1,377 @@
+"""
+Extraction of RPM members to a directory, overlapping decompression with
+disk writes.
+
+One thread (the caller's) decompresses the payload, walks the cpio stream,
+creates directories and symlinks, and hands file data to a pool of writer
+threads in chunks. All chunks of one path go to the same writer, in order,
+so later members still replace earlier ones with the same name, and the
+bytes handed over but not yet written are capped so memory stays bounded.
+
+extract_many() extracts several RPMs into one root in a pool of
+processes. Which package writes each path is decided up front from the
+headers, the last one in the order given like with `rpm -i', and the
+directories and symlinks are created before any payload is read, so the
+processes never race on a path.
+"""
+
+import collections
+import concurrent.futures
+import io
+import os
+import queue
+import stat
+import threading
+import time
+
+from .deps import _decode, filenames
+from .headers import read_headers
+from .io_extra import _copyfileobj
+from .rpmdefs import RPMFILE_GHOST
+
+MiB = 1024 * 1024
+
+_open_flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_CLOEXEC", 0)
+
+
+class _ByteBudget(object):
+    """Blocks producers while more than `limit' bytes are in flight"""
+
+    def __init__(self, limit):
+        self._limit = limit
+        self._used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, n):
+        with self._cond:
+            # always let a chunk through when nothing is in flight, even one
+            # bigger than the limit
+            while self._used and self._used + n > self._limit:
+                self._cond.wait()
+            self._used += n
+
+    def release(self, n):
+        with self._cond:
+            self._used -= n
+            self._cond.notify_all()
+
+
+def _check(dest, path):
+    if not (path + os.sep).startswith(dest):
+        raise ValueError("Attempted path traversal: " + path)
+
+
+def _make_room(path):
+    """Remove a file, symlink or empty directory at `path' to put another there"""
+    if os.path.isdir(path) and not os.path.islink(path):
+        os.rmdir(path)
+    elif os.path.lexists(path):
+        os.unlink(path)
+
+
+def _open_target(dest, target, mode):
+    """Create `target' for writing without following a symlink out of `dest'"""
+    try:
+        fd = os.open(target, _open_flags | getattr(os, "O_NOFOLLOW", 0), 0o600)
+    except OSError:
+        # a symlink (or something else) is in the way, only follow it if it
+        # stays inside dest
+        _check(dest, os.path.realpath(target))
+        fd = os.open(target, _open_flags, 0o600)
+    os.fchmod(fd, mode)
+    return os.fdopen(fd, "wb", buffering=0)
+
+
+class _Extractor(object):
+    def __init__(self, path, workers, max_inflight):
+        self.dest = os.path.realpath(path) + os.sep
+        self.budget = _ByteBudget(max_inflight)
+        self.queues = [queue.Queue() for _ in range(workers)]
+        self.threads = [
+            threading.Thread(target=self._write, args=(q,), daemon=True)
+            for q in self.queues
+        ]
+        self.errors = []
+        # directories already created and checked, by their names in the
+        # archive, so each is only resolved with realpath() once
+        self.dirs = {(): self.dest[:-1]}
+        # paths handed to a writer and not written yet, by number of writes
+        self.pending = {}
+        self.pending_cond = threading.Condition()
+        # without writer threads, every file is copied through this buffer
+        self.buffer = None
+
+    def _write(self, jobs):
+        outfile = None
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            kind, target, arg = job
+            try:
+                if self.errors:
+                    continue
+                if kind == "open":
+                    outfile = _open_target(self.dest, target, arg)
+                elif kind == "data":
+                    outfile.write(arg)
+                elif kind == "close":
+                    outfile.close()
+                    outfile = None
+            except Exception as error:
+                self.errors.append(error)
+            finally:
+                if kind == "data":
+                    self.budget.release(len(arg))
+                elif kind == "close":
+                    self._done(target)
+        if outfile is not None:
+            outfile.close()
+
+    def _done(self, target):
+        with self.pending_cond:
+            self.pending[target] -= 1
+            if not self.pending[target]:
+                del self.pending[target]
+                self.pending_cond.notify_all()
+
+    def _wait_for(self, path):
+        """Wait until writers are done with `path' before reusing it"""
+        with self.pending_cond:
+            while path in self.pending and not self.errors:
+                self.pending_cond.wait()
+
+    def _makedirs(self, dirs):
+        dirs = tuple(dirs)
+        path = self.dirs.get(dirs)
+        if path is None:
+            for i in range(1, len(dirs) + 1):
+                self._wait_for(os.path.normpath(os.path.join(self.dest, *dirs[:i])))
+            path = os.path.realpath(os.path.join(self.dest, *dirs))
+            _check(self.dest, path)
+            os.makedirs(path, exist_ok=True)
+            self.dirs[dirs] = path
+        return path
+
+    def extract(self, rpm, chunk_size, wanted=None):
+        extracted = []
+        for thread in self.threads:
+            thread.start()
+        try:
+            for rpminfo, rpmfileobj in rpm.iter_members():
+                if self.errors:
+                    break
+                if wanted is not None:
+                    if _member_path(rpminfo.name) not in wanted:
+                        continue
+                    if rpminfo.issymlink:
+                        # created up front by extract_many()
+                        extracted.append(rpminfo)
+                        continue
+                dirs = rpminfo.name.split("/")
+                filename = dirs.pop()
+                target = os.path.normpath(os.path.join(self._makedirs(dirs), filename))
+                if filename in ("", ".", ".."):
+                    _check(self.dest, os.path.realpath(target))
+                if rpminfo.issymlink:
+                    self._wait_for(target)
+                    # not the target itself, an old link may point anywhere
+                    _check(self.dest, os.path.realpath(os.path.dirname(target)))
+                    _make_room(target)
+                    os.symlink(_decode(rpmfileobj.read()), target)
+                else:
+                    self._write_file(target, rpminfo.mode, rpmfileobj, chunk_size)
+                extracted.append(rpminfo)
+        finally:
+            for jobs in self.queues:
+                jobs.put(None)
+            for thread in self.threads:
+                thread.join()
+        if self.errors:
+            raise self.errors[0]
+        return extracted
+
+    def _write_file(self, target, mode, rpmfileobj, chunk_size):
+        if not self.queues:
+            if self.buffer is None or len(self.buffer) != chunk_size:
+                self.buffer = bytearray(chunk_size)
+            with _open_target(self.dest, target, mode) as outfile:
+                _copyfileobj(rpmfileobj, outfile, buf=self.buffer)
+            return
+        jobs = self.queues[hash(target) % len(self.queues)]
+        with self.pending_cond:
+            self.pending[target] = self.pending.get(target, 0) + 1
+        jobs.put(("open", target, mode))
+        while True:
+            chunk = rpmfileobj.read(chunk_size)
+            if not chunk:
+                break
+            self.budget.acquire(len(chunk))
+            jobs.put(("data", target, chunk))
+        jobs.put(("close", target, None))
+
+
+def extractall(rpm, path=".", workers=1, max_inflight=64 * MiB, chunk_size=MiB):
+    """
+    Extract all members of `rpm' into the directory `path' in a single
+    pass over the payload, with `workers' threads writing files while the
+    payload is decompressed. At most `max_inflight' bytes of decompressed
+    data wait to be written at any time. With `workers' set to 0 files are
+    written by the calling thread. Return the extracted RPMInfo objects.
+    """
+    return _Extractor(path, max(0, workers), max_inflight).extract(rpm, chunk_size)
+
+
+Extracted = collections.namedtuple("Extracted", "path members worker bytes seconds")
+
+
+def _member_path(name):
+    """The path of archive member `name' as the headers list it"""
+    if name.startswith("./"):
+        return name[1:]
+    if not name.startswith("/"):
+        return "/" + name
+    return name
+
+
+def _plan(paths):
+    """
+    Read the headers of `paths' and return the directories to create, the
+    symlinks to create by path and the files and symlinks each package
+    extracts, the last package having a path winning it.
+    """
+    owners = {}
+    for index, path in enumerate(paths):
+        with io.open(path, "rb") as fileobj:
+            _, (_, headers) = read_headers(fileobj)
+        names = filenames(headers)
+        get = lambda tag: headers.getarray(tag) if tag in headers else None
+        modes, flags, links = get("filemodes"), get("fileflags"), get("filelinktos")
+        for i, name in enumerate(names):
+            if flags is not None and flags[i] & RPMFILE_GHOST:
+                continue
+            mode = modes[i] if modes is not None else stat.S_IFREG
+            link = links[i].decode("utf-8", "surrogateescape") if links else ""
+            owners[name] = (index, mode, link)
+    dirs = set()
+    symlinks = {}
+    files = [set() for _ in paths]
+    for name, (index, mode, link) in owners.items():
+        if stat.S_ISDIR(mode):
+            dirs.add(name)
+        else:
+            if stat.S_ISLNK(mode):
+                symlinks[name] = link
+            files[index].add(name)
+        child, parent = name, os.path.dirname(name)
+        while parent not in ("/", "", child):
+            dirs.add(parent)
+            child, parent = parent, os.path.dirname(parent)
+    # a path some package has as a symlink is not also made a directory
+    dirs.difference_update(symlinks)
+    return dirs, symlinks, files
+
+
+def _under_symlink(name, symlinks):
+    parent = os.path.dirname(name)
+    while parent not in ("/", ""):
+        if parent in symlinks:
+            return True
+        name, parent = parent, os.path.dirname(parent)
+    return False
+
+
+def _prepare(dest, dirs, symlinks):
+    """
+    Create `dirs' and `symlinks' in `dest', in sorted order: the
+    directories first, then the symlinks, then the directories that are
+    reached through a symlink.
+    """
+    target = lambda name: os.path.normpath(os.path.join(dest, name.lstrip("/")))
+    through = sorted(d for d in dirs if _under_symlink(d, symlinks))
+    for name in sorted(dirs.difference(through)):
+        path = target(name)
+        _check(dest, os.path.realpath(path))
+        os.makedirs(path, exist_ok=True)
+    for name in sorted(symlinks):
+        path = target(name)
+        _check(dest, os.path.realpath(os.path.dirname(path)))
+        _make_room(path)
+        os.symlink(symlinks[name], path)
+    for name in through:
+        path = os.path.realpath(target(name))
+        _check(dest, path)
+        os.makedirs(path, exist_ok=True)
+
+
+def _extract_package(path, dest, wanted, decompressor, chunk_size, verify):
+    from . import open as open_rpm
+
+    start = time.monotonic()
+    with open_rpm(path, decompressor=decompressor, verify=verify) as rpm:
+        members = _Extractor(dest, 0, 0).extract(rpm, chunk_size, wanted)
+    return Extracted(
+        path,
+        members,
+        os.getpid(),
+        sum(member.size for member in members),
+        time.monotonic() - start,
+    )
+
+
+def extract_many(
+    paths, root=".", workers=None, decompressor=None, chunk_size=MiB, verify=False
+):
+    """
+    Extract the RPMs at `paths' into the directory `root' in `workers'
+    processes, all CPUs by default or the calling process with 1. When
+    several packages have a path, the last one in `paths' writes it, like
+    installing them in that order. Return an Extracted tuple for each
+    package, in order, with the members written, the worker process that
+    wrote them, their size and the time taken. With `verify' the payload
+    digest of each package is checked as it is extracted.
+    """
+    paths = [os.fspath(path) for path in paths]
+    dest = os.path.realpath(root) + os.sep
+    dirs, symlinks, files = _plan(paths)
+    _prepare(dest, dirs, symlinks)
+    if workers == 1 or len(paths) < 2:
+        return [
+            _extract_package(path, dest, wanted, decompressor, chunk_size, verify)
+            for path, wanted in zip(paths, files)
+        ]
+    # the biggest packages first, so no worker is left with one at the end
+    order = sorted(range(len(paths)), key=lambda i: -os.path.getsize(paths[i]))
+    results = [None] * len(paths)
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        futures = {
+            executor.submit(
+                _extract_package,
+                paths[i],
+                dest,
+                files[i],
+                decompressor,
+                chunk_size,
+                verify,
+            ): i
+            for i in order
+        }
+        for future in concurrent.futures.as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
+
+def worker_summary(results):
+    """
+    Return (worker, packages, bytes, seconds) for each worker process of
+    the Extracted `results', in the order the workers first appear.
+    """
+    totals = collections.OrderedDict()
+    for result in results:
+        packages, size, seconds = totals.get(result.worker, (0, 0, 0.0))
+        totals[result.worker] = (
+            packages + 1,
+            size + result.bytes,
+            seconds + result.seconds,
+        )
+    return [(worker,) + total for worker, total in totals.items()]
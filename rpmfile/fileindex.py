@@ -0,0 +1,237 @@
+"""
+An index of the files of many RPMs, for questions like "which package
+owns /usr/lib64/libssl.so.3", answered from the headers alone.
+
+    index = rpmfile.fileindex.FileIndex.from_paths(paths, workers=8)
+    index.owners("/usr/lib64/libssl.so.3")
+    for path, label in index.glob("/usr/lib64/libssl.so.*"):
+        ...
+    index.save("files.idx")
+    index = rpmfile.fileindex.FileIndex.load("files.idx")
+
+Directories and basenames are interned once across all packages in
+sorted string tables, and the files are three parallel arrays of
+directory id, basename id and package id sorted by directory and then
+basename. The files under a directory prefix are then one contiguous
+range of the arrays. Snapshots are mapped like those of
+rpmfile.depindex.
+"""
+
+import bisect
+import concurrent.futures
+import fnmatch
+import io
+import re
+
+from ._snapshot import _load, _save, _Strings, _uint32
+from .deps import _decode, nevra
+from .errors import RPMError
+from .headers import read_headers
+
+_MAGIC = b"RPMFILIX"
+_wildcards = re.compile(r"[*?[]")
+
+
+def _encode(value):
+    return value.encode("utf-8", "surrogateescape")
+
+
+def _successor(key):
+    """The smallest bytes after all that start with `key', or None"""
+    key = key.rstrip(b"\xff")
+    if not key:
+        return None
+    return key[:-1] + bytes([key[-1] + 1])
+
+
+def file_table(headers):
+    """
+    Return the dirnames, dirindexes and basenames of the files in the main
+    header `headers', split from oldfilenames in old packages.
+    """
+    if "basenames" in headers:
+        return (
+            [_decode(d) for d in headers.getarray("dirnames")],
+            headers.getarray("dirindexes"),
+            [_decode(b) for b in headers.getarray("basenames")],
+        )
+    dirnames, dirindexes, basenames = [], [], []
+    if "oldfilenames" in headers:
+        ids = {}
+        for name in headers.getarray("oldfilenames"):
+            dirname, _, basename = _decode(name).rpartition("/")
+            dirname += "/"
+            if dirname not in ids:
+                ids[dirname] = len(dirnames)
+                dirnames.append(dirname)
+            dirindexes.append(ids[dirname])
+            basenames.append(basename)
+    return dirnames, dirindexes, basenames
+
+
+def _read_chunk(paths):
+    packages = []
+    for path in paths:
+        try:
+            with io.open(path, "rb") as fileobj:
+                _, (_, headers) = read_headers(fileobj)
+            packages.append((nevra(headers),) + file_table(headers))
+        except (OSError, RPMError, EOFError):
+            pass
+    return packages
+
+
+def _split(path):
+    dirname, _, basename = path.rpartition("/")
+    return dirname + "/", basename
+
+
+class FileIndex(object):
+    """The paths of the files of a set of packages, by directory"""
+
+    def __init__(self, dirs, basenames, labels, dir_ids, base_ids, pkgs, buffer=None):
+        self._dirs = dirs
+        self._basenames = basenames
+        self._labels = labels
+        self._dir_ids = dir_ids
+        self._base_ids = base_ids
+        self._pkgs = pkgs
+        self._buffer = buffer
+
+    @classmethod
+    def build(cls, packages):
+        """
+        Build an index from (label, dirnames, dirindexes, basenames) tuples,
+        as file_table() returns them with a label in front.
+        """
+        labels = []
+        dirs = {}
+        dir_col, base_col, pkg_col = [], [], []
+        for pkg, (label, dirnames, dirindexes, basenames) in enumerate(packages):
+            labels.append(label)
+            local = [dirs.setdefault(d, len(dirs)) for d in dirnames]
+            dir_col.extend([local[i] for i in dirindexes])
+            base_col.extend(basenames)
+            pkg_col.extend([pkg] * len(basenames))
+        # ids in sorted order of the encoded strings, which is not str order
+        # for the surrogates of bytes that are not UTF-8
+        dir_names = sorted(dirs, key=_encode)
+        remap = [0] * len(dirs)
+        for i, d in enumerate(dir_names):
+            remap[dirs[d]] = i
+        dir_col = [remap[i] for i in dir_col]
+        base_names = sorted(set(base_col), key=_encode)
+        base_ids = {b: i for i, b in enumerate(base_names)}
+        base_col = [base_ids[b] for b in base_col]
+        width = len(base_names)
+        keys = [d * width + b for d, b in zip(dir_col, base_col)]
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        return cls(
+            _Strings.build(dir_names),
+            _Strings.build(base_names),
+            _Strings.build(labels),
+            _uint32([dir_col[i] for i in order]),
+            _uint32([base_col[i] for i in order]),
+            _uint32([pkg_col[i] for i in order]),
+        )
+
+    @classmethod
+    def from_headers(cls, headers):
+        """Build an index from the main headers of packages"""
+        return cls.build((nevra(h),) + file_table(h) for h in headers)
+
+    @classmethod
+    def from_paths(cls, paths, workers=None, chunk_size=64):
+        """
+        Build an index of the RPMs at `paths', reading their headers in
+        `workers' processes, all CPUs by default or the calling process
+        with 1. Files that cannot be read are left out.
+        """
+        paths = list(paths)
+        chunks = [paths[i : i + chunk_size] for i in range(0, len(paths), chunk_size)]
+        if workers == 1 or len(chunks) < 2:
+            return cls.build(p for chunk in map(_read_chunk, chunks) for p in chunk)
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            results = executor.map(_read_chunk, chunks)
+            return cls.build(p for chunk in results for p in chunk)
+
+    def __len__(self):
+        return len(self._pkgs)
+
+    def _dir_range(self, lo, hi):
+        """The range of files in directories `lo' to `hi' (excluded)"""
+        return (
+            bisect.bisect_left(self._dir_ids, lo),
+            bisect.bisect_left(self._dir_ids, hi),
+        )
+
+    def _entries(self, lo, hi):
+        for i in range(lo, hi):
+            path = self._dirs.get(self._dir_ids[i]) + self._basenames.get(
+                self._base_ids[i]
+            )
+            yield path, self._labels.get(self._pkgs[i])
+
+    def owners(self, path):
+        """Return the labels of the packages that have the file `path'"""
+        dirname, basename = _split(path)
+        dir_id = self._dirs.find(dirname)
+        base_id = self._basenames.find(basename)
+        if dir_id < 0 or base_id < 0:
+            return []
+        lo, hi = self._dir_range(dir_id, dir_id + 1)
+        lo = bisect.bisect_left(self._base_ids, base_id, lo, hi)
+        hi = bisect.bisect_right(self._base_ids, base_id, lo, hi)
+        return [self._labels.get(self._pkgs[i]) for i in range(lo, hi)]
+
+    def _prefix(self, prefix):
+        """The range of files in directories that start with `prefix'"""
+        key = _encode(prefix)
+        lo = bisect.bisect_left(self._dirs, key)
+        end = _successor(key)
+        hi = len(self._dirs) if end is None else bisect.bisect_left(self._dirs, end, lo)
+        return self._dir_range(lo, hi)
+
+    def under(self, directory):
+        """
+        Yield the (path, label) of each file under `directory', and of
+        `directory' itself.
+        """
+        directory = directory.rstrip("/")
+        for label in self.owners(directory):
+            yield directory, label
+        for entry in self._entries(*self._prefix(directory + "/")):
+            yield entry
+
+    def glob(self, pattern):
+        """
+        Yield the (path, label) of each file matching the fnmatch `pattern',
+        in which `*' also matches `/'. Only the directories that start like
+        the pattern are searched.
+        """
+        match = re.compile(fnmatch.translate(pattern)).match
+        wildcard = _wildcards.search(pattern)
+        literal = pattern[: wildcard.start()] if wildcard else pattern
+        # the directories of matching files start with this
+        dir_prefix = literal.rpartition("/")[0] + "/"
+        for path, label in self._entries(*self._prefix(dir_prefix)):
+            if match(path):
+                yield path, label
+
+    def save(self, path):
+        """Write a snapshot of the index to `path'"""
+        _save(
+            path,
+            _MAGIC,
+            [self._dirs, self._basenames, self._labels],
+            [self._dir_ids, self._base_ids, self._pkgs],
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Open a snapshot written by save(). It is mapped into memory and
+        its arrays are used in place.
+        """
+        buffer, strings, arrays = _load(path, _MAGIC, 3)
+        return cls(*strings, *arrays, buffer=buffer)
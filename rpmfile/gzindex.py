@@ -0,0 +1,252 @@
+"""
+Random access to gzip compressed payloads, in the spirit of zlib's zran.c.
+
+While the payload is decompressed, a copy of the decompressor's state is
+kept every `interval' bytes of output. A later read anywhere in the
+payload resumes from the closest checkpoint before it instead of
+inflating everything from the start, so seeking backward costs at most
+one interval of decompression.
+
+The member table of the payload can be saved to a sidecar file and
+loaded back by another process, so that reopening the same RPM needs no
+scan of the payload to find its members.
+"""
+
+import bisect
+import hashlib
+import io
+import json
+import os
+import zlib
+
+from .errors import RPMError
+
+MiB = 1024 * 1024
+
+DEFAULT_INTERVAL = 4 * MiB
+
+_INDEX_VERSION = 1
+
+# bytes of input read and of output produced per step of decompression
+_in_chunk = 64 * 1024
+_out_chunk = 64 * 1024
+
+
+def _new_decompressor():
+    # 16 + MAX_WBITS: expect and check the gzip header and trailer
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+class GzipIndex(object):
+    """
+    Checkpoints of a gzip stream, each the decompressor state at an
+    offset of the output and the matching offset of the compressed input.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.interval = interval
+        self._offsets = [0]
+        self._points = [(0, _new_decompressor())]
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def add(self, offset, compressed_offset, decompressor):
+        """Keep a copy of `decompressor' if `offset' is an interval past the last"""
+        if offset >= self._offsets[-1] + self.interval:
+            self._offsets.append(offset)
+            self._points.append((compressed_offset, decompressor.copy()))
+
+    def nearest(self, offset):
+        """
+        Return (offset, compressed offset, decompressor) for the closest
+        checkpoint at or before `offset'. The decompressor is a copy that
+        the caller may use.
+        """
+        i = bisect.bisect_right(self._offsets, offset) - 1
+        compressed_offset, decompressor = self._points[i]
+        return self._offsets[i], compressed_offset, decompressor.copy()
+
+
+class _IndexedGzipFile(io.RawIOBase):
+    """
+    A seekable reader of the gzip compressed `fileobj' that adds
+    checkpoints to `index' as it decompresses new parts of the stream and
+    restarts from them on backward seeks.
+    """
+
+    def __init__(self, fileobj, index):
+        self._fileobj = fileobj
+        self._start = fileobj.tell()
+        self._index = index
+        self._pos = 0
+        self._restore(0, 0, _new_decompressor())
+
+    def _restore(self, offset, compressed_offset, decompressor):
+        self._fileobj.seek(self._start + compressed_offset)
+        self._decompressor = decompressor
+        # compressed offset of the first byte of input not yet consumed
+        self._in = compressed_offset
+        self._unconsumed = b""
+        # output offset just past self._buffer
+        self._out = offset
+        self._buffer = b""
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            while self._inflate():
+                pass
+            offset += self._out
+        self._pos = max(0, offset)
+        return self._pos
+
+    def _inflate(self):
+        """Decompress the next part of the stream into the buffer"""
+        if self._eof:
+            return False
+        decompressor = self._decompressor
+        while True:
+            data = self._unconsumed
+            if not data:
+                data = self._fileobj.read(_in_chunk)
+                if not data:
+                    self._eof = True
+                    if decompressor.eof or self._in == 0:
+                        return False
+                    raise EOFError(
+                        "Compressed file ended before the "
+                        "end-of-stream marker was reached"
+                    )
+            if decompressor.eof:
+                # concatenated gzip members, possibly padded with zeroes
+                stripped = data.lstrip(b"\0")
+                self._in += len(data) - len(stripped)
+                data = self._unconsumed = stripped
+                if not data:
+                    continue
+                decompressor = self._decompressor = _new_decompressor()
+            try:
+                output = decompressor.decompress(data, _out_chunk)
+            except zlib.error as error:
+                raise RPMError("bad gzip payload: %s" % error)
+            if decompressor.eof:
+                rest = decompressor.unused_data
+            else:
+                rest = decompressor.unconsumed_tail
+            self._in += len(data) - len(rest)
+            self._unconsumed = rest
+            if output:
+                self._buffer = output
+                self._out += len(output)
+                if not decompressor.eof:
+                    self._index.add(self._out, self._in, decompressor)
+                return True
+
+    def _fill(self):
+        """Make the buffer hold the byte at self._pos, if there is one"""
+        start = self._out - len(self._buffer)
+        if start <= self._pos < self._out:
+            return True
+        if self._pos < start or self._pos >= self._out + self._index.interval:
+            offset, compressed_offset, decompressor = self._index.nearest(self._pos)
+            if self._pos < start or offset > self._out:
+                self._restore(offset, compressed_offset, decompressor)
+        while self._out <= self._pos:
+            if not self._inflate():
+                return False
+        return True
+
+    def readinto(self, b):
+        if not self._fill():
+            return 0
+        start = self._out - len(self._buffer)
+        offset = self._pos - start
+        n = min(len(b), len(self._buffer) - offset)
+        b[:n] = self._buffer[offset : offset + n]
+        self._pos += n
+        return n
+
+    def close(self):
+        self._buffer = self._unconsumed = b""
+        super(_IndexedGzipFile, self).close()
+
+
+def open_gzip(fileobj, index):
+    """
+    Return a seekable file object of the decompressed contents of the gzip
+    compressed `fileobj', keeping checkpoints in the GzipIndex `index'.
+    """
+    return io.BufferedReader(_IndexedGzipFile(fileobj, index))
+
+
+def index_key(rpm):
+    """
+    Return what identifies the RPM file of `rpm' in a sidecar: its size,
+    modification time and the sha256 of its lead and headers.
+    """
+    fileobj = rpm._fileobj
+    try:
+        st = os.fstat(fileobj.fileno())
+        size, mtime = st.st_size, st.st_mtime_ns
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        size, mtime = None, None
+    pos = fileobj.tell()
+    try:
+        fileobj.seek(0)
+        digest = hashlib.sha256(fileobj.read(rpm.data_offset)).hexdigest()
+    finally:
+        fileobj.seek(pos)
+    return {"size": size, "mtime": mtime, "sha256": digest}
+
+
+def save(path, key, members):
+    """Write the member table `members' of the RPM `key' to `path'"""
+    index = {
+        "version": _INDEX_VERSION,
+        "key": key,
+        "members": [
+            [
+                m.name,
+                m.file_start,
+                m.size,
+                m.initial_offset,
+                bool(m.isdir),
+                bool(m.issymlink),
+                m.mode,
+            ]
+            for m in members
+        ],
+    }
+    tmp = path + ".tmp"
+    with io.open(tmp, "w") as fileobj:
+        json.dump(index, fileobj, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def load(path, key, member_class):
+    """
+    Return the member table saved at `path' as a list of `member_class'
+    objects, or None if there is none for the RPM `key'.
+    """
+    try:
+        with io.open(path) as fileobj:
+            index = json.load(fileobj)
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != _INDEX_VERSION or index.get("key") != key:
+        return None
+    return [member_class(*fields) for fields in index["members"]]
@@ -6,11 +6,15 @@ Created on Jan 10, 2014
 
 from __future__ import print_function, unicode_literals, absolute_import
 
+import array
 import struct
 import sys
+from collections import ChainMap
+from collections.abc import Mapping
 from pprint import pprint
 
 from .errors import RPMError
+from .io_extra import _BufferFile, _memoryview
 
 sigtags = {
     "headerimage": 61,
@@ -366,26 +370,35 @@ rtags = dict([(value, key) for (key, value) in tags.items()])
 rsigtags = dict([(value, key) for (key, value) in sigtags.items()])
 
 
+def _find_nul(store, offset):
+    end = store.find(b"\x00", offset)
+    if end < 0:
+        raise RPMError("out of range")
+    return end
+
+
 def extract_string(offset, count, store):
     if count > 1:
         return extract_array(offset, count, store)
-    assert count == 1
-    idx = store[offset:].index(b"\x00")
-    end = offset + idx
-    if len(store) < end:
-        raise RPMError("out of range")
-    return store[offset:end]
+    return store[offset : _find_nul(store, offset)]
 
 
 def extract_i18nstring(offset, count, store):
     # rpm string header entries can have multiple versions, one for each locale.
     # the locale names are defined in the i18n table header entry. For the sake of
     # simplicity, take only one locale to use
-    return store[offset:].split(b"\x00", count)[0]
+    return store[offset : _find_nul(store, offset)]
 
 
 def extract_array(offset, count, store):
-    return store[offset:].split(b"\x00", count)[:-1]
+    # Search for each terminator from where the previous string ended rather
+    # than splitting a copy of the rest of the store
+    values = []
+    for _ in range(count):
+        end = _find_nul(store, offset)
+        values.append(store[offset:end])
+        offset = end + 1
+    return values
 
 
 def extract_bin(offset, count, store):
@@ -395,29 +408,76 @@ def extract_bin(offset, count, store):
     return store[offset:end]
 
 
-def extract_int32(offset, count, store):
-    end = offset + 4 * count
+def _typecode(itemsize):
+    for code in "BHILQ":
+        if array.array(code).itemsize == itemsize:
+            return code
+
+
+# array.array type codes of RPM's unsigned integer types, by entry type
+int_typecodes = {
+    1: _typecode(1),
+    2: _typecode(1),
+    3: _typecode(2),
+    4: _typecode(4),
+    5: _typecode(8),
+}
+# numpy dtypes of the same, big endian as they are stored
+int_dtypes = {1: ">u1", 2: ">u1", 3: ">u2", 4: ">u4", 5: ">u8"}
+
+
+def extract_ints(ty, offset, count, store):
+    """
+    Decode `count' big endian unsigned integers of entry type `ty' into an
+    array.array with a single copy out of the store.
+    """
+    values = array.array(int_typecodes[ty])
+    end = offset + values.itemsize * count
     if len(store) < end:
         raise RPMError("out of range")
-    values = struct.unpack(b"!" + b"I" * count, store[offset:end])
-    if count == 1:
-        values = values[0]
+    values.frombytes(_memoryview(store)[offset:end])
+    if sys.byteorder == "little":
+        values.byteswap()
     return values
 
 
-def extract_int16(offset, count, store):
-    end = offset + 2 * count
-    if len(store) < end:
+def extract_ints_numpy(ty, offset, count, store):
+    """Like extract_ints() but return a numpy array viewing the store"""
+    import numpy
+
+    dtype = numpy.dtype(int_dtypes[ty])
+    if len(store) < offset + dtype.itemsize * count:
         raise RPMError("out of range")
-    values = struct.unpack(b"!" + b"H" * count, store[offset:end])
-    if count == 1:
-        values = values[0]
-    return values
+    return numpy.frombuffer(_memoryview(store), dtype=dtype, count=count, offset=offset)
+
+
+def _extract_int(ty):
+    def extract(offset, count, store):
+        values = extract_ints(ty, offset, count, store)
+        if count == 1:
+            return values[0]
+        return tuple(values)
+
+    return extract
+
+
+extract_int8 = _extract_int(2)
+extract_int16 = _extract_int(3)
+extract_int32 = _extract_int(4)
+extract_int64 = _extract_int(5)
+
+
+def extract_null(offset, count, store):
+    return None
 
 
 ty_map = {
+    0: extract_null,
+    1: _extract_int(1),
+    2: extract_int8,
     3: extract_int16,
     4: extract_int32,
+    5: extract_int64,
     6: extract_string,
     7: extract_bin,
     8: extract_array,
@@ -433,61 +493,214 @@ def extract_data(ty, offset, count, store):
         return "could not extract %s" % ty
 
 
-def _readheader(fileobj, is_signature):
-    char = fileobj.read(1)
-    while char != b"\x8e":
-        char = fileobj.read(1)
-
-        if char is None or char == b"":
-            raise RPMError("reached end of file without finding magic char \x8e")
-
-    magic = b"\x8e" + fileobj.read(2)
-    from binascii import hexlify
-
-    assert hexlify(magic) == b"8eade8", hexlify(magic)
-    version = ord(fileobj.read(1))
-
-    header_start = fileobj.tell() - 4  # -4 for magic
-
-    _ = fileobj.read(4)
-
-    (num_entries,) = struct.unpack(b"!i", fileobj.read(4))
-    (header_structure_size,) = struct.unpack(b"!i", fileobj.read(4))
-
-    header = struct.Struct(b"!iiii")
-
-    entries = []
-    for _ in range(num_entries):
-        entry = header.unpack(fileobj.read(header.size))
-        entries.append(entry)
-
-    store = fileobj.read(header_structure_size)
-
-    headers = {}
+class Header(Mapping):
+    """
+    A read-only mapping of tag names to values for one RPM header. The
+    index is parsed when the header is read, but a tag's value is only
+    decoded from the data store the first time it is looked up, and is
+    cached after that.
+
+    `store' is the header's data store, or a larger buffer (an mmap, say)
+    holding it at offset `base'. With `views', binary entries are returned
+    as memoryview slices of `store' rather than copied out of it.
+    """
+
+    def __init__(self, entries, store, base=0, views=False):
+        self._entries = entries
+        self._store = store
+        self._base = base
+        self._views = views
+        self._values = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        ty, offset, count = self._entries[key]
+        offset += self._base
+        if self._views and ty == 7:
+            value = _memoryview(self._store)[offset : offset + count]
+        else:
+            value = extract_data(ty, offset, count, self._store)
+        self._values[key] = value
+        return value
+
+    def _drop_views(self):
+        """Forget the memoryviews of the store handed out, so it can close"""
+        for key, value in list(self._values.items()):
+            if isinstance(value, memoryview):
+                del self._values[key]
+
+    def getarray(self, key, numpy=False):
+        """
+        Return the values of an entry as a sequence even when it only has
+        one. Integer entries come back as an array.array, or as a numpy
+        array viewing the header's data store if `numpy' is true (which
+        requires numpy). Other entries come back as a list.
+        """
+        ty, offset, count = self._entries[key]
+        offset += self._base
+        if ty in int_typecodes:
+            if numpy:
+                return extract_ints_numpy(ty, offset, count, self._store)
+            return extract_ints(ty, offset, count, self._store)
+        value = self[key]
+        if isinstance(value, list):
+            return value
+        return [value]
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+_intro = struct.Struct(b"!3sB4sii")
+_entry = struct.Struct(b"!iiii")
+
+# Sanity limits on header sizes, the same ones rpm uses
+_max_entries = 0xFFFF
+_max_store_size = 0x0FFFFFFF
+
+
+def _parse_header(is_signature):
+    """
+    Parse the header at the current position of the input, without doing
+    any I/O itself: the parser yields ("read", n) to get the next `n'
+    bytes and ("store", n) to get the data store of `n' bytes as a
+    (store, base, views) tuple, where the store starts at offset `base'
+    of the bytes-like `store'. See _run() for a driver. Return the number
+    of bytes parsed and a Header.
+    """
+    intro = yield ("read", _intro.size)
+    if len(intro) < _intro.size:
+        raise RPMError("reached end of file while reading header")
+    magic, version, _, num_entries, store_size = _intro.unpack(intro)
+    if magic != b"\x8e\xad\xe8":
+        raise RPMError("bad header magic %r" % magic)
+    if not 0 < num_entries <= _max_entries:
+        raise RPMError("bad number of header entries %d" % num_entries)
+    if not 0 <= store_size <= _max_store_size:
+        raise RPMError("bad header data size %d" % store_size)
+
+    index = yield ("read", _entry.size * num_entries)
+    if len(index) < _entry.size * num_entries:
+        raise RPMError("reached end of file while reading header")
+    store, base, views = yield ("store", store_size)
+    if len(store) - base < store_size:
+        raise RPMError("reached end of file while reading header")
+
+    entries = {}
     tagsdict = rsigtags if is_signature else rtags
-    for tag, ty, offset, count in entries:
+    for tag, ty, offset, count in _entry.iter_unpack(index):
         key = tagsdict.get(tag, tag)
-        if not 0 <= offset < len(store):
+        if not 0 <= offset < store_size:
             raise RPMError("offset overhead")
-        value = extract_data(ty, offset, count, store)
-        headers[key] = value
-    header_end = fileobj.tell()
-    return (header_start, header_end), headers
+        entries[key] = (ty, offset, count)
+    header = Header(entries, store, base, views)
+    return len(intro) + len(index) + store_size, header
+
+
+def _run(parser, fileobj):
+    """
+    Run the parser generator `parser' on the current position of
+    `fileobj' and return its result. The data stores of headers in a
+    _BufferFile are decoded in place instead of being copied out.
+    """
+    request = next(parser)
+    while True:
+        kind, size = request
+        if kind == "store":
+            if isinstance(fileobj, _BufferFile):
+                base = fileobj.tell()
+                fileobj.seek(size, 1)
+                reply = (fileobj.buffer, base, True)
+            else:
+                reply = (fileobj.read(size), 0, False)
+        else:
+            reply = fileobj.read(size)
+        try:
+            request = parser.send(reply)
+        except StopIteration as stop:
+            return stop.value
 
 
-def get_headers(fileobj):
-    lead = struct.Struct(b"!4sBBhh66shh16s")
-    data = fileobj.read(lead.size)
-    value = lead.unpack(data)
-
-    # signature header
-    first_range, first_headers = _readheader(fileobj, True)
-    # main header
-    second_range, second_headers = _readheader(fileobj, False)
+def _readheader(fileobj, is_signature):
+    """
+    Read the header starting at the current position of `fileobj' with
+    one read for its intro, one for its index and one for its data store.
+    Return the number of bytes read and a Header.
+    """
+    return _run(_parse_header(is_signature), fileobj)
+
+
+def _tell(fileobj):
+    try:
+        return fileobj.tell()
+    except (AttributeError, OSError):
+        return 0
+
+
+_lead = struct.Struct(b"!4sBBhh66shh16s")
+
+
+def _parse_headers():
+    """
+    Parse the lead, signature header and main header of an RPM like
+    _parse_header(). Return ((start, end), signature) and ((start, end),
+    header), where the ranges are offsets from the start of the lead.
+    """
+    lead = yield ("read", _lead.size)
+    if len(lead) < _lead.size:
+        raise RPMError("reached end of file while reading lead")
+    first_start = _lead.size
+    size, first_headers = yield from _parse_header(True)
+    first_end = first_start + size
+    # the signature header is padded to a multiple of 8 bytes
+    padding = (8 - size % 8) % 8
+    if padding and len((yield ("read", padding))) < padding:
+        raise RPMError("reached end of file while reading header")
+    second_start = first_end + padding
+    size, second_headers = yield from _parse_header(False)
+    second_end = second_start + size
+    return ((first_start, first_end), first_headers), (
+        (second_start, second_end),
+        second_headers,
+    )
+
+
+def read_headers(fileobj):
+    """
+    Read the lead, signature header and main header of an RPM. Return
+    ((start, end), signature) and ((start, end), header), where the ranges
+    are the offsets of each header in the file.
+    """
+    start = _tell(fileobj)
+    ((first_start, first_end), first_headers), (
+        (second_start, second_end),
+        second_headers,
+    ) = _run(_parse_headers(), fileobj)
+    return ((start + first_start, start + first_end), first_headers), (
+        (start + second_start, start + second_end),
+        second_headers,
+    )
 
-    first_headers.update(second_headers)
 
-    return second_range, first_headers
+def get_headers(fileobj):
+    """
+    Read the headers of an RPM. Return the offsets of the main header and
+    a mapping of the main header's tags merged over the signature's.
+    """
+    (_, first_headers), (second_range, second_headers) = read_headers(fileobj)
+    return second_range, ChainMap(second_headers, first_headers)
 
 
 def main():
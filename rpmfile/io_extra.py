@@ -4,6 +4,7 @@ Created on Jan 11, 2014
 @author: sean
 """
 
+import hashlib
 import io
 
 
@@ -23,7 +24,26 @@ def _doc(from_func):
     return decorator
 
 
-class _SubFile(object):
+class _Digest(object):
+    """A hash of a file object, fed with the bytes read from it. Only the
+    bytes that continue those hashed so far count, so reads may go back
+    or skip ahead, as long as they cover the file in the end.
+    """
+
+    def __init__(self, algorithm):
+        self.hash = hashlib.new(algorithm)
+        self.offset = 0
+
+    def update(self, start, data):
+        """Hash what `data', read at offset `start', adds"""
+        skip = self.offset - start
+        if 0 <= skip < len(data):
+            # memoryviews, so nothing is copied to be hashed
+            self.hash.update(memoryview(data)[skip:] if skip else data)
+            self.offset = start + len(data)
+
+
+class _SubFile(io.RawIOBase):
     """A thin wrapper around an existing file object that
     provides a part of its data as an individual file
     object.
@@ -41,18 +61,18 @@ class _SubFile(object):
         self._mode = mode
         self._pos = 0
 
-    def __enter__(self):
-        return self
-
-    def __exit__(self, *excinfo):
-        pass
-
-    def close(self):
-        pass
+    # a _Digest fed with the bytes read, when verifying them
+    _digest = None
 
     def __getattr__(self, attr):
         return getattr(self._fileobj, attr)
 
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
     @_doc(io.FileIO.tell)
     def tell(self):
         return self._pos
@@ -67,39 +87,315 @@ class _SubFile(object):
             self._pos = self._size + offset
 
         self._pos = max(0, self._pos)
+        return self._pos
 
     def _n(self, size=None):
-        if not size:
-            size = self._size
-        return min(size, self._size - self._pos)
+        remaining = max(0, self._size - self._pos)
+        if size is None or size < 0:
+            return remaining
+        return min(size, remaining)
 
-    @_doc(io.FileIO.read)
-    def read(self, size=None):
-        self._fileobj.seek(self._pos + self._start, 0)
+    def _seek_fileobj(self):
+        # the wrapped file object is usually left where the last read
+        # ended, so only seek it when it has been moved
+        target = self._start + self._pos
+        if self._fileobj.tell() != target:
+            self._fileobj.seek(target, 0)
 
+    @_doc(io.FileIO.read)
+    def read(self, size=-1):
         n = self._n(size)
-        self._pos += n
+        if not n:
+            return b""
+        self._seek_fileobj()
+        data = self._fileobj.read(n)
+        if self._digest is not None:
+            self._digest.update(self._pos, data)
+        self._pos += len(data)
+        return data
+
+    def readall(self):
+        return self.read()
 
-        return self._fileobj.read(n)
+    @_doc(io.FileIO.readinto)
+    def readinto(self, b):
+        view = memoryview(b).cast("B")
+        n = self._n(len(view))
+        if not n:
+            return 0
+        self._seek_fileobj()
+        readinto = getattr(self._fileobj, "readinto", None)
+        if readinto is None:
+            data = self._fileobj.read(n)
+            n = len(data)
+            view[:n] = data
+        else:
+            n = readinto(view[:n]) or 0
+        if self._digest is not None:
+            self._digest.update(self._pos, view[:n])
+        self._pos += n
+        return n
 
     @_doc(io.FileIO.readline)
-    def readline(self, size=None):
-        self._fileobj.seek(self._pos + self._start, 0)
+    def readline(self, size=-1):
         n = self._n(size)
+        if not n:
+            return b""
+        self._seek_fileobj()
         line = self._fileobj.readline(n)
+        if self._digest is not None:
+            self._digest.update(self._pos, line)
         self._pos += len(line)
         return line
 
-    @_doc(io.FileIO.readlines)
-    def readlines(self, size=None):
-        n = self._n(size)
-        line = self.readline(n)
-        n -= len(line)
-        while line:
-            yield line
-            line = self.readline(n)
-            n -= len(line)
+    def _finish_digest(self, chunk_size=1024 * 1024):
+        """Feed the digest the bytes it has not seen, leaving tell() as is"""
+        pos = self._pos
+        self._pos = self._digest.offset
+        while self.read(chunk_size):
+            pass
+        self._pos = pos
+
+    def getbuffer(self):
+        """Return a memoryview of the data without copying it. Only
+        possible when the wrapped file object has a getbuffer() method,
+        like io.BytesIO.
+        """
+        return self._fileobj.getbuffer()[self._start : self._start + self._size]
+
+    @property
+    def mode(self):
+        return self._mode
+
+
+class _BufferFile(io.RawIOBase):
+    """A read-only, seekable file object over a bytes-like object such as
+    bytes, a memoryview or an mmap. Reads copy straight out of the buffer
+    without any system calls, and getbuffer() returns a memoryview of it.
+    """
+
+    def __init__(self, buffer):
+        view = memoryview(buffer)
+        self._buffer = buffer
+        self._view = view.cast("B") if view.format != "B" else view
+        self._pos = 0
+
+    @property
+    def buffer(self):
+        """The data as an object supporting find(), like bytes or mmap"""
+        if not hasattr(self._buffer, "find"):
+            obj = self._view.obj
+            if hasattr(obj, "find") and self._view.nbytes == len(obj):
+                self._buffer = obj
+            else:
+                self._buffer = _ViewBuffer(self._view)
+        return self._buffer
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    @_doc(io.FileIO.tell)
+    def tell(self):
+        return self._pos
+
+    @_doc(io.FileIO.seek)
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._pos
+        elif whence == 2:
+            offset += len(self._view)
+        self._pos = min(max(0, offset), len(self._view))
+        return self._pos
+
+    @_doc(io.FileIO.read)
+    def read(self, size=-1):
+        start = self._pos
+        if size is None or size < 0:
+            self._pos = len(self._view)
+        else:
+            self._pos = min(start + size, len(self._view))
+        return self._view[start : self._pos].tobytes()
+
+    def readall(self):
+        return self.read()
+
+    @_doc(io.FileIO.readinto)
+    def readinto(self, b):
+        data = self._view[self._pos : self._pos + len(b)]
+        n = len(data)
+        memoryview(b).cast("B")[:n] = data
+        self._pos += n
+        return n
+
+    @_doc(io.FileIO.readline)
+    def readline(self, size=-1):
+        end = len(self._view)
+        if size is not None and size >= 0:
+            end = min(end, self._pos + size)
+        start = self._pos
+        while start < end:
+            chunk = self._view[start : min(start + io.DEFAULT_BUFFER_SIZE, end)]
+            newline = chunk.tobytes().find(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            start += len(chunk)
+        return self.read(end - self._pos)
+
+    def getbuffer(self):
+        """Return a memoryview of the whole buffer"""
+        return self._view[:]
+
+    def close(self):
+        if not self.closed:
+            self._buffer = None
+            try:
+                self._view.release()
+            except BufferError:
+                pass
+        super(_BufferFile, self).close()
+
+
+class _ViewBuffer(object):
+    """A memoryview that can be searched and sliced like bytes, without
+    copying more of it than a slice or a search covers.
+    """
+
+    def __init__(self, view):
+        self.view = view
+
+    def __len__(self):
+        return len(self.view)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.view[index].tobytes()
+        return self.view[index]
+
+    def find(self, sub, start=0, end=None):
+        end = len(self.view) if end is None else min(end, len(self.view))
+        step = 64
+        while start < end:
+            stop = min(start + step, end)
+            # searched windows overlap by what a match can straddle
+            window = self.view[start : min(stop + len(sub) - 1, end)].tobytes()
+            found = window.find(sub)
+            if found >= 0:
+                return start + found
+            start = stop
+            step = min(step * 2, 64 * 1024)
+        return -1
+
+
+def _memoryview(buffer):
+    """A memoryview of `buffer', which may be a _ViewBuffer"""
+    if isinstance(buffer, _ViewBuffer):
+        return buffer.view
+    return memoryview(buffer)
+
+
+class _StreamFile(io.RawIOBase):
+    """A forward-only file object over the next `size' bytes of a
+    stream, or all of the rest of it if `size' is None. Reading never
+    seeks the underlying stream, so it is cheap on top of decompressors
+    where a backward seek restarts decompression, and works on pipes.
+    """
+
+    def __init__(self, fileobj, size, mode="r"):
+        self._fileobj = fileobj
+        self._size = size
+        self._mode = mode
+        self._pos = 0
+
+    _digest = None
+
+    def readable(self):
+        return True
+
+    @_doc(io.FileIO.tell)
+    def tell(self):
+        return self._pos
+
+    def _n(self, size):
+        if self._size is None:
+            return -1 if size is None else size
+        remaining = self._size - self._pos
+        if size is None or size < 0:
+            return remaining
+        return min(size, remaining)
+
+    @_doc(io.FileIO.read)
+    def read(self, size=-1):
+        data = self._fileobj.read(self._n(size)) or b""
+        if self._digest is not None:
+            self._digest.update(self._pos, data)
+        self._pos += len(data)
+        return data
+
+    def readall(self):
+        return self.read()
+
+    @_doc(io.FileIO.readinto)
+    def readinto(self, b):
+        view = memoryview(b).cast("B")
+        readinto = getattr(self._fileobj, "readinto", None)
+        if readinto is None:
+            data = self.read(len(view))
+            view[: len(data)] = data
+            return len(data)
+        n = readinto(view[: self._n(len(view))]) or 0
+        if self._digest is not None:
+            self._digest.update(self._pos, view[:n])
+        self._pos += n
+        return n
+
+    @_doc(io.FileIO.readline)
+    def readline(self, size=-1):
+        line = self._fileobj.readline(self._n(size))
+        if self._digest is not None:
+            self._digest.update(self._pos, line)
+        self._pos += len(line)
+        return line
+
+    def _finish_digest(self):
+        self._drain()
+
+    def _drain(self, chunk_size=1024 * 1024):
+        """Consume whatever the reader of this member left unread"""
+        while self._size is None or self._pos < self._size:
+            if not self.read(chunk_size):
+                break
 
     @property
     def mode(self):
         return self._mode
+
+
+def _seekable(fileobj):
+    """Whether `fileobj' can seek, pipes, sockets and HTTP responses can not"""
+    seekable = getattr(fileobj, "seekable", None)
+    if seekable is not None:
+        return seekable()
+    try:
+        fileobj.tell()
+    except (AttributeError, OSError):
+        return False
+    return True
+
+
+def _copyfileobj(fsrc, fdst, length=1024 * 1024, buf=None):
+    """Like shutil.copyfileobj() but reads into one reusable buffer with
+    readinto() instead of allocating a new bytes object per chunk. `buf'
+    is that buffer if given, to reuse it across files.
+    """
+    if buf is None:
+        buf = bytearray(length)
+    view = memoryview(buf)
+    while True:
+        n = fsrc.readinto(buf)
+        if not n:
+            break
+        fdst.write(view[:n])
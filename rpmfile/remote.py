@@ -0,0 +1,256 @@
+"""
+Reading remote RPMs over HTTP with range requests.
+
+RangeFile is a seekable file object over a URL that fetches only the
+parts that are read, in blocks that are cached, with runs of missing
+blocks fetched by a single request. Connections are kept alive and
+reused across files, so reading the headers of every package of a
+repository costs a few small requests per package:
+
+    with rpmfile.remote.open(url, header_only=True) as rpm:
+        print(rpm.headers["name"])
+"""
+
+import collections
+import http.client
+import io
+import re
+import threading
+import urllib.parse
+
+from . import RPMFile
+from .errors import RPMError
+
+_content_range = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+_redirects = (301, 302, 303, 307, 308)
+_max_redirects = 5
+
+
+class ConnectionPool(object):
+    """Idle keep-alive HTTP connections by scheme, host and port"""
+
+    def __init__(self, timeout=30, max_idle=8):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def get(self, scheme, netloc):
+        with self._lock:
+            idle = self._idle[scheme, netloc]
+            if idle:
+                return idle.pop()
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        if scheme == "http":
+            return http.client.HTTPConnection(netloc, timeout=self.timeout)
+        raise ValueError("unsupported URL scheme %r" % scheme)
+
+    def put(self, scheme, netloc, connection):
+        with self._lock:
+            idle = self._idle[scheme, netloc]
+            if len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def request(self, url, headers):
+        """
+        Send a GET request for `url' and return the response status, its
+        headers and its body, following redirects. The connection goes
+        back to the pool afterwards unless the server is closing it.
+        """
+        for _ in range(_max_redirects + 1):
+            parts = urllib.parse.urlsplit(url)
+            path = parts.path or "/"
+            if parts.query:
+                path += "?" + parts.query
+            # a pooled connection may have been closed by the server since
+            # it was last used, so retry once on a new one
+            for attempt in (0, 1):
+                connection = self.get(parts.scheme, parts.netloc)
+                try:
+                    connection.request("GET", path, headers=headers)
+                    response = connection.getresponse()
+                    body = response.read()
+                except (http.client.HTTPException, ConnectionError):
+                    connection.close()
+                    if attempt:
+                        raise
+                    continue
+                break
+            if response.will_close:
+                connection.close()
+            else:
+                self.put(parts.scheme, parts.netloc, connection)
+            if response.status in _redirects and response.getheader("Location"):
+                url = urllib.parse.urljoin(url, response.getheader("Location"))
+                continue
+            return response.status, response, body
+        raise RPMError("too many redirects fetching %s" % url)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, collections.defaultdict(list)
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+_default_pool = ConnectionPool()
+
+
+class RangeFile(io.RawIOBase):
+    """
+    A read-only, seekable file object over the HTTP(S) resource `url'
+    that only downloads what is read, with range requests for whole
+    blocks of `block_size' bytes. Up to `cache_blocks' blocks are kept.
+    Servers without range support send the whole resource at once. If the
+    server does not tell the size of the resource, in a Content-Range of
+    "bytes a-b/*", it must fit in the first block or RPMError is raised.
+    """
+
+    def __init__(
+        self, url, block_size=64 * 1024, cache_blocks=256, pool=None, headers=None
+    ):
+        self.url = url
+        self._block_size = block_size
+        self._cache_blocks = cache_blocks
+        self._pool = pool or _default_pool
+        self._headers = dict(headers or {})
+        self._cache = collections.OrderedDict()
+        self._pos = 0
+        self._limit = None
+        self.requests = 0
+        self.bytes_fetched = 0
+        self._size = None
+        # the first block also tells the size of the resource
+        self._fetch(0, 0)
+        if self._size is None:
+            raise RPMError("the server did not tell the size of %s" % self.url)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    @property
+    def size(self):
+        return self._size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def _store(self, first, data):
+        blocks = {}
+        for i in range(0, len(data), self._block_size):
+            blocks[first + i // self._block_size] = data[i : i + self._block_size]
+        self._cache.update(blocks)
+        while len(self._cache) > self._cache_blocks:
+            self._cache.popitem(last=False)
+        return blocks
+
+    def _fetch(self, first, last):
+        """
+        Fetch blocks `first' to `last' with a single request. Return them
+        by index, as they may not all fit in the cache.
+        """
+        start = first * self._block_size
+        end = (last + 1) * self._block_size - 1
+        if self._size is not None:
+            end = min(end, self._size - 1)
+        headers = dict(self._headers, Range="bytes=%d-%d" % (start, end))
+        status, response, body = self._pool.request(self.url, headers)
+        self.requests += 1
+        self.bytes_fetched += len(body)
+        if status == 206:
+            match = _content_range.match(response.getheader("Content-Range", ""))
+            if not match or int(match.group(1)) != start:
+                raise RPMError("bad Content-Range from %s" % self.url)
+            if match.group(3) != "*":
+                self._size = int(match.group(3))
+            elif len(body) < end - start + 1:
+                # an unknown size, but less than asked for is the end
+                self._size = start + len(body)
+            return self._store(first, body)
+        if status == 200:
+            # no range support, the body is the whole resource, which is kept
+            # rather than downloaded again
+            self._size = len(body)
+            self._cache_blocks = max(
+                self._cache_blocks, len(body) // self._block_size + 1
+            )
+            return self._store(0, body)
+        if status == 416 and self._size is None:
+            # an empty resource
+            self._size = 0
+            return {}
+        raise RPMError("HTTP %d fetching %s" % (status, self.url))
+
+    def readinto(self, b):
+        end = self._size if self._limit is None else min(self._size, self._limit)
+        n = min(len(b), end - self._pos)
+        if self._limit is not None and n < len(b) and self._pos + n < self._size:
+            raise RPMError("only the headers of %s were fetched" % self.url)
+        if n <= 0:
+            return 0
+        first = self._pos // self._block_size
+        last = (self._pos + n - 1) // self._block_size
+        # one request for each run of blocks that are not cached
+        blocks = {i: self._cache[i] for i in range(first, last + 1) if i in self._cache}
+        missing = [i for i in range(first, last + 1) if i not in blocks]
+        while missing:
+            run_end = 0
+            while run_end + 1 < len(missing) and (
+                missing[run_end + 1] == missing[run_end] + 1
+            ):
+                run_end += 1
+            blocks.update(self._fetch(missing[0], missing[run_end]))
+            missing = missing[run_end + 1 :]
+        view = memoryview(b).cast("B")
+        copied = 0
+        for i in range(first, last + 1):
+            block = blocks[i]
+            if i in self._cache:
+                self._cache.move_to_end(i)
+            offset = self._pos + copied - i * self._block_size
+            chunk = block[offset : offset + n - copied]
+            view[copied : copied + len(chunk)] = chunk
+            copied += len(chunk)
+        self._pos += copied
+        return copied
+
+    def limit(self, offset):
+        """Make reads past `offset' raise RPMError instead of fetching"""
+        self._limit = offset
+
+    def close(self):
+        self._cache.clear()
+        super(RangeFile, self).close()
+
+
+def open(url, header_only=False, block_size=64 * 1024, pool=None, **kwargs):
+    """
+    Open the RPM at the HTTP(S) `url' with range requests. Return an
+    RPMFile. With `header_only' only the lead and headers are fetched,
+    and reading the payload raises RPMError. Other keyword arguments are
+    passed to RPMFile.
+    """
+    fileobj = RangeFile(url, block_size=block_size, pool=pool)
+    try:
+        rpm = RPMFile(fileobj=fileobj, owns_fileobj=True, **kwargs)
+    except BaseException:
+        fileobj.close()
+        raise
+    if header_only:
+        fileobj.limit(rpm.data_offset)
+    return rpm
@@ -0,0 +1,519 @@
+"""
+Generating repository metadata, like createrepo does, from the headers of
+a directory tree of RPMs.
+
+    rpmfile.repodata.generate("/srv/repo", workers=8, cache="repodata.db")
+
+writes /srv/repo/repodata/repomd.xml and the primary, filelists and other
+XML files it points to, compressed with gzip or zstd. Packages are read
+by a pool of processes, each returning the XML of its packages, and the
+XML files are written as a stream with a bounded number of packages in
+flight. With a cache, the XML of a package is kept in an SQLite database
+along with its checksum, and reused while its file is unchanged.
+"""
+
+import collections
+import concurrent.futures
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import sqlite3
+import stat
+import tempfile
+import time
+from xml.sax.saxutils import escape, quoteattr
+
+from . import decompress, scan
+from .deps import dependencies, filenames
+from .errors import NoZSTANDARDModuleError, RPMError
+from .headers import read_headers
+from .rpmdefs import (
+    RPMFILE_GHOST,
+    RPMSENSE_PREREQ,
+    RPMSENSE_RPMLIB,
+    RPMSENSE_SCRIPT_POST,
+    RPMSENSE_SCRIPT_PRE,
+    RPMSENSE_SENSEMASK,
+)
+from .version import split_evr
+
+_COMMON_NS = "http://linux.duke.edu/metadata/common"
+_RPM_NS = "http://linux.duke.edu/metadata/rpm"
+_FILELISTS_NS = "http://linux.duke.edu/metadata/filelists"
+_OTHER_NS = "http://linux.duke.edu/metadata/other"
+_REPO_NS = "http://linux.duke.edu/metadata/repo"
+
+_CACHE_VERSION = 1
+_read_size = 1024 * 1024
+
+# files that are listed in primary.xml as well as in filelists.xml
+_primary_files = re.compile(r"^(/etc/|.*bin/|/usr/lib/sendmail$)")
+# characters that are not allowed in XML
+_invalid = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_sense = {2: "LT", 4: "GT", 8: "EQ", 10: "LE", 12: "GE"}
+_pre = RPMSENSE_PREREQ | RPMSENSE_SCRIPT_PRE | RPMSENSE_SCRIPT_POST
+
+_roots = {
+    "primary": '<metadata xmlns="%s" xmlns:rpm="%s" packages="%%d">\n'
+    % (_COMMON_NS, _RPM_NS),
+    "filelists": '<filelists xmlns="%s" packages="%%d">\n' % _FILELISTS_NS,
+    "other": '<otherdata xmlns="%s" packages="%%d">\n' % _OTHER_NS,
+}
+_ends = {
+    "primary": "</metadata>\n",
+    "filelists": "</filelists>\n",
+    "other": "</otherdata>\n",
+}
+KINDS = tuple(_roots)
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else b""
+    if isinstance(value, str):
+        # bytes that are not UTF-8 kept by surrogateescape can not be in XML
+        value = value.encode("utf-8", "surrogateescape")
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", "replace")
+    return _invalid.sub("", str(value))
+
+
+def _attr(value):
+    return quoteattr(_text(value))
+
+
+def _checksum(path, algorithm):
+    digest = hashlib.new(algorithm)
+    buffer = bytearray(_read_size)
+    view = memoryview(buffer)
+    with io.open(path, "rb", buffering=0) as fileobj:
+        while True:
+            n = fileobj.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+def _entries(headers, kind):
+    lines = []
+    seen = set()
+    for name, flags, version in dependencies(headers, kind):
+        if kind == "requires" and (
+            flags & RPMSENSE_RPMLIB or name.startswith("rpmlib(")
+        ):
+            continue
+        key = (name, flags & RPMSENSE_SENSEMASK, version)
+        if key in seen:
+            continue
+        seen.add(key)
+        entry = "<rpm:entry name=%s" % _attr(name)
+        sense = _sense.get(flags & RPMSENSE_SENSEMASK)
+        if sense and version:
+            epoch, ver, rel = split_evr(version)
+            entry += " flags=%s epoch=%s ver=%s" % (
+                _attr(sense),
+                _attr(epoch or "0"),
+                _attr(ver),
+            )
+            if rel is not None:
+                entry += " rel=%s" % _attr(rel)
+        if kind == "requires" and flags & _pre:
+            entry += ' pre="1"'
+        lines.append("      " + entry + "/>\n")
+    if not lines:
+        return ""
+    return "    <rpm:%s>\n%s    </rpm:%s>\n" % (kind, "".join(lines), kind)
+
+
+def _files(headers, primary):
+    names = filenames(headers)
+    modes = headers.getarray("filemodes") if "filemodes" in headers else None
+    flags = headers.getarray("fileflags") if "fileflags" in headers else None
+    lines = []
+    for i, name in enumerate(names):
+        if primary and not _primary_files.match(name):
+            continue
+        if flags is not None and flags[i] & RPMFILE_GHOST:
+            kind = ' type="ghost"'
+        elif modes is not None and stat.S_ISDIR(modes[i]):
+            kind = ' type="dir"'
+        else:
+            kind = ""
+        lines.append(
+            "%s<file%s>%s</file>\n"
+            % ("    " if primary else "  ", kind, escape(_text(name)))
+        )
+    return "".join(lines)
+
+
+def package_xml(path, location, algorithm="sha256", st=None):
+    """
+    Return the checksum of the RPM at `path' and its entries in primary.xml,
+    filelists.xml and other.xml, as a dict of strings by kind. `location'
+    is its path relative to the root of the repository.
+    """
+    st = st or os.stat(path)
+    pkgid = _checksum(path, algorithm)
+    with io.open(path, "rb") as fileobj:
+        (_, signature), ((header_start, header_end), headers) = read_headers(fileobj)
+    get = headers.get
+    epoch = get("serial")
+    epoch = "0" if epoch is None else str(epoch)
+    version = "<version epoch=%s ver=%s rel=%s/>" % (
+        _attr(epoch),
+        _attr(get("version")),
+        _attr(get("release")),
+    )
+    name, arch = _attr(get("name")), _attr(get("arch"))
+    installed = get("longsize") if "longsize" in headers else get("size")
+    archive = signature.get("longarchivesize", signature.get("payloadsize"))
+
+    primary = [
+        '<package type="rpm">\n',
+        "  <name>%s</name>\n" % escape(_text(get("name"))),
+        "  <arch>%s</arch>\n" % escape(_text(get("arch"))),
+        "  %s\n" % version,
+        '  <checksum type=%s pkgid="YES">%s</checksum>\n' % (_attr(algorithm), pkgid),
+        "  <summary>%s</summary>\n" % escape(_text(get("summary"))),
+        "  <description>%s</description>\n" % escape(_text(get("description"))),
+        "  <packager>%s</packager>\n" % escape(_text(get("packager"))),
+        "  <url>%s</url>\n" % escape(_text(get("url"))),
+        '  <time file="%d" build="%d"/>\n' % (st.st_mtime, get("buildtime") or 0),
+        '  <size package="%d" installed="%d" archive="%d"/>\n'
+        % (st.st_size, installed or 0, archive or 0),
+        "  <location href=%s/>\n" % _attr(location),
+        "  <format>\n",
+        "    <rpm:license>%s</rpm:license>\n" % escape(_text(get("copyright"))),
+        "    <rpm:vendor>%s</rpm:vendor>\n" % escape(_text(get("vendor"))),
+        "    <rpm:group>%s</rpm:group>\n" % escape(_text(get("group"))),
+        "    <rpm:buildhost>%s</rpm:buildhost>\n" % escape(_text(get("buildhost"))),
+        "    <rpm:sourcerpm>%s</rpm:sourcerpm>\n" % escape(_text(get("sourcerpm"))),
+        '    <rpm:header-range start="%d" end="%d"/>\n' % (header_start, header_end),
+    ]
+    primary.extend(
+        _entries(headers, kind)
+        for kind in (
+            "provides",
+            "requires",
+            "conflicts",
+            "obsoletes",
+            "suggests",
+            "enhances",
+            "recommends",
+            "supplements",
+        )
+    )
+    primary.append(_files(headers, primary=True))
+    primary.append("  </format>\n</package>\n")
+
+    package = "<package pkgid=%s name=%s arch=%s>\n  %s\n" % (
+        _attr(pkgid),
+        name,
+        arch,
+        version,
+    )
+    filelists = package + _files(headers, primary=False) + "</package>\n"
+    other = [package]
+    if "changelogtime" in headers:
+        times = headers.getarray("changelogtime")
+        authors = headers.getarray("authors")
+        texts = headers.getarray("comments")
+        for i in range(len(times)):
+            other.append(
+                '  <changelog author=%s date="%d">%s</changelog>\n'
+                % (_attr(authors[i]), times[i], escape(_text(texts[i])))
+            )
+    other.append("</package>\n")
+    return {
+        "pkgid": pkgid,
+        "primary": "".join(primary),
+        "filelists": filelists,
+        "other": "".join(other),
+    }
+
+
+def _package_chunk(packages, algorithm):
+    """Build the XML of each (path, location, st) of `packages'"""
+    results = []
+    for path, location, st in packages:
+        try:
+            results.append((path, st, package_xml(path, location, algorithm, st)))
+        except (OSError, RPMError, EOFError) as error:
+            results.append((path, st, error))
+    return results
+
+
+def _bounded_map(executor, fn, chunks, window, *args):
+    """Like executor.map() with at most `window' chunks in flight"""
+    pending = collections.deque()
+    for chunk in chunks:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(executor.submit(fn, chunk, *args))
+    while pending:
+        yield pending.popleft().result()
+
+
+class _HashingWriter(io.RawIOBase):
+    """Write to `fileobj', hashing and counting what goes through"""
+
+    def __init__(self, fileobj, algorithm):
+        self._fileobj = fileobj
+        self.digest = hashlib.new(algorithm)
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.digest.update(b)
+        self.size += len(b)
+        return self._fileobj.write(b)
+
+
+def _compressor(fileobj, compression):
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=fileobj, mode="wb", mtime=0)
+    if compression == "zstd":
+        if decompress.zstd is not None:
+            return decompress.zstd.ZstdFile(fileobj, "wb")
+        if decompress.zstandard is not None:
+            return decompress.zstandard.ZstdCompressor().stream_writer(
+                fileobj, closefd=False
+            )
+        raise NoZSTANDARDModuleError("zstandard module not present")
+    raise ValueError("unsupported compression %r" % compression)
+
+
+_suffixes = {"gzip": ".gz", "zstd": ".zst"}
+
+
+class _MetadataWriter(object):
+    """
+    One of the XML files, spooled to a temporary file until the number of
+    packages it has is known, then compressed into `outdir'.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.packages = 0
+        self._spool = tempfile.TemporaryFile()
+
+    def add(self, xml):
+        self._spool.write(xml.encode("utf-8"))
+        self.packages += 1
+
+    def finish(self, outdir, compression, algorithm):
+        """Write the file and return its <data> element for repomd.xml"""
+        fd, tmp = tempfile.mkstemp(dir=outdir, prefix="." + self.kind)
+        with io.open(fd, "wb") as out:
+            compressed = _HashingWriter(out, algorithm)
+            with _compressor(compressed, compression) as writer:
+                opened = _HashingWriter(writer, algorithm)
+                opened.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
+                opened.write((_roots[self.kind] % self.packages).encode())
+                self._spool.seek(0)
+                shutil.copyfileobj(self._spool, opened, _read_size)
+                opened.write(_ends[self.kind].encode())
+        self._spool.close()
+        checksum = compressed.digest.hexdigest()
+        href = "repodata/%s-%s.xml%s" % (checksum, self.kind, _suffixes[compression])
+        os.replace(tmp, os.path.join(outdir, os.path.basename(href)))
+        return (
+            '  <data type="%s">\n'
+            '    <checksum type="%s">%s</checksum>\n'
+            '    <open-checksum type="%s">%s</open-checksum>\n'
+            '    <location href="%s"/>\n'
+            "    <timestamp>%d</timestamp>\n"
+            "    <size>%d</size>\n"
+            "    <open-size>%d</open-size>\n"
+            "  </data>\n"
+            % (
+                self.kind,
+                algorithm,
+                checksum,
+                algorithm,
+                opened.digest.hexdigest(),
+                href,
+                time.time(),
+                compressed.size,
+                opened.size,
+            )
+        )
+
+    def close(self):
+        self._spool.close()
+
+
+class _Cache(object):
+    """
+    The XML of packages in the SQLite database at `path', by the path, size
+    and modification time of their file.
+    """
+
+    def __init__(self, path, algorithm):
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS packages (path TEXT PRIMARY KEY, "
+            "size INTEGER, mtime_ns INTEGER, pkgid TEXT, primary_xml TEXT, "
+            "filelists_xml TEXT, other_xml TEXT)"
+        )
+        meta = json.dumps({"version": _CACHE_VERSION, "checksum": algorithm})
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'key'").fetchone()
+        if row is None or row[0] != meta:
+            self._db.execute("DELETE FROM packages")
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('key', ?)", (meta,))
+        self._db.commit()
+
+    def has(self, path, st):
+        return (
+            self._db.execute(
+                "SELECT 1 FROM packages WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, st.st_size, st.st_mtime_ns),
+            ).fetchone()
+            is not None
+        )
+
+    def get(self, path, st):
+        row = self._db.execute(
+            "SELECT pkgid, primary_xml, filelists_xml, other_xml FROM packages "
+            "WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (path, st.st_size, st.st_mtime_ns),
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("pkgid",) + KINDS, row))
+
+    def update(self, rows):
+        self._db.executemany(
+            "INSERT OR REPLACE INTO packages VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (path, st.st_size, st.st_mtime_ns, xml["pkgid"])
+                + tuple(xml[kind] for kind in KINDS)
+                for path, st, xml in rows
+            ],
+        )
+        self._db.commit()
+
+    def prune(self, paths):
+        """Drop the packages that are not in `paths'"""
+        known = [row[0] for row in self._db.execute("SELECT path FROM packages")]
+        self._db.executemany(
+            "DELETE FROM packages WHERE path = ?",
+            [(path,) for path in known if path not in paths],
+        )
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+
+def generate(
+    directory,
+    outdir=None,
+    compression="gzip",
+    workers=None,
+    cache=None,
+    checksum="sha256",
+    chunk_size=16,
+):
+    """
+    Write the repository metadata of the RPMs under `directory' to
+    `outdir', by default `directory'/repodata. Return the path of
+    repomd.xml and a list of the (path, exception) of the packages that
+    could not be read and were skipped.
+
+    `compression' is "gzip" or "zstd". Packages are read by `workers'
+    processes, all CPUs by default or the calling process with 1,
+    `chunk_size' packages per task. `cache' is the path of a database
+    where the XML of each package is kept and reused until its file
+    changes.
+    """
+    if compression not in _suffixes:
+        raise ValueError("unsupported compression %r" % compression)
+    outdir = outdir or os.path.join(directory, "repodata")
+    os.makedirs(outdir, exist_ok=True)
+    packages = sorted(scan.walk(directory))
+    cache = _Cache(cache, checksum) if cache is not None else None
+    writers = [_MetadataWriter(kind) for kind in KINDS]
+    skipped = []
+    executor = None
+    try:
+        hits = set()
+        if cache is not None:
+            hits = set(path for path, st in packages if cache.has(path, st))
+        todo = [
+            (path, os.path.relpath(path, directory).replace(os.sep, "/"), st)
+            for path, st in packages
+        ]
+        # the packages are written in the order of `chunks', those that are
+        # not cached are read in the same order
+        chunks = [todo[i : i + chunk_size] for i in range(0, len(todo), chunk_size)]
+        missing = [[p for p in chunk if p[0] not in hits] for chunk in chunks]
+        missing = [chunk for chunk in missing if chunk]
+        if workers == 1 or not missing:
+            parsed = (_package_chunk(chunk, checksum) for chunk in missing)
+        else:
+            workers = workers or os.cpu_count() or 1
+            executor = concurrent.futures.ProcessPoolExecutor(workers)
+            parsed = _bounded_map(
+                executor, _package_chunk, missing, 2 * workers, checksum
+            )
+        for chunk in chunks:
+            rows = {}
+            if any(package[0] not in hits for package in chunk):
+                for path, st, xml in next(parsed):
+                    rows[path] = (st, xml)
+                if cache is not None:
+                    cache.update(
+                        (path, st, xml)
+                        for path, (st, xml) in rows.items()
+                        if not isinstance(xml, Exception)
+                    )
+            for path, _, st in chunk:
+                st, xml = rows.get(path) or (st, cache.get(path, st))
+                if isinstance(xml, Exception):
+                    skipped.append((path, xml))
+                    continue
+                for writer in writers:
+                    writer.add(xml[writer.kind])
+        if cache is not None:
+            cache.prune(set(path for path, _ in packages))
+
+        old = set(os.listdir(outdir))
+        data = [writer.finish(outdir, compression, checksum) for writer in writers]
+        repomd = (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<repomd xmlns="%s" xmlns:rpm="%s">\n'
+            "  <revision>%d</revision>\n%s</repomd>\n"
+            % (_REPO_NS, _RPM_NS, time.time(), "".join(data))
+        )
+        path = os.path.join(outdir, "repomd.xml")
+        fd, tmp = tempfile.mkstemp(dir=outdir, prefix=".repomd")
+        with io.open(fd, "w", encoding="utf-8") as fileobj:
+            fileobj.write(repomd)
+        os.replace(tmp, path)
+        # the metadata files of the previous repomd.xml
+        for name in old:
+            if re.match(r"^[0-9a-f]+-(%s)\.xml\.(gz|zst)$" % "|".join(KINDS), name):
+                if name not in repomd:
+                    os.remove(os.path.join(outdir, name))
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        for writer in writers:
+            writer.close()
+        if cache is not None:
+            cache.close()
+    return path, skipped
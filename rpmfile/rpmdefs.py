@@ -71,3 +71,33 @@ RPMTAGS = (
     RPMTAG_URL,
     RPMTAG_ARCH,
 )
+
+# file flags, the bits of the fileflags tag
+RPMFILE_CONFIG = 1 << 0
+RPMFILE_DOC = 1 << 1
+RPMFILE_MISSINGOK = 1 << 3
+RPMFILE_NOREPLACE = 1 << 4
+RPMFILE_GHOST = 1 << 6
+RPMFILE_LICENSE = 1 << 7
+RPMFILE_README = 1 << 8
+RPMFILE_ARTIFACT = 1 << 12
+
+# dependency sense flags, the bits of the requireflags, provideflags, ... tags
+RPMSENSE_LESS = 1 << 1
+RPMSENSE_GREATER = 1 << 2
+RPMSENSE_EQUAL = 1 << 3
+RPMSENSE_SENSEMASK = RPMSENSE_LESS | RPMSENSE_GREATER | RPMSENSE_EQUAL
+RPMSENSE_PREREQ = 1 << 6
+RPMSENSE_SCRIPT_PRE = 1 << 9
+RPMSENSE_SCRIPT_POST = 1 << 10
+RPMSENSE_RPMLIB = 1 << 24
+
+# hash algorithms of the payloaddigestalgo and filedigestalgo tags
+PGPHASHALGO = {
+    1: "md5",
+    2: "sha1",
+    8: "sha256",
+    9: "sha384",
+    10: "sha512",
+    11: "sha224",
+}
@@ -0,0 +1,204 @@
+"""
+Scanning directory trees of RPMs for their headers.
+
+    for record in rpmfile.scan.scan("/srv/mirror", cache="scan.db", workers=8):
+        print(record["name"], record["version"])
+
+Files are found with os.scandir() and their headers are parsed in a pool
+of processes, a chunk of files per task. With a cache, each record is kept
+in an SQLite database under the path, size and modification time of its
+file, along with the sha256 of its lead and headers, and later scans only
+parse the files that are new or have changed.
+"""
+
+import concurrent.futures
+import hashlib
+import io
+import json
+import os
+import sqlite3
+
+from .errors import RPMError
+from .headers import read_headers
+
+DEFAULT_TAGS = (
+    "name",
+    "serial",
+    "version",
+    "release",
+    "arch",
+    "summary",
+    "copyright",
+    "sourcerpm",
+    "buildtime",
+    "size",
+)
+
+_CACHE_VERSION = 1
+
+
+def walk(top):
+    """
+    Yield the path and os.stat_result of each `.rpm' file under `top',
+    without following symbolic links to directories.
+    """
+    stack = [top]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            dirs = []
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+                elif entry.name.endswith(".rpm") and entry.is_file():
+                    yield entry.path, entry.stat()
+            stack.extend(sorted(dirs, reverse=True))
+
+
+def _jsonable(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).decode("utf-8", "replace")
+    if isinstance(value, (list, tuple)) or hasattr(value, "tolist"):
+        return [_jsonable(item) for item in value]
+    return value
+
+
+def _parse(path, tags):
+    """Return the sha256 of the lead and headers of `path', and a record"""
+    with io.open(path, "rb") as fileobj:
+        (_, signature), ((_, end), header) = read_headers(fileobj)
+        fileobj.seek(0)
+        digest = hashlib.sha256(fileobj.read(end)).hexdigest()
+    record = {}
+    for tag in tags:
+        value = header.get(tag, signature.get(tag))
+        record[tag] = _jsonable(value)
+    return digest, record
+
+
+def _parse_chunk(files, tags):
+    """Parse each (path, size, mtime_ns) of `files' in a worker process"""
+    results = []
+    for path, size, mtime_ns in files:
+        try:
+            digest, record = _parse(path, tags)
+        except (OSError, RPMError, EOFError) as error:
+            results.append((path, size, mtime_ns, None, {"error": str(error)}))
+        else:
+            results.append((path, size, mtime_ns, digest, record))
+    return results
+
+
+class ScanCache(object):
+    """
+    The records of scanned files in the SQLite database at `path', by the
+    path, size and modification time of the file. The records of a cache
+    are for one set of `tags': opening it with others empties it.
+    """
+
+    def __init__(self, path, tags=DEFAULT_TAGS):
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS packages (path TEXT PRIMARY KEY, "
+            "size INTEGER, mtime_ns INTEGER, sha256 TEXT, record TEXT)"
+        )
+        meta = json.dumps({"version": _CACHE_VERSION, "tags": list(tags)})
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'key'").fetchone()
+        if row is None or row[0] != meta:
+            self._db.execute("DELETE FROM packages")
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('key', ?)", (meta,))
+        self._db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excinfo):
+        self.close()
+
+    def entries(self):
+        """Return a dict of (size, mtime_ns, sha256, record) by path"""
+        return {
+            path: (size, mtime_ns, sha256, record)
+            for path, size, mtime_ns, sha256, record in self._db.execute(
+                "SELECT path, size, mtime_ns, sha256, record FROM packages"
+            )
+        }
+
+    def update(self, rows):
+        """Store the (path, size, mtime_ns, sha256, record) `rows'"""
+        self._db.executemany(
+            "INSERT OR REPLACE INTO packages VALUES (?, ?, ?, ?, ?)", rows
+        )
+        self._db.commit()
+
+    def remove(self, paths):
+        self._db.executemany(
+            "DELETE FROM packages WHERE path = ?", [(path,) for path in paths]
+        )
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+
+def _record(path, size, mtime_ns, digest, record):
+    return dict(record, path=path, size_bytes=size, mtime_ns=mtime_ns, sha256=digest)
+
+
+def scan(top, cache=None, workers=None, tags=DEFAULT_TAGS, chunk_size=64):
+    """
+    Yield a record, a dict of the `tags' of its headers, for each RPM
+    under `top', with its `path', `size_bytes', `mtime_ns' and the
+    `sha256' of its lead and headers. Files that cannot be parsed have an
+    `error' instead of tags.
+
+    `cache' is the path of a ScanCache database, where the records of
+    files that have not changed since the last scan are read from, and
+    records of files that have been removed are dropped. Headers are
+    parsed by `workers' processes, all CPUs by default or the calling
+    process with 1, `chunk_size' files per task.
+    """
+    tags = tuple(tags)
+    cache = ScanCache(cache, tags) if cache is not None else None
+    try:
+        known = cache.entries() if cache is not None else {}
+        seen = set()
+        todo = []
+        for path, st in walk(top):
+            seen.add(path)
+            entry = known.get(path)
+            if entry is not None and entry[:2] == (st.st_size, st.st_mtime_ns):
+                size, mtime_ns, digest, record = entry
+                yield _record(path, size, mtime_ns, digest, json.loads(record))
+            else:
+                todo.append((path, st.st_size, st.st_mtime_ns))
+        chunks = [todo[i : i + chunk_size] for i in range(0, len(todo), chunk_size)]
+        if workers == 1 or not chunks:
+            results = (_parse_chunk(chunk, tags) for chunk in chunks)
+            executor = None
+        else:
+            executor = concurrent.futures.ProcessPoolExecutor(workers)
+            results = executor.map(_parse_chunk, chunks, [tags] * len(chunks))
+        try:
+            for rows in results:
+                if cache is not None:
+                    cache.update(
+                        (path, size, mtime_ns, digest, json.dumps(record))
+                        for path, size, mtime_ns, digest, record in rows
+                        if digest is not None
+                    )
+                for row in rows:
+                    yield _record(*row)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        if cache is not None:
+            prefix = os.path.join(top, "")
+            cache.remove(
+                path for path in known if path not in seen and path.startswith(prefix)
+            )
+    finally:
+        if cache is not None:
+            cache.close()
@@ -0,0 +1,111 @@
+"""
+A directory tree of the members of an RPM, for path queries that do not
+rescan the member list.
+"""
+
+import posixpath
+from fnmatch import fnmatchcase
+
+_magic = frozenset("*?[")
+
+
+def _split(path):
+    """Split `path' into its components, ignoring "/", "./" and "." parts"""
+    return [part for part in path.split("/") if part and part != "."]
+
+
+class _DirTree(object):
+    """
+    Members by path. Directories are dicts from child names to nodes and
+    every other member is its RPMInfo. Directories that only exist because
+    members are stored below them are created as they are implied.
+    """
+
+    def __init__(self, members=()):
+        self._root = {}
+        # "usr/bin/foo" -> node, so that a lookup is a single hash lookup
+        self._paths = {"": self._root}
+        for member in members:
+            self.add(member)
+
+    def add(self, member):
+        parts = _split(member.name)
+        if not parts:
+            return
+        node = self._root
+        for i, part in enumerate(parts[:-1]):
+            child = node.get(part)
+            if not isinstance(child, dict):
+                child = node[part] = {}
+                self._paths["/".join(parts[: i + 1])] = child
+            node = child
+        key = "/".join(parts)
+        if member.isdir:
+            if not isinstance(node.get(parts[-1]), dict):
+                node[parts[-1]] = self._paths[key] = {}
+        else:
+            node[parts[-1]] = self._paths[key] = member
+
+    def lookup(self, path):
+        """Return the node at `path', or None"""
+        return self._paths.get("/".join(_split(path)))
+
+    def exists(self, path):
+        return "/".join(_split(path)) in self._paths
+
+    def listdir(self, path):
+        node = self.lookup(path)
+        if node is None:
+            raise FileNotFoundError(path)
+        if not isinstance(node, dict):
+            raise NotADirectoryError(path)
+        return list(node)
+
+    def walk(self, top):
+        node = self.lookup(top)
+        if not isinstance(node, dict):
+            return
+        stack = [(top, node)]
+        while stack:
+            dirpath, node = stack.pop()
+            dirnames = [name for name, child in node.items() if isinstance(child, dict)]
+            filenames = [
+                name for name, child in node.items() if not isinstance(child, dict)
+            ]
+            yield dirpath, dirnames, filenames
+            # like os.walk, the caller may prune dirnames in place
+            for name in reversed(dirnames):
+                stack.append((posixpath.join(dirpath, name), node[name]))
+
+    def glob(self, pattern):
+        """
+        Return the paths matching the shell-style `pattern', where wildcards
+        match within a single path component like glob.glob(). Matches keep
+        the pattern's leading "/" or "./".
+        """
+        prefix = ""
+        if pattern.startswith("/"):
+            prefix = "/"
+        elif pattern.startswith("./"):
+            prefix = "./"
+        parts = _split(pattern)
+        matches = []
+        if not parts:
+            return matches
+        nodes = [(prefix, self._root)]
+        for depth, part in enumerate(parts):
+            last = depth == len(parts) - 1
+            found = []
+            for path, node in nodes:
+                if not isinstance(node, dict):
+                    continue
+                if _magic.isdisjoint(part):
+                    names = [part] if part in node else []
+                else:
+                    names = [name for name in node if fnmatchcase(name, part)]
+                for name in names:
+                    found.append(
+                        (path + name if last else path + name + "/", node[name])
+                    )
+            nodes = found
+        return [path for path, _ in nodes]
@@ -0,0 +1,241 @@
+"""
+Comparing RPM versions the way rpm does.
+
+rpmvercmp() compares two version strings directly. For sorting many,
+version_key() turns a string into a tuple that compares like rpmvercmp()
+under plain tuple comparison, and EVR holds the keys of an epoch, version
+and release:
+
+    sorted(EVR.parse(s) for s in evrs)
+    latest(packages, keep=2)
+"""
+
+import functools
+import itertools
+import re
+
+# segments of a version: runs of ASCII digits or letters, tildes and carets
+_segments = re.compile(r"[0-9]+|[A-Za-z]+|~|\^")
+
+# ranks of the parts of a version key, in the order rpmvercmp() puts them:
+# a tilde sorts before the end of the string, a caret after it but before
+# any other segment, and numbers after letters
+_TILDE, _END, _CARET, _ALPHA, _NUMBER = range(5)
+
+
+def _isalnum(c):
+    # rpm only considers ASCII letters and digits
+    return c.isascii() and c.isalnum()
+
+
+def rpmvercmp(a, b):
+    """
+    Compare the version or release strings `a' and `b' like rpm's
+    rpmvercmp(): return 1 if `a' is newer, -1 if `b' is, 0 if they are
+    equal.
+    """
+    if a == b:
+        return 0
+    i = j = 0
+    na, nb = len(a), len(b)
+    while i < na or j < nb:
+        while i < na and not _isalnum(a[i]) and a[i] not in "~^":
+            i += 1
+        while j < nb and not _isalnum(b[j]) and b[j] not in "~^":
+            j += 1
+        # a tilde sorts before everything, even the end of the string
+        ca = a[i] if i < na else ""
+        cb = b[j] if j < nb else ""
+        if ca == "~" or cb == "~":
+            if ca != "~":
+                return 1
+            if cb != "~":
+                return -1
+            i += 1
+            j += 1
+            continue
+        # a caret sorts after the end of the string, before anything else
+        if ca == "^" or cb == "^":
+            if not ca:
+                return -1
+            if not cb:
+                return 1
+            if ca != "^":
+                return 1
+            if cb != "^":
+                return -1
+            i += 1
+            j += 1
+            continue
+        if not (ca and cb):
+            break
+        start_a, start_b = i, j
+        if ca.isdigit():
+            while i < na and a[i].isascii() and a[i].isdigit():
+                i += 1
+            while j < nb and b[j].isascii() and b[j].isdigit():
+                j += 1
+            isnum = True
+        else:
+            while i < na and a[i].isascii() and a[i].isalpha():
+                i += 1
+            while j < nb and b[j].isascii() and b[j].isalpha():
+                j += 1
+            isnum = False
+        if j == start_b:
+            # numeric segments are newer than alphabetic ones
+            return 1 if isnum else -1
+        sa, sb = a[start_a:i], b[start_b:j]
+        if isnum:
+            sa, sb = sa.lstrip("0"), sb.lstrip("0")
+            if len(sa) != len(sb):
+                return 1 if len(sa) > len(sb) else -1
+        if sa != sb:
+            return 1 if sa > sb else -1
+    if i >= na and j >= nb:
+        return 0
+    return -1 if i >= na else 1
+
+
+def split_evr(evr):
+    """
+    Split "epoch:version-release" into (epoch, version, release), with None
+    for a missing epoch or release.
+    """
+    epoch, colon, rest = evr.partition(":")
+    if not colon or not epoch.isdigit():
+        epoch, rest = None, evr
+    version, dash, release = rest.rpartition("-")
+    if not dash:
+        version, release = rest, None
+    return epoch, version, release
+
+
+def compare_evr(a, b):
+    """
+    Compare the (epoch, version, release) tuples `a' and `b' like rpm. A
+    missing epoch (None) counts as 0, and releases are only compared when
+    both are given.
+    """
+    epoch_a, epoch_b = int(a[0] or 0), int(b[0] or 0)
+    if epoch_a != epoch_b:
+        return 1 if epoch_a > epoch_b else -1
+    rc = rpmvercmp(a[1] or "", b[1] or "")
+    if rc or a[2] is None or b[2] is None:
+        return rc
+    return rpmvercmp(a[2], b[2])
+
+
+@functools.lru_cache(maxsize=1 << 18)
+def version_key(version):
+    """
+    Return a flat tuple of ranks, each followed by the value of its segment
+    for numbers and letters, for the version or release string `version'.
+    version_key(a) < version_key(b) exactly when rpmvercmp(a, b) < 0, and
+    as a key ends with a rank of its own, keys can be concatenated. Keys
+    are cached, versions repeat a lot.
+    """
+    key = []
+    for segment in _segments.findall(version):
+        c = segment[0]
+        if c == "~":
+            key.append(_TILDE)
+        elif c == "^":
+            key.append(_CARET)
+        elif c.isdigit():
+            key += (_NUMBER, int(segment))
+        else:
+            key += (_ALPHA, segment)
+    key.append(_END)
+    return tuple(key)
+
+
+class EVR(object):
+    """
+    An epoch, version and release, ordered like rpm orders them. A missing
+    epoch counts as 0 and a missing release as an empty one. `key' is
+    computed once, a flat tuple of the epoch and the version keys, so
+    sorting compares plain tuples.
+    """
+
+    __slots__ = ("epoch", "version", "release", "key")
+
+    def __init__(self, epoch, version, release=None):
+        self.epoch = epoch
+        self.version = version
+        self.release = release
+        self.key = (
+            (int(epoch or 0),) + version_key(version or "") + version_key(release or "")
+        )
+
+    @classmethod
+    def parse(cls, evr):
+        """Return the EVR of a string like 1:2.0-3, 2.0-3 or 2.0"""
+        epoch, version, release = split_evr(evr)
+        return cls(None if epoch is None else int(epoch), version, release)
+
+    @classmethod
+    def from_headers(cls, headers):
+        """Return the EVR of the serial, version and release tags of `headers'"""
+        decode = lambda value: value.decode("utf-8", "replace")
+        return cls(
+            headers.get("serial"),
+            decode(headers.get("version", b"")),
+            decode(headers.get("release", b"")),
+        )
+
+    def __str__(self):
+        evr = self.version
+        if self.epoch is not None:
+            evr = "%d:%s" % (self.epoch, evr)
+        if self.release is not None:
+            evr = "%s-%s" % (evr, self.release)
+        return evr
+
+    def __repr__(self):
+        return "EVR(%r, %r, %r)" % (self.epoch, self.version, self.release)
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __ne__(self, other):
+        return self.key != other.key
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+    def __le__(self, other):
+        return self.key <= other.key
+
+    def __gt__(self, other):
+        return self.key > other.key
+
+    def __ge__(self, other):
+        return self.key >= other.key
+
+
+def latest(packages, keep=1):
+    """
+    Return the `keep' newest of each name of `packages', (name, evr, ...)
+    tuples where evr is an EVR or a string like "1:2.0-3" and name is
+    anything sortable, such as a (name, arch) pair. The result is sorted by
+    name, newest first within a name, and is computed with a single sort.
+    """
+    packages = list(packages)
+    keyed = []
+    for i, package in enumerate(packages):
+        evr = package[1]
+        if not isinstance(evr, EVR):
+            evr = EVR.parse(evr)
+        # the index breaks ties without comparing the packages themselves
+        keyed.append((package[0], evr.key, -i))
+    keyed.sort(reverse=True)
+    groups = [
+        [packages[-item[2]] for item in itertools.islice(group, keep)]
+        for _, group in itertools.groupby(keyed, key=lambda item: item[0])
+    ]
+    groups.reverse()
+    return [package for group in groups for package in group]
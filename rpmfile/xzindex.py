@@ -0,0 +1,254 @@
+"""
+Parallel decompression of multi-block xz payloads.
+
+Multi-threaded xz (and rpm's "w7T.xzdio" payloads) splits the data into
+blocks that are compressed independently, and the index at the end of
+each xz stream records their sizes. With the index the blocks can be
+found without decompressing anything, decompressed on a pool of threads
+(lzma releases the GIL while it works) and read in any order.
+"""
+
+import bisect
+import collections
+import io
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+from .errors import RPMError
+
+MiB = 1024 * 1024
+
+_header_magic = b"\xfd7zXZ\x00"
+_footer_magic = b"YZ"
+_stream_header_size = 12
+
+_Block = collections.namedtuple(
+    "_Block", "stream_header offset size uncompressed_offset uncompressed_size"
+)
+
+
+def _varint(buf, pos):
+    """Decode the xz variable length integer at `pos' of `buf'"""
+    value = shift = 0
+    while True:
+        if pos >= len(buf) or shift > 63:
+            raise RPMError("bad xz index")
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _read_at(fileobj, offset, size):
+    fileobj.seek(offset)
+    data = fileobj.read(size)
+    if len(data) != size:
+        raise RPMError("truncated xz stream")
+    return data
+
+
+def read_index(fileobj, end):
+    """
+    Return the blocks of the xz streams held in the first `end' bytes of
+    the seekable `fileobj', from the indexes of the streams. Raise
+    RPMError if they are not well-formed.
+    """
+    streams = []
+    pos = end
+    while pos > 0:
+        if pos < 2 * _stream_header_size:
+            raise RPMError("truncated xz stream")
+        footer = _read_at(fileobj, pos - _stream_header_size, _stream_header_size)
+        if footer[-4:] == b"\0\0\0\0":
+            # stream padding
+            pos -= 4
+            continue
+        if footer[10:] != _footer_magic:
+            raise RPMError("bad xz stream footer")
+        if struct.unpack("<I", footer[:4])[0] != zlib.crc32(footer[4:10]):
+            raise RPMError("bad xz stream footer checksum")
+        index_size = (struct.unpack("<I", footer[4:8])[0] + 1) * 4
+        index_start = pos - _stream_header_size - index_size
+        if index_start < _stream_header_size:
+            raise RPMError("bad xz index size")
+        index = _read_at(fileobj, index_start, index_size)
+        if index[0] != 0 or struct.unpack("<I", index[-4:])[0] != zlib.crc32(
+            index[:-4]
+        ):
+            raise RPMError("bad xz index")
+        count, i = _varint(index, 1)
+        records = []
+        for _ in range(count):
+            size, i = _varint(index, i)
+            uncompressed_size, i = _varint(index, i)
+            records.append((size, uncompressed_size))
+        stream_start = (
+            index_start
+            - sum((size + 3) & ~3 for size, _ in records)
+            - _stream_header_size
+        )
+        if stream_start < 0:
+            raise RPMError("bad xz index")
+        header = _read_at(fileobj, stream_start, _stream_header_size)
+        if header[:6] != _header_magic or header[6:8] != footer[8:10]:
+            raise RPMError("bad xz stream header")
+        streams.append((header, stream_start + _stream_header_size, records))
+        pos = stream_start
+
+    blocks = []
+    uncompressed_offset = 0
+    for header, offset, records in reversed(streams):
+        for size, uncompressed_size in records:
+            blocks.append(
+                _Block(header, offset, size, uncompressed_offset, uncompressed_size)
+            )
+            offset += (size + 3) & ~3
+            uncompressed_offset += uncompressed_size
+    return blocks
+
+
+def _decompress_block(stream_header, data, uncompressed_size):
+    # a block is decoded as the only block of a stream, the missing index
+    # that would follow it is never needed
+    decompressor = lzma.LZMADecompressor(lzma.FORMAT_XZ)
+    try:
+        output = decompressor.decompress(stream_header + data)
+    except lzma.LZMAError as error:
+        raise RPMError("bad xz block: %s" % error)
+    if len(output) != uncompressed_size:
+        raise RPMError(
+            "xz block decompressed to %d bytes instead of %d"
+            % (len(output), uncompressed_size)
+        )
+    return output
+
+
+class _ParallelXZFile(io.RawIOBase):
+    """
+    A seekable reader of the blocks `blocks' of the xz data in `fileobj'.
+    Blocks after the one being read are decompressed ahead on `threads'
+    threads, holding at most `readahead' bytes of decompressed data or
+    a single block if that is larger. A seek to another block drops the
+    read-ahead and continues from that block.
+    """
+
+    def __init__(self, fileobj, blocks, threads, readahead=256 * MiB):
+        self._fileobj = fileobj
+        self._blocks = blocks
+        self._starts = [block.uncompressed_offset for block in blocks]
+        last = blocks[-1]
+        self._size = last.uncompressed_offset + last.uncompressed_size
+        self._threads = threads
+        self._readahead = readahead
+        self._executor = None
+        # (block number, future) of the blocks being decompressed, in order
+        self._pending = collections.deque()
+        self._pending_size = 0
+        self._next = 0
+        self._current = None
+        self._buffer = b""
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def _submit(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self._threads)
+        while self._next < len(self._blocks) and len(self._pending) < 2 * self._threads:
+            block = self._blocks[self._next]
+            if self._pending and (
+                self._pending_size + block.uncompressed_size > self._readahead
+            ):
+                break
+            data = _read_at(self._fileobj, block.offset, (block.size + 3) & ~3)
+            future = self._executor.submit(
+                _decompress_block, block.stream_header, data, block.uncompressed_size
+            )
+            self._pending.append((self._next, future))
+            self._pending_size += block.uncompressed_size
+            self._next += 1
+
+    def _cancel(self):
+        for _, future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._pending_size = 0
+
+    def _load(self, number):
+        if number == self._current:
+            return
+        if not self._pending or self._pending[0][0] != number:
+            self._cancel()
+            self._next = number
+            self._submit()
+        _, future = self._pending.popleft()
+        self._pending_size -= self._blocks[number].uncompressed_size
+        # let go of the previous block before waiting for the next one
+        self._buffer = b""
+        self._buffer = future.result()
+        self._current = number
+        self._submit()
+
+    def readinto(self, b):
+        if self._pos >= self._size:
+            return 0
+        number = bisect.bisect_right(self._starts, self._pos) - 1
+        self._load(number)
+        offset = self._pos - self._blocks[number].uncompressed_offset
+        n = min(len(b), len(self._buffer) - offset)
+        b[:n] = self._buffer[offset : offset + n]
+        self._pos += n
+        return n
+
+    def close(self):
+        self._cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._buffer = b""
+        super(_ParallelXZFile, self).close()
+
+
+def open_xz(fileobj, threads=None):
+    """
+    Return a file object of the decompressed contents of the xz compressed
+    `fileobj'. Payloads of more than one block are decompressed on
+    `threads' threads (all CPUs if None). Single-block payloads, and ones
+    whose index can not be read, use lzma.LZMAFile.
+    """
+    if threads is None:
+        threads = os.cpu_count() or 1
+    if threads > 1 and fileobj.seekable():
+        start = fileobj.tell()
+        try:
+            blocks = read_index(fileobj, fileobj.seek(0, io.SEEK_END))
+        except RPMError:
+            blocks = []
+        fileobj.seek(start)
+        if len(blocks) > 1:
+            return io.BufferedReader(_ParallelXZFile(fileobj, blocks, threads))
+    return lzma.LZMAFile(fileobj)
@@ -0,0 +1,311 @@
+"""
+Build small, self-contained RPM files in memory so tests do not need to
+download real packages.
+"""
+
+import bz2
+import gzip
+import hashlib
+import lzma
+import os
+import stat
+import struct
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from rpmfile.headers import tags, sigtags
+
+NULL, CHAR, INT8, INT16, INT32, INT64, STRING, BIN, STRING_ARRAY, I18NSTRING = range(10)
+
+_alignment = {INT16: 2, INT32: 4, INT64: 8}
+_int_formats = {CHAR: "B", INT8: "B", INT16: "H", INT32: "I", INT64: "Q"}
+
+
+def _encode(path):
+    # surrogates stand for bytes that are not UTF-8, like os.fsencode()
+    return path.encode("utf-8", "surrogateescape")
+
+
+class File(object):
+    """A file (or directory, or symlink) to place in a synthetic RPM"""
+
+    def __init__(self, path, data=b"", mode=None, linkto=None, mtime=0, flags=0):
+        self.path = path
+        self.linkto = linkto
+        if linkto is not None:
+            data = _encode(linkto)
+            mode = mode or (stat.S_IFLNK | 0o777)
+        self.data = data
+        self.mode = mode or (stat.S_IFREG | 0o644)
+        self.mtime = mtime
+        self.flags = flags
+
+    @property
+    def isdir(self):
+        return stat.S_ISDIR(self.mode)
+
+
+def directory(path, mode=0o755):
+    return File(path, mode=stat.S_IFDIR | mode)
+
+
+def _xz_varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def xz_blocks(data, block_size):
+    """
+    Return `data' compressed as one xz stream of independent blocks of
+    `block_size' bytes, like `xz -T0' writes them.
+    """
+    crc32 = lambda b: struct.pack("<I", zlib.crc32(b))
+    pad4 = lambda b: b + b"\0" * (-len(b) % 4)
+    # no flags, CRC32 check
+    flags = b"\0\x01"
+    out = bytearray(b"\xfd7zXZ\0" + flags + crc32(flags))
+    records = []
+    for start in range(0, len(data), block_size):
+        chunk = data[start : start + block_size]
+        compressed = lzma.compress(
+            chunk,
+            format=lzma.FORMAT_RAW,
+            filters=[{"id": lzma.FILTER_LZMA2, "dict_size": 1 << 20}],
+        )
+        # one filter, LZMA2 with a 1 MiB dictionary
+        header = pad4(b"\0\0\x21\x01\x10")
+        header = bytes([(len(header) + 4) // 4 - 1]) + header[1:]
+        header += crc32(header)
+        unpadded = len(header) + len(compressed) + 4
+        out += pad4(header + compressed) + crc32(chunk)
+        records.append(_xz_varint(unpadded) + _xz_varint(len(chunk)))
+    index = pad4(b"\0" + _xz_varint(len(records)) + b"".join(records))
+    index += crc32(index)
+    out += index
+    backward = struct.pack("<I", len(index) // 4 - 1) + flags
+    out += crc32(backward) + backward + b"YZ"
+    return bytes(out)
+
+
+def compress(data, compression):
+    if compression == "gzip":
+        return gzip.compress(data, mtime=0)
+    if compression == "xz":
+        return lzma.compress(data)
+    if compression == "bzip2":
+        return bz2.compress(data)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("zstandard module not present")
+        return zstandard.ZstdCompressor().compress(data)
+    if compression is None:
+        return data
+    raise ValueError("unknown compression %r" % compression)
+
+
+def cpio(files):
+    """Return a newc cpio archive of `files' in the layout rpm writes"""
+    out = bytearray()
+
+    def member(name, mode, data, mtime, ino):
+        name = _encode(name) + b"\x00"
+        fields = (ino, mode, 0, 0, 1, mtime, len(data), 0, 0, 0, 0, len(name), 0)
+        out.extend(b"070701" + b"".join(b"%08x" % f for f in fields))
+        out.extend(name)
+        out.extend(b"\x00" * ((4 - len(out) % 4) % 4))
+        out.extend(data)
+        out.extend(b"\x00" * ((4 - len(out) % 4) % 4))
+
+    for ino, f in enumerate(files, 1):
+        if f.flags & 64:  # %ghost files are not in the payload
+            continue
+        member(archive_path(f.path), f.mode, b"" if f.isdir else f.data, f.mtime, ino)
+    member("TRAILER!!!", 0, b"", 0, 0)
+    return bytes(out)
+
+
+def archive_path(path):
+    if path.startswith("/"):
+        return "." + path
+    return path
+
+
+def header(entries):
+    """Serialize `entries', a dict of tag -> (type, value), as an RPM header"""
+    index = bytearray()
+    store = bytearray()
+    for tag in sorted(entries):
+        ty, value = entries[tag]
+        if ty in _int_formats:
+            values = value if isinstance(value, (list, tuple)) else [value]
+            store.extend(b"\x00" * ((-len(store)) % _alignment.get(ty, 1)))
+            offset = len(store)
+            store.extend(
+                struct.pack("!%d%s" % (len(values), _int_formats[ty]), *values)
+            )
+            count = len(values)
+        elif ty == BIN:
+            offset = len(store)
+            store.extend(value)
+            count = len(value)
+        elif ty in (STRING, I18NSTRING):
+            offset = len(store)
+            store.extend(value + b"\x00")
+            count = 1
+        elif ty == STRING_ARRAY:
+            offset = len(store)
+            for item in value:
+                store.extend(item + b"\x00")
+            count = len(value)
+        else:
+            raise ValueError("unsupported type %r" % ty)
+        index.extend(struct.pack("!iiii", tag, ty, offset, count))
+    intro = struct.pack(
+        "!4s4sii", b"\x8e\xad\xe8\x01", b"\x00" * 4, len(entries), len(store)
+    )
+    return intro + bytes(index) + bytes(store)
+
+
+def build_rpm(
+    files=(),
+    name="synthetic",
+    version="1.0",
+    release="1",
+    arch="noarch",
+    compression="gzip",
+    changelog=(),
+    extra_tags=None,
+    payload=None,
+):
+    """
+    Return the bytes of an RPM package holding `files'.
+
+    `changelog' is a sequence of (time, author, text) tuples and
+    `extra_tags' maps tag names to (type, value) pairs that are added to,
+    or override, the main header. `payload' replaces the compressed payload
+    when given.
+    """
+    files = list(files)
+    dirnames = []
+    dirindexes = []
+    basenames = []
+    for f in files:
+        dirname, _, basename = f.path.rpartition("/")
+        dirname += "/" if f.path.startswith("/") else ""
+        if dirname not in dirnames:
+            dirnames.append(dirname)
+        dirindexes.append(dirnames.index(dirname))
+        basenames.append(basename)
+
+    if payload is None:
+        payload = compress(cpio(files), compression)
+
+    entries = {
+        tags["name"]: (STRING, name.encode()),
+        tags["version"]: (STRING, version.encode()),
+        tags["release"]: (STRING, release.encode()),
+        tags["summary"]: (I18NSTRING, b"Synthetic package " + name.encode()),
+        tags["description"]: (I18NSTRING, b"A package built by the test suite."),
+        tags["buildtime"]: (INT32, 1700000000),
+        tags["buildhost"]: (STRING, b"localhost"),
+        tags["size"]: (INT32, sum(len(f.data) for f in files if not f.isdir)),
+        tags["copyright"]: (STRING, b"MIT"),
+        tags["group"]: (STRING, b"Unspecified"),
+        tags["os"]: (STRING, b"linux"),
+        tags["arch"]: (STRING, arch.encode()),
+        tags["sourcerpm"]: (
+            STRING,
+            ("%s-%s-%s.src.rpm" % (name, version, release)).encode(),
+        ),
+        tags["archive_format"]: (STRING, b"cpio"),
+        tags["payloaddigest"]: (
+            STRING_ARRAY,
+            [hashlib.sha256(payload).hexdigest().encode()],
+        ),
+        tags["payloaddigestalgo"]: (INT32, 8),
+    }
+    if compression is not None:
+        entries[tags["archive_compression"]] = (STRING, compression.encode())
+    if files:
+        entries.update(
+            {
+                tags["basenames"]: (STRING_ARRAY, [_encode(b) for b in basenames]),
+                tags["dirnames"]: (STRING_ARRAY, [_encode(d) for d in dirnames]),
+                tags["dirindexes"]: (INT32, dirindexes),
+                tags["filesizes"]: (
+                    INT32,
+                    [0 if f.isdir else len(f.data) for f in files],
+                ),
+                tags["filemodes"]: (INT16, [f.mode for f in files]),
+                tags["filemtimes"]: (INT32, [f.mtime for f in files]),
+                tags["fileflags"]: (INT32, [f.flags for f in files]),
+                tags["filelinktos"]: (
+                    STRING_ARRAY,
+                    [_encode(f.linkto or "") for f in files],
+                ),
+                tags["filemd5s"]: (
+                    STRING_ARRAY,
+                    [
+                        (
+                            b""
+                            if f.isdir or f.linkto
+                            else hashlib.sha256(f.data).hexdigest().encode()
+                        )
+                        for f in files
+                    ],
+                ),
+                tags["filedigestalgo"]: (INT32, 8),
+                tags["fileusername"]: (STRING_ARRAY, [b"root"] * len(files)),
+                tags["filegroupname"]: (STRING_ARRAY, [b"root"] * len(files)),
+            }
+        )
+    if changelog:
+        entries[tags["changelogtime"]] = (INT32, [c[0] for c in changelog])
+        entries[tags["authors"]] = (STRING_ARRAY, [c[1].encode() for c in changelog])
+        entries[tags["comments"]] = (STRING_ARRAY, [c[2].encode() for c in changelog])
+    for key, value in (extra_tags or {}).items():
+        entries[tags[key]] = value
+
+    main = header(entries)
+    signature = header(
+        {
+            sigtags["size"]: (INT32, len(main) + len(payload)),
+            sigtags["sigmd5"]: (BIN, hashlib.md5(main + payload).digest()),
+            sigtags["payloadsize"]: (INT32, len(cpio(files))),
+            sigtags["sha256"]: (STRING, hashlib.sha256(main).hexdigest().encode()),
+        }
+    )
+    signature += b"\x00" * ((-len(signature)) % 8)
+
+    lead = struct.pack(
+        "!4sBBhh66shh16s",
+        b"\xed\xab\xee\xdb",
+        3,
+        0,
+        0,
+        1,
+        ("%s-%s-%s" % (name, version, release)).encode()[:65],
+        1,
+        5,
+        b"",
+    )
+    return lead + signature + main + payload
+
+
+def write_rpms(top, packages):
+    """Write the RPMs of the dict `packages' to `top'/<name>.rpm, return the paths"""
+    paths = []
+    for name, data in packages.items():
+        path = os.path.join(top, name + ".rpm")
+        with open(path, "wb") as fileobj:
+            fileobj.write(data)
+        paths.append(path)
+    return paths
@@ -0,0 +1,140 @@
+import asyncio
+import random
+import unittest
+from unittest import mock
+
+from rpmfile import aio
+from rpmfile.errors import RPMError
+from rpmfile import decompress
+
+from tests.synthetic import File, build_rpm, compress, directory
+
+FILES = [
+    directory("/usr/share/demo"),
+    File("/usr/share/demo/README", b"read me\n" * 1000),
+    File("/usr/share/demo/empty"),
+    File("/usr/bin/demo", b"\x7fELF" + bytes(range(256)) * 400, mode=0o100755),
+    File("/usr/bin/demo-link", linkto="demo"),
+]
+EXPECTED = {"." + f.path: f.data for f in FILES if not f.isdir}
+COMPRESSIONS = ["gzip", "xz", "bzip2", None]
+if decompress.zstd is not None or decompress.zstandard is not None:
+    COMPRESSIONS.append("zstd")
+
+
+class TrickleReader(object):
+    """An async reader returning at most `chunk_size' bytes per read"""
+
+    def __init__(self, data, chunk_size=7):
+        self._data = data
+        self._pos = 0
+        self._chunk_size = chunk_size
+
+    async def read(self, n=-1):
+        await asyncio.sleep(0)
+        if n < 0:
+            n = len(self._data)
+        n = min(n, self._chunk_size)
+        data = self._data[self._pos : self._pos + n]
+        self._pos += len(data)
+        return data
+
+
+async def stream_reader(data):
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+async def inspect(reader, threshold=aio.THREAD_THRESHOLD):
+    if asyncio.iscoroutine(reader):
+        reader = await reader
+    rpm = aio.open(reader, threshold)
+    headers = await rpm.headers()
+    members = {}
+    async for member, stream in rpm.iter_members():
+        members[member.name] = await stream.read()
+    return headers, members
+
+
+class AsyncTest(unittest.TestCase):
+    def test_stream_reader(self):
+        for compression in COMPRESSIONS:
+            data = build_rpm(FILES, compression=compression)
+            headers, members = asyncio.run(inspect(stream_reader(data)))
+            self.assertEqual(headers["name"], b"synthetic")
+            self.assertEqual(members, EXPECTED, compression)
+
+    def test_small_reads(self):
+        data = build_rpm(FILES, compression="xz")
+        headers, members = asyncio.run(inspect(TrickleReader(data, 7)))
+        self.assertEqual(members, EXPECTED)
+
+    def test_decompress_in_thread(self):
+        data = build_rpm(FILES)
+        headers, members = asyncio.run(inspect(TrickleReader(data, 4096), 1))
+        self.assertEqual(members, EXPECTED)
+
+    def test_default_threshold_uses_thread(self):
+        # incompressible, so the compressed payload is over the threshold
+        noise = random.Random(0).randbytes(2 * aio.THREAD_THRESHOLD)
+        files = [File("/usr/share/noise", noise)]
+        to_thread = mock.Mock(wraps=asyncio.to_thread)
+        with mock.patch.object(aio.asyncio, "to_thread", to_thread):
+            headers, members = asyncio.run(
+                inspect(TrickleReader(build_rpm(files), aio._read_size))
+            )
+        self.assertEqual(members, {"./usr/share/noise": noise})
+        self.assertTrue(to_thread.called)
+
+    def test_output_limit(self):
+        data = bytes(4 * 1024 * 1024)
+        for compression in COMPRESSIONS:
+            if compression is None:
+                continue
+            decompressor = aio._decompressor(compression)
+            output = bytearray()
+            chunk = decompressor.decompress(compress(data, compression), 1000)
+            while chunk:
+                self.assertLessEqual(len(chunk), 1000, compression)
+                output += chunk
+                chunk = decompressor.decompress(b"", 1000)
+            self.assertTrue(decompressor.eof, compression)
+            self.assertEqual(output, data, compression)
+
+    def test_partial_reads(self):
+        async def run():
+            rpm = aio.open(await stream_reader(build_rpm(FILES)))
+            names = []
+            async for member, stream in rpm.iter_members():
+                # members left unread are skipped
+                await stream.read(3)
+                names.append(member.name)
+            return names
+
+        self.assertEqual(asyncio.run(run()), list(EXPECTED))
+
+    def test_concurrent(self):
+        data = build_rpm(FILES)
+
+        async def run():
+            return await asyncio.gather(
+                *[inspect(TrickleReader(data, 1024)) for _ in range(50)]
+            )
+
+        for headers, members in asyncio.run(run()):
+            self.assertEqual(members, EXPECTED)
+
+    def test_bad_magic(self):
+        with self.assertRaises(RPMError):
+            asyncio.run(inspect(stream_reader(b"\0" * 200)))
+
+    def test_truncated(self):
+        data = build_rpm(FILES)
+        with self.assertRaises(EOFError):
+            asyncio.run(inspect(stream_reader(data[:-100])))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+import rpmfile
+
+from tests.synthetic import File, build_rpm
+
+FILES = [
+    File("/etc/demo.conf", b"key = value\n" * 100),
+    File("/usr/bin/demo", bytes(range(256)) * 64, mode=0o100755),
+]
+
+
+class BufferTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def write(self, data):
+        path = os.path.join(self.tempdir, "demo.rpm")
+        with open(path, "wb") as fileobj:
+            fileobj.write(data)
+        return path
+
+    def check(self, rpm):
+        self.assertEqual(rpm.headers["name"], b"synthetic")
+        self.assertEqual(
+            [m.name for m in rpm.getmembers()],
+            ["./etc/demo.conf", "./usr/bin/demo"],
+        )
+        for f in FILES:
+            with rpm.extractfile("." + f.path) as fd:
+                self.assertEqual(fd.read(), f.data)
+        with rpm.extractfile("./etc/demo.conf") as fd:
+            self.assertEqual(fd.readline(), b"key = value\n")
+
+    def test_mmap(self):
+        path = self.write(build_rpm(FILES))
+        with rpmfile.open(path, mmap=True) as rpm:
+            self.check(rpm)
+            md5 = rpm.signature_headers["sigmd5"]
+            self.assertIsInstance(md5, memoryview)
+        self.assertEqual(len(md5), 16)
+        # the view held keeps the file mapped
+        self.assertFalse(rpm._mapping.closed)
+
+    def test_mmap_closed(self):
+        path = self.write(build_rpm(FILES, compression=None))
+        with rpmfile.open(path, mmap=True) as rpm:
+            self.check(rpm)
+            self.assertEqual(len(rpm.signature_headers["sigmd5"]), 16)
+            with rpm.extractfile("./usr/bin/demo") as fd:
+                self.assertEqual(fd.getbuffer(), FILES[1].data)
+        self.assertTrue(rpm._mapping.closed)
+
+    def test_mmap_uncompressed(self):
+        path = self.write(build_rpm(FILES, compression=None))
+        with rpmfile.open(path, mmap=True) as rpm:
+            self.check(rpm)
+            with rpm.extractfile("./usr/bin/demo") as fd:
+                view = fd.getbuffer()
+                self.assertIsInstance(view, memoryview)
+                self.assertEqual(view, FILES[1].data)
+            del view
+
+    def test_frombuffer(self):
+        data = build_rpm(FILES, compression=None)
+        for buffer in (data, bytearray(data), memoryview(data)):
+            with rpmfile.RPMFile.frombuffer(buffer) as rpm:
+                self.check(rpm)
+
+    def test_frombuffer_slice(self):
+        data = b"junk" + build_rpm(FILES, compression="xz")
+        with rpmfile.RPMFile.frombuffer(memoryview(data)[4:]) as rpm:
+            self.check(rpm)
+            # searched in place rather than copied
+            self.assertNotIsInstance(rpm._fileobj.buffer, bytes)
+
+    def test_uncompressed_file(self):
+        path = self.write(build_rpm(FILES, compression=None))
+        with rpmfile.open(path) as rpm:
+            self.check(rpm)
+            digest = hashlib.md5(rpm.extractfile("./usr/bin/demo").read())
+            self.assertEqual(digest.digest(), hashlib.md5(FILES[1].data).digest())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import bz2
+import hashlib
+import io
+import random
+import unittest
+
+import rpmfile
+from rpmfile import bz2blocks
+
+from tests.synthetic import File, build_rpm, cpio
+
+rng = random.Random(0)
+
+
+def sample(size):
+    out = bytearray()
+    while len(out) < size:
+        out += rng.randbytes(64) if rng.random() < 0.3 else b"abcdefgh" * 8
+    return bytes(out[:size])
+
+
+def digest(fileobj):
+    return hashlib.sha256(fileobj.read()).hexdigest()
+
+
+class ParallelBZ2Test(unittest.TestCase):
+    def assertSameOutput(self, compressed):
+        expected = digest(bz2.BZ2File(io.BytesIO(compressed)))
+        fileobj = bz2blocks.open_bzip2(io.BytesIO(compressed), threads=4)
+        self.assertIsInstance(fileobj.raw, bz2blocks._ParallelBZ2File)
+        self.assertEqual(digest(fileobj), expected)
+        self.assertIsNone(fileobj.raw._fallback)
+
+    def test_blocks(self):
+        # level 1 makes blocks of 100 kB
+        data = sample(1000000)
+        compressed = bz2.compress(data, 1)
+        blocks = list(bz2blocks._BlockScanner(io.BytesIO(compressed)).blocks())
+        self.assertGreater(len(blocks), 5)
+        self.assertEqual(
+            b"".join(bz2blocks._decompress_block(*block) for block in blocks), data
+        )
+
+    def test_levels(self):
+        for level in (1, 9):
+            self.assertSameOutput(bz2.compress(sample(1000000), level))
+
+    def test_concatenated_streams(self):
+        self.assertSameOutput(
+            bz2.compress(sample(300000), 1)
+            + bz2.compress(b"")
+            + bz2.compress(b"tail" * 1000)
+            + b"trailing garbage"
+        )
+
+    def test_fallback(self):
+        data = sample(500000)
+        compressed = bz2.compress(data, 1)
+        fileobj = bz2blocks.open_bzip2(io.BytesIO(compressed), threads=2)
+        self.assertEqual(fileobj.read(150000), data[:150000])
+        # as if a block had been split at a false match of the magic
+        fileobj.raw._pending[0] = fileobj.raw._executor.submit(
+            bz2.decompress, b"BZh1 not a block"
+        )
+        self.assertEqual(fileobj.read(), data[150000:])
+        self.assertIsNotNone(fileobj.raw._fallback)
+
+    def test_seek(self):
+        data = sample(500000)
+        fileobj = bz2blocks.open_bzip2(io.BytesIO(bz2.compress(data, 1)), threads=2)
+        for offset in (400000, 10, 250000):
+            fileobj.seek(offset)
+            self.assertEqual(fileobj.read(1000), data[offset : offset + 1000])
+        self.assertEqual(fileobj.seek(0, io.SEEK_END), len(data))
+
+    def test_truncated(self):
+        compressed = bz2.compress(sample(300000), 1)
+        fileobj = bz2blocks.open_bzip2(
+            io.BytesIO(compressed[: len(compressed) // 2]), threads=2
+        )
+        with self.assertRaises(EOFError):
+            fileobj.read()
+
+    def test_rpm(self):
+        files = [File("/usr/share/demo/f%d" % i, sample(60000)) for i in range(20)]
+        payload = bz2.compress(cpio(files), 1)
+        data = build_rpm(files, compression="bzip2", payload=payload)
+        for threads in (1, 4):
+            with rpmfile.open(fileobj=io.BytesIO(data), threads=threads) as rpm:
+                for entry in reversed(files):
+                    with rpm.extractfile("." + entry.path) as fileobj:
+                        self.assertEqual(fileobj.read(), entry.data)
+
+
+if __name__ == "__main__":
+    unittest.main()
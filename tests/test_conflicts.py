@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import rpmfile
+from rpmfile.conflicts import Conflict, find_conflicts
+from rpmfile.rpmdefs import RPMFILE_CONFIG, RPMFILE_GHOST
+
+from tests.synthetic import INT32, STRING_ARRAY, File, build_rpm, directory
+
+
+class ConflictsTest(unittest.TestCase):
+    def setUp(self):
+        self.top = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.top)
+
+    def write(self, name, files, **kwargs):
+        path = os.path.join(self.top, name + ".rpm")
+        with open(path, "wb") as fileobj:
+            fileobj.write(build_rpm(files, name=name, **kwargs))
+        return path
+
+    def test_conflicts(self):
+        a = self.write(
+            "a",
+            [
+                directory("/usr/share/demo"),
+                File("/usr/share/demo/same", b"same"),
+                File("/usr/share/demo/content", b"one"),
+                File("/usr/share/demo/mode", b"x", mode=0o100644),
+                File("/usr/share/demo/link", linkto="same"),
+                File("/etc/demo.conf", b"a = 1", flags=RPMFILE_CONFIG),
+                File("/var/log/demo.log", b"", flags=RPMFILE_GHOST),
+            ],
+        )
+        b = self.write(
+            "b",
+            [
+                directory("/usr/share/demo"),
+                File("/usr/share/demo/same", b"same"),
+                File("/usr/share/demo/content", b"two"),
+                File("/usr/share/demo/mode", b"x", mode=0o100755),
+                File("/usr/share/demo/link", linkto="content"),
+                File("/etc/demo.conf", b"a = 2", flags=RPMFILE_CONFIG),
+                File("/var/log/demo.log", b"log"),
+            ],
+        )
+        c = self.write("c", [File("/usr/share/demo/content", b"three")])
+        self.assertEqual(
+            sorted(find_conflicts([a, b, c])),
+            [
+                Conflict("/usr/share/demo/content", a, b, "digest"),
+                Conflict("/usr/share/demo/content", a, c, "digest"),
+                Conflict("/usr/share/demo/content", b, c, "digest"),
+                Conflict("/usr/share/demo/link", a, b, "link target"),
+                Conflict("/usr/share/demo/mode", a, b, "mode"),
+            ],
+        )
+
+    def test_colors(self):
+        files = [File("/usr/lib/libdemo.so", b"32"), File("/usr/bin/demo", b"1")]
+        a = self.write("a", files, extra_tags={"filecolors": (INT32, [1, 1])})
+        files = [File("/usr/lib/libdemo.so", b"64"), File("/usr/bin/demo", b"2")]
+        b = self.write("b", files, extra_tags={"filecolors": (INT32, [2, 0])})
+        self.assertEqual(
+            find_conflicts([a, b]), [Conflict("/usr/bin/demo", a, b, "digest")]
+        )
+
+    def test_owners(self):
+        files = [
+            directory("/usr/share/demo"),
+            File("/usr/share/demo/file", b"same"),
+            File("/usr/share/demo/link", linkto="file"),
+        ]
+        paths = [
+            self.write(
+                name,
+                files,
+                extra_tags={
+                    "fileusername": (STRING_ARRAY, [name.encode()] * 3),
+                    "filegroupname": (STRING_ARRAY, [b"root"] * 3),
+                },
+            )
+            for name in ("a", "b")
+        ]
+        # not the shared directory
+        self.assertEqual(
+            find_conflicts(paths),
+            [
+                Conflict("/usr/share/demo/file", paths[0], paths[1], "owner"),
+                Conflict("/usr/share/demo/link", paths[0], paths[1], "owner"),
+            ],
+        )
+
+    def test_paths_not_utf8(self):
+        # /opt/\xff and /opt/\xfe are different files
+        paths = [
+            self.write(
+                name,
+                [File("/opt/x", name.encode())],
+                extra_tags={"basenames": (STRING_ARRAY, [basename])},
+            )
+            for name, basename in (("a", b"\xff"), ("b", b"\xfe"))
+        ]
+        self.assertEqual(find_conflicts(paths), [])
+
+    def test_rpmfile_objects(self):
+        paths = [self.write(n, [File("/f", n.encode())]) for n in ("a", "b")]
+        with rpmfile.open(paths[0]) as a, rpmfile.open(paths[1]) as b:
+            (conflict,) = find_conflicts([a, b])
+        self.assertEqual(conflict.first, "a-1.0-1.noarch")
+        self.assertEqual(conflict.second, "b-1.0-1.noarch")
+
+    def test_many(self):
+        paths = [
+            self.write(
+                "p%d" % n,
+                [directory("/usr/share/common")]
+                + [File("/usr/share/p%d/f%d" % (n, i), b"x") for i in range(100)],
+            )
+            for n in range(100)
+        ]
+        start = time.perf_counter()
+        self.assertEqual(find_conflicts(paths), [])
+        self.assertLess(time.perf_counter() - start, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
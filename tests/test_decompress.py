@@ -0,0 +1,98 @@
+import hashlib
+import io
+import shutil
+import unittest
+from unittest import mock
+
+import rpmfile
+from rpmfile import decompress
+from rpmfile.errors import RPMError
+
+from tests.synthetic import File, build_rpm, compress, cpio
+
+FILES = [
+    File("/usr/share/demo/f%d" % i, (b"%d demo data\n" % i) * (i * 3000))
+    for i in range(10)
+]
+COMPRESSIONS = ["gzip", "xz", "bzip2"]
+if decompress.zstd is not None or decompress.zstandard is not None:
+    COMPRESSIONS.append("zstd")
+
+
+def digest(rpm):
+    sha = hashlib.sha256()
+    for member, fileobj in rpm.iter_members():
+        sha.update(member.name.encode() + b"\0" + fileobj.read())
+    return sha.hexdigest()
+
+
+class BackendsTest(unittest.TestCase):
+    def setUp(self):
+        # gzip itself can stand in for pigz where it is not installed
+        if shutil.which("gzip"):
+            decompress.register("gzip", "gzip", decompress._command("gzip", "-dc"))
+            self.addCleanup(decompress.backends["gzip"].pop, "gzip")
+
+    def test_identical_output(self):
+        for compression in COMPRESSIONS:
+            data = build_rpm(FILES, compression=compression)
+            with rpmfile.open(fileobj=io.BytesIO(data)) as rpm:
+                expected = digest(rpm)
+            names = decompress.available(compression)
+            self.assertIn("python", names)
+            for name in names + ["auto"]:
+                with rpmfile.open(fileobj=io.BytesIO(data), decompressor=name) as rpm:
+                    self.assertEqual(digest(rpm), expected, (compression, name))
+                    with rpm.extractfile("." + FILES[3].path) as fileobj:
+                        self.assertEqual(fileobj.read(), FILES[3].data)
+
+    def test_per_compression(self):
+        data = build_rpm(FILES, compression="xz")
+        with rpmfile.open(
+            fileobj=io.BytesIO(data), decompressor={"xz": "python", "gzip": "auto"}
+        ) as rpm:
+            self.assertEqual(len(rpm.getmembers()), len(FILES))
+
+    def test_fallback(self):
+        decompress.register(
+            "gzip", "missing", decompress._command("no-such-decompressor", "-d")
+        )
+        self.addCleanup(decompress.backends["gzip"].pop, "missing")
+        self.assertNotIn("missing", decompress.available("gzip"))
+        fileobj = io.BytesIO(compress(b"payload", "gzip"))
+        with decompress.open_payload(fileobj, "gzip", "missing") as payload:
+            self.assertEqual(payload.read(), b"payload")
+        # a backend for another compression
+        fileobj.seek(0)
+        with decompress.open_payload(fileobj, "gzip", "lbzip2") as payload:
+            self.assertEqual(payload.read(), b"payload")
+
+    def test_auto_prefers_parallel_bzip2(self):
+        # plain bzip2 is single threaded, slower than the block decoder
+        which = lambda command: "/usr/bin/bzip2" if command == "bzip2" else None
+        with mock.patch.object(decompress.shutil, "which", which):
+            self.assertEqual(decompress._choose("bzip2", "auto"), "python")
+            self.assertEqual(decompress._choose("bzip2", "bzip2"), "bzip2")
+
+    @unittest.skipUnless(shutil.which("gzip"), "gzip not installed")
+    def test_pipe_seek(self):
+        data = cpio(FILES)
+        payload = decompress.open_payload(
+            io.BytesIO(compress(data, "gzip")), "gzip", "gzip"
+        )
+        self.assertIsInstance(payload.raw, decompress._PipeFile)
+        for offset in (50000, 100, 120000):
+            payload.seek(offset)
+            self.assertEqual(payload.read(100), data[offset : offset + 100])
+        payload.close()
+
+    @unittest.skipUnless(shutil.which("gzip"), "gzip not installed")
+    def test_command_fails(self):
+        payload = decompress.open_payload(io.BytesIO(b"not gzip data"), "gzip", "gzip")
+        with self.assertRaises(RPMError):
+            payload.read()
+        payload.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import io
+import os
+import tempfile
+import unittest
+
+import rpmfile
+from rpmfile import deps
+from rpmfile.depindex import DepIndex
+from rpmfile.rpmdefs import RPMSENSE_EQUAL, RPMSENSE_GREATER, RPMSENSE_LESS
+
+from tests.synthetic import INT32, STRING_ARRAY, File, build_rpm, write_rpms
+
+EQ, GE, LT = RPMSENSE_EQUAL, RPMSENSE_GREATER | RPMSENSE_EQUAL, RPMSENSE_LESS
+
+
+def package(name, provides=(), requires=(), obsoletes=()):
+    extra = {}
+    for kind, items in (
+        ("provides", provides),
+        ("requires", requires),
+        ("obsoletes", obsoletes),
+    ):
+        if not items:
+            continue
+        name_tag, flags_tag, version_tag = deps.KINDS[kind]
+        extra[name_tag] = (STRING_ARRAY, [n.encode() for n, _, _ in items])
+        extra[flags_tag] = (INT32, [f for _, f, _ in items])
+        extra[version_tag] = (STRING_ARRAY, [v.encode() for _, _, v in items])
+    return build_rpm(name=name, extra_tags=extra)
+
+
+PACKAGES = {
+    "bash": package(
+        "bash",
+        provides=[("bash", EQ, "5.2-1"), ("/bin/sh", 0, "")],
+        requires=[("libc.so.6()(64bit)", 0, "")],
+    ),
+    "glibc": package(
+        "glibc",
+        provides=[("libc.so.6()(64bit)", 0, ""), ("glibc", EQ, "2:2.38-1")],
+    ),
+    "app": package(
+        "app",
+        requires=[("bash", GE, "5.0"), ("glibc", LT, "3:1")],
+        obsoletes=[("oldapp", LT, "2.0")],
+    ),
+    "legacy": package("legacy", requires=[("bash", LT, "4")]),
+}
+
+
+class OverlapsTest(unittest.TestCase):
+    def test_overlaps(self):
+        self.assertTrue(deps.overlaps(EQ, "5.2-1", GE, "5.0"))
+        self.assertFalse(deps.overlaps(EQ, "5.2-1", LT, "4"))
+        self.assertTrue(deps.overlaps(EQ, "1:1.0", GE, "0:9"))
+        self.assertTrue(deps.overlaps(0, "", GE, "5.0"))
+        # a release only counts when both have one
+        self.assertTrue(deps.overlaps(EQ, "1.0", EQ, "1.0-2"))
+        self.assertFalse(deps.overlaps(EQ, "1.0-1", EQ, "1.0-2"))
+
+
+class NevraTest(unittest.TestCase):
+    def test_nevra(self):
+        binary = {
+            "name": b"bash",
+            "serial": 1,
+            "version": b"5.2",
+            "release": b"1",
+            "arch": b"x86_64",
+            "sourcerpm": b"bash-5.2-1.src.rpm",
+        }
+        self.assertEqual(deps.nevra(binary), "bash-1:5.2-1.x86_64")
+        # a source package has the arch it was built on, but no sourcerpm
+        del binary["sourcerpm"]
+        self.assertEqual(deps.nevra(binary), "bash-1:5.2-1.src")
+
+
+class FilenamesTest(unittest.TestCase):
+    def test_not_utf8(self):
+        data = build_rpm([File("/opt/\udcff", b"a"), File("/opt/\udcfe", b"b")])
+        headers = rpmfile.open(fileobj=io.BytesIO(data)).main_headers
+        self.assertEqual(deps.filenames(headers), ["/opt/\udcff", "/opt/\udcfe"])
+
+
+class DepIndexTest(unittest.TestCase):
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.top = tempdir.name
+        self.paths = write_rpms(self.top, PACKAGES)
+        self.index = DepIndex.from_paths(self.paths, workers=1)
+
+    def check(self, index):
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index.whatprovides("/bin/sh"), ["bash-1.0-1.noarch"])
+        self.assertEqual(index.whatprovides("bash", ">=", "5"), ["bash-1.0-1.noarch"])
+        self.assertEqual(index.whatprovides("bash", ">", "6"), [])
+        self.assertEqual(index.whatprovides("missing"), [])
+        self.assertEqual(
+            index.whatrequires("bash"), ["app-1.0-1.noarch", "legacy-1.0-1.noarch"]
+        )
+        self.assertEqual(index.whatrequires("bash", "=", "5.2-1"), ["app-1.0-1.noarch"])
+        self.assertEqual(
+            index.whatrequires("glibc", "=", "2:2.38-1"), ["app-1.0-1.noarch"]
+        )
+        self.assertEqual(
+            index.what("obsoletes", "oldapp", "=", "1.5"), ["app-1.0-1.noarch"]
+        )
+        self.assertEqual(index.what("conflicts", "bash"), [])
+        self.assertEqual(index.lookup("provides", "glibc"), [(1, EQ, "2:2.38-1")])
+
+    def test_queries(self):
+        self.check(self.index)
+
+    def test_snapshot(self):
+        path = os.path.join(self.top, "deps.idx")
+        self.index.save(path)
+        self.check(DepIndex.load(path))
+
+    def test_processes(self):
+        self.check(DepIndex.from_paths(self.paths, workers=2, chunk_size=1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,205 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import rpmfile
+from rpmfile.cli import main
+
+from tests.synthetic import File, build_rpm, directory
+
+FILES = [
+    directory("/usr/share/demo"),
+    File("/usr/share/demo/README", b"read me\n" * 1000),
+    File("/usr/share/demo/empty"),
+    File("/usr/share/demo/big", bytes(range(256)) * 4096),
+    File("/usr/bin/demo", b"\x7fELF" + bytes(range(256)) * 40, mode=0o100755),
+    File("/usr/bin/demo-link", linkto="demo"),
+]
+
+
+class ExtractAllTest(unittest.TestCase):
+    workers = 1
+
+    def setUp(self):
+        self.dest = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dest)
+
+    def extractall(self, files, **kwargs):
+        with rpmfile.open(fileobj=io.BytesIO(build_rpm(files))) as rpm:
+            return rpm.extractall(self.dest, workers=self.workers, **kwargs)
+
+    def read(self, *path):
+        with open(os.path.join(self.dest, *path), "rb") as fileobj:
+            return fileobj.read()
+
+    def test_extractall(self):
+        extracted = self.extractall(FILES)
+        self.assertEqual(
+            [member.name for member in extracted],
+            [
+                "./usr/share/demo/README",
+                "./usr/share/demo/empty",
+                "./usr/share/demo/big",
+                "./usr/bin/demo",
+                "./usr/bin/demo-link",
+            ],
+        )
+        for entry in FILES[1:5]:
+            self.assertEqual(self.read(*entry.path.split("/")), entry.data)
+        mode = os.stat(os.path.join(self.dest, "usr", "bin", "demo")).st_mode
+        self.assertEqual(mode & 0o777, 0o755)
+        self.assertEqual(
+            os.readlink(os.path.join(self.dest, "usr", "bin", "demo-link")), "demo"
+        )
+
+    def test_bounded_inflight(self):
+        self.extractall(FILES, max_inflight=1024)
+        self.assertEqual(self.read("usr", "share", "demo", "big"), FILES[3].data)
+
+    def test_last_member_wins(self):
+        files = [File("/etc/conf", b"first" * 10000), File("/etc/conf", b"second")]
+        self.extractall(files)
+        self.assertEqual(self.read("etc", "conf"), b"second")
+
+    def test_path_traversal(self):
+        with self.assertRaises(ValueError):
+            self.extractall([File("../../escape", b"data")])
+
+    def test_extract_twice(self):
+        files = FILES + [File("/usr/bin/alternative", linkto="/etc/alternatives/x")]
+        self.extractall(files)
+        self.extractall(files)
+        self.assertEqual(
+            os.readlink(os.path.join(self.dest, "usr", "bin", "alternative")),
+            "/etc/alternatives/x",
+        )
+
+
+class InlineExtractAllTest(ExtractAllTest):
+    workers = 0
+
+    def test_reused_buffer(self):
+        copy = rpmfile.extract._copyfileobj
+        with mock.patch.object(rpmfile.extract, "_copyfileobj", wraps=copy) as copy:
+            self.extractall(FILES)
+        buffers = {id(call.kwargs["buf"]) for call in copy.mock_calls}
+        self.assertEqual(copy.call_count, 4)
+        self.assertEqual(len(buffers), 1)
+        self.assertEqual(self.read("usr", "share", "demo", "big"), FILES[3].data)
+
+
+class ManyWorkersExtractAllTest(ExtractAllTest):
+    workers = 4
+
+
+class ExtractJobsCLITest(unittest.TestCase):
+    def test_jobs(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        rpmpath = os.path.join(tempdir, "demo.rpm")
+        with open(rpmpath, "wb") as fileobj:
+            fileobj.write(build_rpm(FILES))
+        dest = os.path.join(tempdir, "root")
+        os.mkdir(dest)
+        _args, output = main("-x", "-j", "4", "-C", dest, rpmpath)
+        self.assertEqual(len(output["extracted"]), 5)
+        with open(os.path.join(dest, "usr", "share", "demo", "big"), "rb") as f:
+            self.assertEqual(f.read(), FILES[3].data)
+
+
+class ExtractManyTest(unittest.TestCase):
+    workers = 2
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.dest = os.path.join(self.tempdir, "root")
+        os.mkdir(self.dest)
+
+    def write(self, name, files):
+        path = os.path.join(self.tempdir, name + ".rpm")
+        with open(path, "wb") as fileobj:
+            fileobj.write(build_rpm(files, name=name))
+        return path
+
+    def read(self, *path):
+        with open(os.path.join(self.dest, *path), "rb") as fileobj:
+            return fileobj.read()
+
+    def test_order_decides_overwrites(self):
+        first = self.write(
+            "first",
+            [File("/etc/conf", b"first" * 10000), File("/etc/first", b"1")],
+        )
+        second = self.write("second", [File("/etc/conf", b"second")])
+        results = rpmfile.extract_many([first, second], self.dest, workers=self.workers)
+        self.assertEqual(self.read("etc", "conf"), b"second")
+        self.assertEqual(self.read("etc", "first"), b"1")
+        self.assertEqual([r.path for r in results], [first, second])
+        self.assertEqual([m.name for m in results[0].members], ["./etc/first"])
+        self.assertEqual(results[1].bytes, 6)
+        rpmfile.extract_many([second, first], self.dest, workers=self.workers)
+        self.assertEqual(self.read("etc", "conf"), b"first" * 10000)
+
+    def test_symlinked_directory(self):
+        base = self.write(
+            "base", [directory("/usr/lib"), File("/lib", linkto="usr/lib")]
+        )
+        lib = self.write(
+            "lib", [directory("/lib/modules"), File("/lib/modules/a.ko", b"ko")]
+        )
+        rpmfile.extract_many([lib, base], self.dest, workers=self.workers)
+        self.assertEqual(os.readlink(os.path.join(self.dest, "lib")), "usr/lib")
+        self.assertEqual(self.read("usr", "lib", "modules", "a.ko"), b"ko")
+
+    def test_replace_existing(self):
+        path = self.write(
+            "links", [File("/bin", linkto="usr/bin"), File("/sbin", linkto="usr/sbin")]
+        )
+        with open(os.path.join(self.dest, "bin"), "wb") as fileobj:
+            fileobj.write(b"in the way")
+        os.mkdir(os.path.join(self.dest, "sbin"))
+        rpmfile.extract_many([path], self.dest, workers=self.workers)
+        rpmfile.extract_many([path], self.dest, workers=self.workers)
+        self.assertEqual(os.readlink(os.path.join(self.dest, "bin")), "usr/bin")
+        self.assertEqual(os.readlink(os.path.join(self.dest, "sbin")), "usr/sbin")
+
+    def test_paths_not_utf8(self):
+        first = self.write("first", [File("/opt/\udcff", b"ff")])
+        second = self.write("second", [File("/opt/\udcfe", b"fe")])
+        rpmfile.extract_many([first, second], self.dest, workers=self.workers)
+        self.assertEqual(self.read("opt", "\udcff"), b"ff")
+        self.assertEqual(self.read("opt", "\udcfe"), b"fe")
+
+    def test_summary(self):
+        paths = [
+            self.write("pkg%d" % i, [File("/opt/pkg%d/data" % i, b"x" * 1000)])
+            for i in range(4)
+        ]
+        results = rpmfile.extract_many(paths, self.dest, workers=self.workers)
+        summary = rpmfile.extract.worker_summary(results)
+        self.assertEqual(sum(packages for _, packages, _, _ in summary), 4)
+        self.assertEqual(sum(size for _, _, size, _ in summary), 4000)
+
+    def test_cli(self):
+        paths = [self.write("demo", FILES), self.write("other", [File("/a", b"a")])]
+        _args, output = main("-x", "-j", "2", "-C", self.dest, *paths)
+        self.assertEqual(len(output["extracted"]), 6)
+        self.assertEqual(self.read("usr", "share", "demo", "big"), FILES[3].data)
+        self.assertEqual(self.read("a"), b"a")
+        with mock.patch("sys.stderr", new_callable=io.StringIO):
+            with self.assertRaises(SystemExit):
+                main("-x", "-C", self.dest, paths[0], "-")
+
+
+class InlineExtractManyTest(ExtractManyTest):
+    workers = 1
+
+
+if __name__ == "__main__":
+    unittest.main()
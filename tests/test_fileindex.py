@@ -0,0 +1,128 @@
+import io
+import os
+import tempfile
+import unittest
+
+import rpmfile
+from rpmfile.fileindex import FileIndex
+
+from tests.synthetic import STRING_ARRAY, File, build_rpm, directory, write_rpms
+
+PACKAGES = {
+    "openssl-libs": build_rpm(
+        [
+            File("/usr/lib64/libssl.so.3", b"ssl"),
+            File("/usr/lib64/libcrypto.so.3", b"crypto"),
+            directory("/usr/lib64/engines-3"),
+            File("/usr/lib64/engines-3/afalg.so", b"afalg"),
+        ],
+        name="openssl-libs",
+    ),
+    "openssl-devel": build_rpm(
+        [
+            File("/usr/lib64/libssl.so", linkto="libssl.so.3"),
+            File("/usr/include/openssl/ssl.h", b"header"),
+        ],
+        name="openssl-devel",
+    ),
+    "filesystem": build_rpm(
+        [directory("/usr/lib64"), directory("/usr/include")], name="filesystem"
+    ),
+    # an old package that lists its files in oldfilenames
+    "old": build_rpm(
+        name="old",
+        extra_tags={
+            "oldfilenames": (
+                STRING_ARRAY,
+                [b"/usr/lib64/libssl.so.3", b"/etc/old.conf"],
+            )
+        },
+    ),
+}
+
+
+class FileIndexTest(unittest.TestCase):
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.top = tempdir.name
+        self.paths = write_rpms(self.top, PACKAGES)
+        self.index = FileIndex.from_paths(self.paths, workers=1)
+
+    def check(self, index):
+        self.assertEqual(len(index), 10)
+        self.assertEqual(
+            index.owners("/usr/lib64/libssl.so.3"),
+            ["openssl-libs-1.0-1.noarch", "old-1.0-1.noarch"],
+        )
+        self.assertEqual(index.owners("/usr/lib64"), ["filesystem-1.0-1.noarch"])
+        self.assertEqual(index.owners("/etc/old.conf"), ["old-1.0-1.noarch"])
+        self.assertEqual(index.owners("/usr/lib64/missing"), [])
+        self.assertEqual(
+            sorted(path for path, _ in index.under("/usr/lib64/")),
+            [
+                "/usr/lib64",
+                "/usr/lib64/engines-3",
+                "/usr/lib64/engines-3/afalg.so",
+                "/usr/lib64/libcrypto.so.3",
+                "/usr/lib64/libssl.so",
+                "/usr/lib64/libssl.so.3",
+                "/usr/lib64/libssl.so.3",
+            ],
+        )
+        self.assertEqual(
+            list(index.under("/usr/include/openssl")),
+            [("/usr/include/openssl/ssl.h", "openssl-devel-1.0-1.noarch")],
+        )
+        self.assertEqual(
+            sorted(index.glob("/usr/lib64/libssl.so*")),
+            [
+                ("/usr/lib64/libssl.so", "openssl-devel-1.0-1.noarch"),
+                ("/usr/lib64/libssl.so.3", "old-1.0-1.noarch"),
+                ("/usr/lib64/libssl.so.3", "openssl-libs-1.0-1.noarch"),
+            ],
+        )
+        self.assertEqual(
+            [path for path, _ in index.glob("/usr/*/*.h")],
+            ["/usr/include/openssl/ssl.h"],
+        )
+
+    def test_queries(self):
+        self.check(self.index)
+
+    def test_snapshot(self):
+        path = os.path.join(self.top, "files.idx")
+        self.index.save(path)
+        self.check(FileIndex.load(path))
+
+    def test_paths_not_utf8(self):
+        names = [b"/opt/\xff", b"/opt/\xfe", b"/opt/\xc3\xa9", b"/opt/\xff/\xff"]
+        headers = [
+            rpmfile.open(fileobj=io.BytesIO(data)).main_headers
+            for data in (
+                build_rpm(
+                    name="p%d" % i,
+                    extra_tags={"oldfilenames": (STRING_ARRAY, [name])},
+                )
+                for i, name in enumerate(names)
+            )
+        ]
+        index = FileIndex.from_headers(headers)
+        self.assertEqual(index.owners("/opt/\udcff"), ["p0-1.0-1.noarch"])
+        self.assertEqual(index.owners("/opt/\udcfe"), ["p1-1.0-1.noarch"])
+        self.assertEqual(index.owners("/opt/\xe9"), ["p2-1.0-1.noarch"])
+        self.assertEqual(len(list(index.under("/opt"))), 4)
+        self.assertEqual(
+            list(index.under("/opt/\udcff")),
+            [
+                ("/opt/\udcff", "p0-1.0-1.noarch"),
+                ("/opt/\udcff/\udcff", "p3-1.0-1.noarch"),
+            ],
+        )
+
+    def test_processes(self):
+        self.check(FileIndex.from_paths(self.paths, workers=2, chunk_size=1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import gzip
+import io
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import rpmfile
+from rpmfile import gzindex
+
+from tests.synthetic import File, build_rpm
+
+rng = random.Random(0)
+FILES = [
+    File("/usr/share/demo/f%d" % i, rng.randbytes(rng.randint(0, 200000)))
+    for i in range(12)
+]
+INTERVAL = 64 * 1024
+
+
+class IndexedGzipFileTest(unittest.TestCase):
+    def setUp(self):
+        self.data = rng.randbytes(100000) + b"\0" * 400000 + rng.randbytes(100000)
+        self.index = gzindex.GzipIndex(INTERVAL)
+        self.fileobj = gzindex.open_gzip(
+            io.BytesIO(gzip.compress(self.data)), self.index
+        )
+
+    def test_read(self):
+        self.assertEqual(self.fileobj.read(), self.data)
+        self.assertGreater(len(self.index), 5)
+
+    def test_random_seeks(self):
+        for offset in [500000, 10, 300000, 599990, 0, 150000, 700000]:
+            self.fileobj.seek(offset)
+            self.assertEqual(self.fileobj.read(1000), self.data[offset : offset + 1000])
+
+    def test_backward_seek_resumes_from_checkpoint(self):
+        self.fileobj.read()
+        calls = []
+        nearest = self.index.nearest
+        self.index.nearest = lambda offset: calls.append(offset) or nearest(offset)
+        self.fileobj.seek(450000)
+        self.assertEqual(self.fileobj.read(10), self.data[450000:450010])
+        self.assertEqual(calls, [450000])
+        # decompression resumed close to the offset instead of at the start
+        decompressed = self.fileobj.raw._out - 450000
+        self.assertLessEqual(decompressed, INTERVAL + gzindex._out_chunk)
+
+    def test_concatenated_members(self):
+        compressed = gzip.compress(b"first") + gzip.compress(b"second") + b"\0" * 8
+        fileobj = gzindex.open_gzip(io.BytesIO(compressed), self.index)
+        self.assertEqual(fileobj.read(), b"firstsecond")
+
+    def test_truncated(self):
+        compressed = gzip.compress(self.data)
+        fileobj = gzindex.open_gzip(
+            io.BytesIO(compressed[: len(compressed) // 2]), self.index
+        )
+        with self.assertRaises(EOFError):
+            fileobj.read()
+
+
+class CheckpointIntervalTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.rpmpath = os.path.join(self.tempdir, "demo.rpm")
+        with open(self.rpmpath, "wb") as fileobj:
+            fileobj.write(build_rpm(FILES))
+        self.sidecar = self.rpmpath + ".idx"
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_random_access(self):
+        with rpmfile.open(self.rpmpath, checkpoint_interval=INTERVAL) as rpm:
+            for entry in reversed(FILES):
+                with rpm.extractfile("." + entry.path) as fileobj:
+                    self.assertEqual(fileobj.read(), entry.data)
+
+    def test_sidecar(self):
+        with rpmfile.open(self.rpmpath, checkpoint_interval=INTERVAL) as rpm:
+            names = [m.name for m in rpm.getmembers()]
+            rpm.save_index(self.sidecar)
+        with rpmfile.open(self.rpmpath, checkpoint_interval=INTERVAL) as rpm:
+            self.assertTrue(rpm.load_index(self.sidecar))
+            self.assertEqual([m.name for m in rpm.getmembers()], names)
+            # members were found without touching the payload
+            self.assertIsNone(rpm._data_file)
+            with rpm.extractfile("." + FILES[7].path) as fileobj:
+                self.assertEqual(fileobj.read(), FILES[7].data)
+
+    def test_stale_sidecar(self):
+        with rpmfile.open(self.rpmpath) as rpm:
+            rpm.save_index(self.sidecar)
+        with open(self.rpmpath, "wb") as fileobj:
+            fileobj.write(build_rpm(FILES[:3], release="2"))
+        with rpmfile.open(self.rpmpath) as rpm:
+            self.assertFalse(rpm.load_index(self.sidecar))
+            self.assertEqual(len(rpm.getmembers()), 3)
+
+    def test_missing_sidecar(self):
+        with rpmfile.open(self.rpmpath) as rpm:
+            self.assertFalse(rpm.load_index(self.sidecar))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import io
+import os
+import tempfile
+import unittest
+
+import rpmfile
+from rpmfile.cli import main
+
+from tests.synthetic import File, build_rpm, compress, cpio, directory
+
+FILES = [
+    directory("/usr/lib/demo"),
+    File("/usr/lib/demo/libdemo.so.1.0", b"\x7fELF" * 300, mode=0o100755),
+    File("/usr/lib/demo/libdemo.so.1", linkto="libdemo.so.1.0"),
+    File("/var/log/demo.log", flags=64),  # %ghost
+    File("/etc/demo.conf", b"x = 1\n", mode=0o100640, flags=1),
+]
+
+
+class HeaderMembersTest(unittest.TestCase):
+    def setUp(self):
+        self.data = build_rpm(FILES, compression="xz")
+
+    def test_matches_payload(self):
+        with rpmfile.open(fileobj=io.BytesIO(self.data)) as rpm:
+            from_header = rpm.getmembers(source="header")
+            self.assertIsNone(rpm._data_file)
+            from_payload = rpm.getmembers()
+        self.assertEqual(
+            [(m.name, m.size, m.mode, bool(m.isdir), m.issymlink) for m in from_header],
+            [
+                (m.name, m.size, m.mode, bool(m.isdir), m.issymlink)
+                for m in from_payload
+            ],
+        )
+        self.assertNotIn("./var/log/demo.log", [m.name for m in from_header])
+        link = [m for m in from_header if m.issymlink][0]
+        self.assertEqual(link.linkname, "libdemo.so.1.0")
+
+    def test_extractfile_header_member(self):
+        with rpmfile.open(fileobj=io.BytesIO(self.data)) as rpm:
+            member = rpm.getmembers(source="header")[0]
+            self.assertIsNone(member.file_start)
+            with rpm.extractfile(member) as fd:
+                self.assertEqual(fd.read(), FILES[1].data)
+
+    def test_source_rpm_names(self):
+        data = build_rpm([File("demo.spec", b"Name: demo\n")], compression="gzip")
+        with rpmfile.open(fileobj=io.BytesIO(data)) as rpm:
+            self.assertEqual(
+                [m.name for m in rpm.getmembers(source="header")], ["demo.spec"]
+            )
+            self.assertEqual([m.name for m in rpm.getmembers()], ["demo.spec"])
+
+    def test_fallback_to_payload(self):
+        payload = compress(cpio(FILES), "gzip")
+        data = build_rpm([], payload=payload)
+        with rpmfile.open(fileobj=io.BytesIO(data)) as rpm:
+            self.assertNotIn("basenames", rpm.headers)
+            self.assertEqual(
+                [m.name for m in rpm.getmembers(source="header")],
+                [m.name for m in rpm.getmembers()],
+            )
+
+    def test_cli_list(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "demo.rpm")
+            with open(path, "wb") as fileobj:
+                fileobj.write(self.data)
+            _args, output = main("-l", path)
+        self.assertEqual(
+            output["list"],
+            [
+                [".", "usr", "lib", "demo", "libdemo.so.1.0"],
+                [".", "usr", "lib", "demo", "libdemo.so.1"],
+                [".", "etc", "demo.conf"],
+            ],
+        )
+
+    def test_invalid_source(self):
+        with rpmfile.open(fileobj=io.BytesIO(self.data)) as rpm:
+            with self.assertRaises(ValueError):
+                rpm.getmembers(source="index")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import io
+import unittest
+
+import rpmfile
+from rpmfile.errors import RPMError
+from rpmfile.headers import extract_data, get_headers, tags
+
+from tests.synthetic import (
+    INT8,
+    INT16,
+    INT32,
+    INT64,
+    STRING_ARRAY,
+    File,
+    build_rpm,
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class HeadersTest(unittest.TestCase):
+    def setUp(self):
+        files = [File("/usr/share/many/%d" % i, b"%d" % i) for i in range(500)]
+        changelog = [(1700000000 - i, "Someone", "- change %d" % i) for i in range(100)]
+        self.data = build_rpm(files, name="many", changelog=changelog)
+
+    def test_lazy_decoding(self):
+        with rpmfile.open(fileobj=io.BytesIO(self.data)) as rpm:
+            self.assertEqual(rpm.headers["name"], b"many")
+            self.assertEqual(rpm.headers.get("arch"), b"noarch")
+            self.assertIn("basenames", rpm.headers)
+            self.assertEqual(sorted(rpm.main_headers._values), ["arch", "name"])
+            self.assertEqual(len(rpm.headers["basenames"]), 500)
+            self.assertIs(rpm.headers["basenames"], rpm.headers["basenames"])
+
+    def test_separate_headers(self):
+        with rpmfile.open(fileobj=io.BytesIO(self.data)) as rpm:
+            self.assertIn("sha256", rpm.signature_headers)
+            self.assertNotIn("sha256", rpm.main_headers)
+            self.assertIn("sha256", rpm.headers)
+            # Both headers define "size", the main header wins when merged
+            self.assertEqual(rpm.headers["size"], rpm.main_headers["size"])
+            self.assertNotEqual(rpm.headers["size"], rpm.signature_headers["size"])
+
+    def test_header_range(self):
+        fileobj = io.BytesIO(self.data)
+        (start, end), headers = get_headers(fileobj)
+        self.assertEqual(fileobj.tell(), end)
+        self.assertEqual(self.data[start : start + 3], b"\x8e\xad\xe8")
+        self.assertEqual(headers["name"], b"many")
+
+    def test_bad_magic(self):
+        data = bytearray(self.data)
+        data[96:99] = b"XXX"
+        with self.assertRaises(RPMError):
+            rpmfile.open(fileobj=io.BytesIO(bytes(data)))
+
+    def test_truncated(self):
+        with self.assertRaises(RPMError):
+            rpmfile.open(fileobj=io.BytesIO(self.data[:200]))
+
+
+class DecodeTest(unittest.TestCase):
+    def setUp(self):
+        self.data = build_rpm(
+            [File("/a", b"a" * 10), File("/b", b"b" * 20)],
+            extra_tags={
+                "longfilesizes": (INT64, [10, 2**40]),
+                "filecolors": (INT8, [1, 2]),
+                "filestates": (INT16, [3]),
+                "fileinodes": (INT32, [1, 2**32 - 1]),
+                "filelangs": (STRING_ARRAY, [b"", b"en"]),
+            },
+        )
+
+    def test_int_types(self):
+        with rpmfile.open(fileobj=io.BytesIO(self.data)) as rpm:
+            self.assertEqual(rpm.headers["longfilesizes"], (10, 2**40))
+            self.assertEqual(rpm.headers["filecolors"], (1, 2))
+            self.assertEqual(rpm.headers["filestates"], 3)
+            self.assertEqual(rpm.headers["fileinodes"], (1, 2**32 - 1))
+
+    def test_getarray(self):
+        with rpmfile.open(fileobj=io.BytesIO(self.data)) as rpm:
+            self.assertEqual(list(rpm.main_headers.getarray("filestates")), [3])
+            self.assertEqual(
+                list(rpm.main_headers.getarray("longfilesizes")), [10, 2**40]
+            )
+            self.assertEqual(rpm.main_headers.getarray("name"), [b"synthetic"])
+            self.assertEqual(rpm.main_headers.getarray("filelangs"), [b"", b"en"])
+
+    @unittest.skipUnless(numpy, "Need numpy")
+    def test_getarray_numpy(self):
+        with rpmfile.open(fileobj=io.BytesIO(self.data)) as rpm:
+            sizes = rpm.main_headers.getarray("longfilesizes", numpy=True)
+            self.assertEqual(sizes.tolist(), [10, 2**40])
+            modes = rpm.main_headers.getarray("filemodes", numpy=True)
+            self.assertEqual(modes.tolist(), [0o100644, 0o100644])
+
+    def test_string_arrays(self):
+        store = b"one\x00two\x00\x00three\x00"
+        self.assertEqual(extract_data(8, 0, 4, store), [b"one", b"two", b"", b"three"])
+        self.assertEqual(extract_data(8, 4, 1, store), [b"two"])
+        self.assertEqual(extract_data(6, 4, 1, store), b"two")
+        with self.assertRaises(RPMError):
+            extract_data(8, 0, 5, store)
+        with self.assertRaises(RPMError):
+            extract_data(5, 20, 1, store)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import rpmfile
+from rpmfile import decompress
+from rpmfile.cli import main
+
+from tests.synthetic import File, build_rpm, directory
+
+FILES = [
+    directory("/usr/share/demo"),
+    File("/usr/share/demo/README", b"read me\n" * 1000),
+    File("/usr/share/demo/empty"),
+    File("/usr/bin/demo", b"\x7fELF" + bytes(range(256)) * 40, mode=0o100755),
+    File("/usr/bin/demo-link", linkto="demo"),
+]
+
+
+class _NoBackwardSeek(object):
+    """Wrap a payload file object and fail on any backward seek"""
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+
+    def seek(self, offset, whence=0):
+        if whence == 0 and offset < self._fileobj.tell():
+            raise AssertionError("backward seek to %d" % offset)
+        if whence == 1 and offset < 0:
+            raise AssertionError("backward seek by %d" % offset)
+        return self._fileobj.seek(offset, whence)
+
+    def __getattr__(self, attr):
+        return getattr(self._fileobj, attr)
+
+
+class IterMembersTest(unittest.TestCase):
+    compression = "gzip"
+
+    def setUp(self):
+        self.data = build_rpm(FILES, compression=self.compression)
+
+    def test_iter_members(self):
+        with rpmfile.open(fileobj=io.BytesIO(self.data)) as rpm:
+            rpm._data_file = _NoBackwardSeek(rpm.data_file)
+            seen = {}
+            for member, fileobj in rpm.iter_members():
+                seen[member.name] = fileobj.read()
+            self.assertEqual(
+                [m.name for m in rpm.getmembers()],
+                [
+                    "./usr/share/demo/README",
+                    "./usr/share/demo/empty",
+                    "./usr/bin/demo",
+                    "./usr/bin/demo-link",
+                ],
+            )
+        for f in FILES:
+            if not f.isdir:
+                self.assertEqual(seen["." + f.path], f.data)
+
+    def test_partial_reads(self):
+        with rpmfile.open(fileobj=io.BytesIO(self.data)) as rpm:
+            for member, fileobj in rpm:
+                if member.name == "./usr/share/demo/README":
+                    self.assertEqual(fileobj.readline(), b"read me\n")
+                    self.assertEqual(fileobj.tell(), 8)
+                elif member.name == "./usr/bin/demo":
+                    self.assertEqual(fileobj.read(4), b"\x7fELF")
+                elif member.name == "./usr/bin/demo-link":
+                    self.assertEqual(fileobj.read(), b"demo")
+
+    def test_iterate_twice(self):
+        with rpmfile.open(fileobj=io.BytesIO(self.data)) as rpm:
+            first = [m.name for m, _ in rpm.iter_members()]
+            second = [m.name for m, _ in rpm.iter_members()]
+            self.assertEqual(first, second)
+
+
+class IterMembersXZTest(IterMembersTest):
+    compression = "xz"
+
+
+class IterMembersBzip2Test(IterMembersTest):
+    compression = "bzip2"
+
+
+@unittest.skipUnless(
+    decompress.zstd or decompress.zstandard, "Need compression.zstd or zstandard"
+)
+class IterMembersZstdTest(IterMembersTest):
+    compression = "zstd"
+
+    def test_streams_payload(self):
+        with rpmfile.open(fileobj=io.BytesIO(self.data)) as rpm:
+            self.assertNotIsInstance(rpm.data_file, io.BytesIO)
+            # Backward seeks restart decompression
+            with rpm.extractfile("./usr/bin/demo") as fd:
+                self.assertEqual(fd.read(), FILES[3].data)
+            with rpm.extractfile("./usr/share/demo/README") as fd:
+                self.assertEqual(fd.read(), FILES[1].data)
+
+
+class ExtractTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.rpmpath = os.path.join(self.tempdir, "demo.rpm")
+        with open(self.rpmpath, "wb") as fileobj:
+            fileobj.write(build_rpm(FILES))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_cli_extract(self):
+        dest = os.path.join(self.tempdir, "root")
+        os.mkdir(dest)
+        _args, output = main("-xC", dest, self.rpmpath)
+        self.assertEqual(len(output["extracted"]), 4)
+        with open(os.path.join(dest, "usr", "bin", "demo"), "rb") as fileobj:
+            self.assertEqual(fileobj.read(), FILES[3].data)
+        self.assertEqual(
+            os.stat(os.path.join(dest, "usr", "bin", "demo")).st_mode & 0o777, 0o755
+        )
+        self.assertEqual(
+            os.readlink(os.path.join(dest, "usr", "bin", "demo-link")), "demo"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
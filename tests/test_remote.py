@@ -0,0 +1,146 @@
+import http.server
+import random
+import re
+import threading
+import unittest
+
+from rpmfile import remote
+from rpmfile.errors import RPMError
+
+from tests.synthetic import File, build_rpm
+
+FILES = [
+    File("/usr/share/demo/f%d" % i, bytes(range(256)) * (i * 400)) for i in range(8)
+]
+# incompressible, so that the payload is many blocks long
+RANDOM = random.Random(0)
+NOISE = [File("/usr/share/noise/f%d" % i, RANDOM.randbytes(16384)) for i in range(8)]
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        if self.path == "/moved.rpm":
+            self.send_response(302)
+            self.send_header("Location", "/demo.rpm")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        self.server.requests += 1
+        match = re.match(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+        if match and self.server.ranges:
+            start, end = int(match.group(1)), int(match.group(2))
+            end = min(end, len(data) - 1)
+            body = data[start : end + 1]
+            self.send_response(206)
+            total = "*" if self.server.unknown_size else str(len(data))
+            self.send_header("Content-Range", "bytes %d-%d/%s" % (start, end, total))
+        else:
+            body = data
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        # counted before the client can have the body
+        self.server.bytes_sent += len(body)
+        self.wfile.write(body)
+
+
+class RemoteTest(unittest.TestCase):
+    def setUp(self):
+        self.data = build_rpm(FILES, compression="xz")
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.blob = random.Random(0).randbytes(20000)
+        self.noise = build_rpm(NOISE)
+        self.server.files = {
+            "/demo.rpm": self.data,
+            "/noise.rpm": self.noise,
+            "/blob": self.blob,
+        }
+        self.server.ranges = True
+        self.server.unknown_size = False
+        self.server.connections = self.server.requests = self.server.bytes_sent = 0
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.pool = remote.ConnectionPool()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(self.pool.close)
+        self.url = "http://127.0.0.1:%d/demo.rpm" % self.server.server_address[1]
+
+    def test_header_only(self):
+        url = self.url.replace("demo", "noise")
+        with remote.open(url, header_only=True, block_size=4096, pool=self.pool) as rpm:
+            self.assertEqual(rpm.headers["name"], b"synthetic")
+            self.assertEqual(len(rpm.getmembers(source="header")), len(NOISE))
+            with self.assertRaises(RPMError):
+                rpm.getmembers(source="payload")
+        self.assertLess(self.server.bytes_sent, rpm.data_offset + 4096)
+        self.assertLess(self.server.bytes_sent, len(self.noise) // 10)
+
+    def test_owns_fileobj(self):
+        with remote.open(self.url, pool=self.pool) as rpm:
+            fileobj = rpm._fileobj
+        self.assertTrue(fileobj.closed)
+
+    def test_unknown_size(self):
+        self.server.unknown_size = True
+        url = self.url.replace("demo.rpm", "blob")
+        fileobj = remote.RangeFile(url, block_size=65536, pool=self.pool)
+        self.assertEqual(fileobj.size, len(self.blob))
+        self.assertEqual(fileobj.read(), self.blob)
+        with self.assertRaisesRegex(RPMError, "size"):
+            remote.RangeFile(url, block_size=1000, pool=self.pool)
+
+    def test_members(self):
+        with remote.open(self.url, block_size=4096, pool=self.pool) as rpm:
+            for entry in reversed(FILES):
+                with rpm.extractfile("." + entry.path) as fileobj:
+                    self.assertEqual(fileobj.read(), entry.data)
+
+    def test_reads(self):
+        url = self.url.replace("demo.rpm", "blob")
+        fileobj = remote.RangeFile(url, block_size=1000, pool=self.pool)
+        self.assertEqual(fileobj.size, len(self.blob))
+        for offset, size in ((5500, 3000), (4500, 4000), (0, 100), (19990, 100)):
+            fileobj.seek(offset)
+            self.assertEqual(fileobj.read(size), self.blob[offset : offset + size])
+        # the first block, blocks 5 to 8 at once, then blocks 4 and the last
+        self.assertEqual(fileobj.requests, 4)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_cache_limit(self):
+        url = self.url.replace("demo.rpm", "blob")
+        fileobj = remote.RangeFile(url, block_size=1000, cache_blocks=2, pool=self.pool)
+        self.assertEqual(fileobj.read(), self.blob)
+        self.assertEqual(len(fileobj._cache), 2)
+
+    def test_no_ranges(self):
+        self.server.ranges = False
+        fileobj = remote.RangeFile(self.url, block_size=1000, pool=self.pool)
+        fileobj.seek(3000)
+        self.assertEqual(fileobj.read(), self.data[3000:])
+        self.assertEqual(self.server.requests, 1)
+
+    def test_redirect(self):
+        fileobj = remote.RangeFile(self.url.replace("demo", "moved"), pool=self.pool)
+        self.assertEqual(fileobj.read(), self.data)
+
+    def test_not_found(self):
+        with self.assertRaises(RPMError):
+            remote.RangeFile(self.url.replace("demo", "missing"), pool=self.pool)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+from unittest import mock
+
+from rpmfile import decompress, repodata
+from rpmfile.rpmdefs import RPMFILE_GHOST, RPMSENSE_EQUAL, RPMSENSE_GREATER
+
+from tests.synthetic import (
+    INT32,
+    STRING_ARRAY,
+    File,
+    build_rpm,
+    directory,
+    write_rpms,
+)
+
+NS = {
+    "common": "http://linux.duke.edu/metadata/common",
+    "rpm": "http://linux.duke.edu/metadata/rpm",
+    "filelists": "http://linux.duke.edu/metadata/filelists",
+    "other": "http://linux.duke.edu/metadata/other",
+    "repo": "http://linux.duke.edu/metadata/repo",
+}
+
+
+def demo(i):
+    return build_rpm(
+        [
+            directory("/etc/demo%d" % i),
+            File("/etc/demo%d/demo.conf" % i, b"x = 1 & y < 2\n"),
+            File("/usr/share/demo%d/data" % i, b"data" * i),
+            File("/var/log/demo%d.log" % i, flags=RPMFILE_GHOST),
+        ],
+        name="demo%d" % i,
+        changelog=[(1700000000, "Someone <someone@example.com> - 1.0-1", "- First")],
+        extra_tags={
+            "provides": (STRING_ARRAY, [b"demo%d" % i, b"libdemo.so.1()(64bit)"]),
+            "provideflags": (INT32, [RPMSENSE_EQUAL, 0]),
+            "provideversion": (STRING_ARRAY, [b"1.0-1", b""]),
+            "requirename": (STRING_ARRAY, [b"rpmlib(PayloadIsXz)", b"bash"]),
+            "requireflags": (
+                INT32,
+                [1 << 24 | RPMSENSE_EQUAL, RPMSENSE_GREATER | RPMSENSE_EQUAL],
+            ),
+            "requireversion": (STRING_ARRAY, [b"5.2-1", b"1:5.0"]),
+        },
+    )
+
+
+class RepodataTest(unittest.TestCase):
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.top = tempdir.name
+        os.makedirs(os.path.join(self.top, "Packages"))
+        packages = {"demo%d" % i: demo(i) for i in range(1, 6)}
+        packages["broken"] = b"not an rpm"
+        write_rpms(os.path.join(self.top, "Packages"), packages)
+
+    def write(self, name, data):
+        with open(os.path.join(self.top, name), "wb") as fileobj:
+            fileobj.write(data)
+
+    def load(self, repomd, kind, compression="gzip"):
+        root = ET.parse(repomd).getroot()
+        for data in root.findall("repo:data", NS):
+            if data.get("type") == kind:
+                href = data.find("repo:location", NS).get("href")
+                with open(os.path.join(self.top, href), "rb") as fileobj:
+                    compressed = fileobj.read()
+                checksum = data.find("repo:checksum", NS).text
+                self.assertEqual(hashlib.sha256(compressed).hexdigest(), checksum)
+                if compression == "gzip":
+                    xml = gzip.decompress(compressed)
+                else:
+                    xml = decompress.open_zstd(io.BytesIO(compressed)).read()
+                opened = data.find("repo:open-checksum", NS).text
+                self.assertEqual(hashlib.sha256(xml).hexdigest(), opened)
+                return ET.fromstring(xml)
+
+    def test_generate(self):
+        repomd, skipped = repodata.generate(self.top, workers=1)
+        self.assertEqual(
+            [os.path.basename(path) for path, _ in skipped], ["broken.rpm"]
+        )
+        primary = self.load(repomd, "primary")
+        self.assertEqual(primary.get("packages"), "5")
+        package = primary.findall("common:package", NS)[1]
+        self.assertEqual(package.find("common:name", NS).text, "demo2")
+        self.assertEqual(
+            package.find("common:location", NS).get("href"), "Packages/demo2.rpm"
+        )
+        with open(os.path.join(self.top, "Packages", "demo2.rpm"), "rb") as fileobj:
+            pkgid = hashlib.sha256(fileobj.read()).hexdigest()
+        self.assertEqual(package.find("common:checksum", NS).text, pkgid)
+        fmt = package.find("common:format", NS)
+        provides = fmt.findall("rpm:provides/rpm:entry", NS)
+        self.assertEqual(
+            [(e.get("name"), e.get("flags"), e.get("ver")) for e in provides],
+            [("demo2", "EQ", "1.0"), ("libdemo.so.1()(64bit)", None, None)],
+        )
+        (requires,) = fmt.findall("rpm:requires/rpm:entry", NS)
+        self.assertEqual(
+            (requires.get("name"), requires.get("flags"), requires.get("epoch")),
+            ("bash", "GE", "1"),
+        )
+        # only /etc files in primary
+        self.assertEqual(
+            [f.text for f in fmt.findall("common:file", NS)],
+            ["/etc/demo2", "/etc/demo2/demo.conf"],
+        )
+
+        filelists = self.load(repomd, "filelists")
+        package = filelists.findall("filelists:package", NS)[1]
+        self.assertEqual(package.get("pkgid"), pkgid)
+        files = {f.text: f.get("type") for f in package.findall("filelists:file", NS)}
+        self.assertEqual(
+            files,
+            {
+                "/etc/demo2": "dir",
+                "/etc/demo2/demo.conf": None,
+                "/usr/share/demo2/data": None,
+                "/var/log/demo2.log": "ghost",
+            },
+        )
+
+        other = self.load(repomd, "other")
+        changelog = other.find("other:package/other:changelog", NS)
+        self.assertEqual(changelog.get("date"), "1700000000")
+        self.assertEqual(changelog.text, "- First")
+
+    def test_processes(self):
+        repomd, _ = repodata.generate(self.top, workers=2, chunk_size=2)
+        names = [
+            p.find("common:name", NS).text
+            for p in self.load(repomd, "primary").findall("common:package", NS)
+        ]
+        self.assertEqual(names, ["demo1", "demo2", "demo3", "demo4", "demo5"])
+
+    def test_paths_not_utf8(self):
+        self.write("Packages/demo1.rpm", build_rpm([File("/opt/\udcff")], name="l1"))
+        repomd, _ = repodata.generate(self.top, workers=1)
+        package = self.load(repomd, "filelists").find("filelists:package", NS)
+        self.assertEqual(
+            [f.text for f in package.findall("filelists:file", NS)], ["/opt/\ufffd"]
+        )
+
+    @unittest.skipIf(
+        decompress.zstd is None and decompress.zstandard is None,
+        "zstandard module not present",
+    )
+    def test_zstd(self):
+        repomd, _ = repodata.generate(self.top, workers=1, compression="zstd")
+        self.assertEqual(self.load(repomd, "other", "zstd").get("packages"), "5")
+
+    def test_cache(self):
+        cache = os.path.join(self.top, "cache.db")
+        repomd, _ = repodata.generate(self.top, workers=1, cache=cache)
+        first = self.load(repomd, "filelists")
+        old = set(os.listdir(os.path.join(self.top, "repodata")))
+        with mock.patch.object(
+            repodata, "package_xml", wraps=repodata.package_xml
+        ) as package_xml:
+            repomd, _ = repodata.generate(self.top, workers=1, cache=cache)
+            self.assertEqual(package_xml.call_count, 1)
+            self.assertEqual(
+                ET.tostring(self.load(repomd, "filelists")), ET.tostring(first)
+            )
+            self.write("Packages/demo3.rpm", demo(33))
+            os.remove(os.path.join(self.top, "Packages", "demo4.rpm"))
+            repomd, _ = repodata.generate(self.top, workers=1, cache=cache)
+            self.assertEqual(package_xml.call_count, 3)
+        names = [
+            p.get("name")
+            for p in self.load(repomd, "filelists").findall("filelists:package", NS)
+        ]
+        self.assertEqual(names, ["demo1", "demo2", "demo33", "demo5"])
+        # the files of the first run are gone
+        self.assertFalse(
+            old & set(os.listdir(os.path.join(self.top, "repodata"))) - {"repomd.xml"}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
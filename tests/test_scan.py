@@ -0,0 +1,93 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from rpmfile import scan
+from rpmfile.cli import main, scan_main
+
+from tests.synthetic import File, build_rpm
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fileobj:
+        fileobj.write(data)
+
+
+class ScanTest(unittest.TestCase):
+    def setUp(self):
+        self.top = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.top)
+        self.cache = os.path.join(self.top, "cache.db")
+        for i in range(5):
+            write(
+                os.path.join(self.top, "repo", "d%d" % (i % 2), "p%d.rpm" % i),
+                build_rpm([File("/f%d" % i, b"data")], name="p%d" % i),
+            )
+        write(os.path.join(self.top, "repo", "README"), b"not an rpm")
+        write(os.path.join(self.top, "repo", "broken.rpm"), b"not an rpm")
+
+    def scan(self, **kwargs):
+        records = scan.scan(
+            os.path.join(self.top, "repo"), cache=self.cache, workers=1, **kwargs
+        )
+        return {os.path.basename(record["path"]): record for record in records}
+
+    def test_records(self):
+        records = self.scan()
+        self.assertEqual(len(records), 6)
+        self.assertEqual(records["p3.rpm"]["name"], "p3")
+        self.assertEqual(records["p3.rpm"]["version"], "1.0")
+        self.assertEqual(len(records["p3.rpm"]["sha256"]), 64)
+        self.assertIn("error", records["broken.rpm"])
+        json.dumps(records)
+
+    def test_cache(self):
+        first = self.scan()
+        with mock.patch.object(scan, "_parse", wraps=scan._parse) as parse:
+            self.assertEqual(self.scan(), first)
+            # only the file that could not be parsed
+            self.assertEqual(parse.call_count, 1)
+            path = os.path.join(self.top, "repo", "d1", "p1.rpm")
+            write(path, build_rpm(name="changed"))
+            os.remove(os.path.join(self.top, "repo", "d0", "p2.rpm"))
+            records = self.scan()
+            self.assertEqual(parse.call_count, 3)
+        self.assertEqual(records["p1.rpm"]["name"], "changed")
+        self.assertNotIn("p2.rpm", records)
+        with scan.ScanCache(self.cache) as cache:
+            self.assertEqual(len(cache.entries()), 4)
+
+    def test_tags(self):
+        self.scan()
+        records = self.scan(tags=["name", "arch"])
+        self.assertEqual(records["p0.rpm"]["arch"], "noarch")
+        self.assertNotIn("version", records["p0.rpm"])
+
+    def test_processes(self):
+        records = scan.scan(os.path.join(self.top, "repo"), workers=2, chunk_size=2)
+        self.assertEqual(len(list(records)), 6)
+
+    def test_cli(self):
+        with mock.patch("builtins.print") as print_:
+            _args, output = scan_main(
+                os.path.join(self.top, "repo"), "-j", "2", "-t", "name"
+            )
+        self.assertEqual(output["scanned"], 6)
+        names = {json.loads(call.args[0]).get("name") for call in print_.mock_calls}
+        self.assertEqual(names, {"p0", "p1", "p2", "p3", "p4", None})
+
+    def test_rpm_named_scan(self):
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.top)
+        shutil.copy(os.path.join("repo", "d0", "p0.rpm"), "scan")
+        with mock.patch("builtins.print"):
+            _args, output = main("-l", "scan")
+        self.assertIn("list", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
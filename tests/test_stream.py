@@ -0,0 +1,91 @@
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import rpmfile
+from rpmfile import decompress
+from rpmfile.cli import main
+
+from tests.synthetic import File, build_rpm, directory
+
+FILES = [
+    directory("/usr/share/demo"),
+    File("/usr/share/demo/README", b"read me\n" * 1000),
+    File("/usr/share/demo/empty"),
+    File("/usr/bin/demo", b"\x7fELF" + bytes(range(256)) * 400, mode=0o100755),
+    File("/usr/bin/demo-link", linkto="demo"),
+]
+COMPRESSIONS = ["gzip", "xz", "bzip2", None]
+if decompress.zstd is not None or decompress.zstandard is not None:
+    COMPRESSIONS.append("zstd")
+
+
+def pipe(data, chunk_size=4096):
+    """Return a non-seekable file object reading `data' from a pipe"""
+    r, w = os.pipe()
+
+    def write():
+        with open(w, "wb", buffering=0) as writer:
+            for i in range(0, len(data), chunk_size):
+                writer.write(data[i : i + chunk_size])
+
+    threading.Thread(target=write, daemon=True).start()
+    return open(r, "rb", buffering=0)
+
+
+class StreamTest(unittest.TestCase):
+    def test_iter_members(self):
+        for compression in COMPRESSIONS:
+            data = build_rpm(FILES, compression=compression)
+            with pipe(data) as fileobj, rpmfile.open(fileobj=fileobj) as rpm:
+                self.assertFalse(fileobj.seekable())
+                self.assertEqual(rpm.headers["name"], b"synthetic")
+                read = {m.name: f.read() for m, f in rpm.iter_members()}
+            self.assertEqual(
+                read,
+                {"." + f.path: f.data for f in FILES if not f.isdir},
+                compression,
+            )
+
+    def test_header_members(self):
+        with pipe(build_rpm(FILES)) as fileobj, rpmfile.open(fileobj=fileobj) as rpm:
+            self.assertEqual(len(rpm.getmembers(source="header")), 4)
+
+    def test_getmembers_then_seek_back(self):
+        with pipe(build_rpm(FILES)) as fileobj, rpmfile.open(fileobj=fileobj) as rpm:
+            self.assertEqual(len(rpm.getmembers()), 4)
+            with self.assertRaises(io.UnsupportedOperation):
+                rpm.extractfile("./usr/share/demo/README").read()
+
+    def test_extractall(self):
+        dest = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dest)
+        with pipe(build_rpm(FILES, compression="xz")) as fileobj:
+            with rpmfile.open(fileobj=fileobj) as rpm:
+                rpm.extractall(dest)
+        with open(os.path.join(dest, "usr", "bin", "demo"), "rb") as fileobj:
+            self.assertEqual(fileobj.read(), FILES[3].data)
+
+    def test_cli_stdin(self):
+        dest = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dest)
+        stdin = mock.Mock(buffer=pipe(build_rpm(FILES)))
+        with mock.patch.object(sys, "stdin", stdin):
+            _args, output = main("-x", "-C", dest, "-")
+        self.assertEqual(len(output["extracted"]), 4)
+        self.assertEqual(
+            os.readlink(os.path.join(dest, "usr", "bin", "demo-link")), "demo"
+        )
+        stdin = mock.Mock(buffer=pipe(build_rpm(FILES)))
+        with mock.patch.object(sys, "stdin", stdin):
+            _args, output = main("-l", "-")
+        self.assertEqual(len(output["list"]), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,6 +9,8 @@ import unittest
 import rpmfile
 import io
 
+from rpmfile.io_extra import _copyfileobj
+
 
 class Test(unittest.TestCase):
     def test_seek(self):
@@ -43,6 +45,53 @@ class Test(unittest.TestCase):
         sub.seek(0)
         self.assertEqual(sub.read(10), b"llo ")
 
+    def test_readinto(self):
+        fd = io.BytesIO(b"Hello world")
+        sub = rpmfile._SubFile(fd, start=2, size=4)
+
+        buf = bytearray(3)
+        self.assertEqual(sub.readinto(buf), 3)
+        self.assertEqual(buf, b"llo")
+        self.assertEqual(sub.readinto(buf), 1)
+        self.assertEqual(buf[:1], b" ")
+        self.assertEqual(sub.readinto(buf), 0)
+
+    def test_io_protocol(self):
+        fd = io.BytesIO(b"xxline one\nline two\nyy")
+        sub = rpmfile._SubFile(fd, start=2, size=18)
+
+        self.assertIsInstance(sub, io.RawIOBase)
+        self.assertTrue(sub.readable())
+        self.assertTrue(sub.seekable())
+        self.assertEqual(sub.read(0), b"")
+        self.assertEqual(sub.readlines(), [b"line one\n", b"line two\n"])
+
+        sub.seek(0)
+        buffered = io.BufferedReader(sub, 4)
+        self.assertEqual(buffered.readline(), b"line one\n")
+        self.assertEqual(buffered.read(), b"line two\n")
+
+    def test_skips_redundant_seeks(self):
+        seeks = []
+
+        class Recorder(io.BytesIO):
+            def seek(self, *args):
+                seeks.append(args)
+                return super(Recorder, self).seek(*args)
+
+        sub = rpmfile._SubFile(Recorder(b"Hello world"), start=2, size=8)
+        del seeks[:]
+        for _ in range(4):
+            sub.read(2)
+        self.assertEqual(len(seeks), 1)
+
+    def test_copyfileobj(self):
+        fd = io.BytesIO(bytes(range(256)) * 100)
+        sub = rpmfile._SubFile(fd, start=10, size=20000)
+        out = io.BytesIO()
+        _copyfileobj(sub, out, 4096)
+        self.assertEqual(out.getvalue(), fd.getvalue()[10:20010])
+
 
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testSeek']
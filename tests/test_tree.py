@@ -0,0 +1,95 @@
+import io
+import unittest
+
+import rpmfile
+
+from tests.synthetic import File, build_rpm, compress, cpio, directory
+
+FILES = [
+    directory("/usr/share/doc/demo"),
+    File("/usr/bin/demo", b"binary", mode=0o100755),
+    File("/usr/bin/demo-helper", b"helper", mode=0o100755),
+    File("/usr/share/doc/demo/README", b"readme"),
+    File("/usr/share/doc/demo/NEWS", b"news"),
+    File("/usr/share/man/man1/demo.1.gz", b"man"),
+]
+
+
+class TreeTest(unittest.TestCase):
+    def setUp(self):
+        self.rpm = rpmfile.open(fileobj=io.BytesIO(build_rpm(FILES)))
+
+    def tearDown(self):
+        self.rpm.__exit__()
+
+    def test_getmember_last_occurrence_wins(self):
+        files = [File("/a", b"first"), File("/b", b"b"), File("/a", b"second")]
+        data = build_rpm(files)
+        with rpmfile.open(fileobj=io.BytesIO(data)) as rpm:
+            with rpm.extractfile("./a") as fd:
+                self.assertEqual(fd.read(), b"second")
+            with self.assertRaises(KeyError):
+                rpm.getmember("./c")
+
+    def test_exists(self):
+        for path in ("/usr/bin/demo", "./usr/bin/demo", "usr/bin/demo", "/usr"):
+            self.assertTrue(self.rpm.exists(path), path)
+        self.assertTrue(self.rpm.exists("/usr/share/doc/demo/"))
+        self.assertFalse(self.rpm.exists("/usr/bin/other"))
+        self.assertFalse(self.rpm.exists("/etc"))
+        # answered from the header, the payload is never decompressed
+        self.assertIsNone(self.rpm._data_file)
+
+    def test_listdir(self):
+        self.assertEqual(self.rpm.listdir("/usr"), ["share", "bin"])
+        self.assertEqual(self.rpm.listdir("/usr/bin"), ["demo", "demo-helper"])
+        self.assertEqual(self.rpm.listdir(), ["usr"])
+        with self.assertRaises(FileNotFoundError):
+            self.rpm.listdir("/etc")
+        with self.assertRaises(NotADirectoryError):
+            self.rpm.listdir("/usr/bin/demo")
+
+    def test_walk(self):
+        walked = list(self.rpm.walk("/usr/share"))
+        self.assertEqual(
+            walked,
+            [
+                ("/usr/share", ["doc", "man"], []),
+                ("/usr/share/doc", ["demo"], []),
+                ("/usr/share/doc/demo", [], ["README", "NEWS"]),
+                ("/usr/share/man", ["man1"], []),
+                ("/usr/share/man/man1", [], ["demo.1.gz"]),
+            ],
+        )
+        pruned = []
+        for dirpath, dirnames, filenames in self.rpm.walk("."):
+            pruned.append(dirpath)
+            if "share" in dirnames:
+                dirnames.remove("share")
+        self.assertEqual(pruned, [".", "./usr", "./usr/bin"])
+
+    def test_glob(self):
+        self.assertEqual(
+            self.rpm.glob("/usr/bin/demo*"), ["/usr/bin/demo", "/usr/bin/demo-helper"]
+        )
+        self.assertEqual(
+            sorted(self.rpm.glob("./usr/share/*/*/[A-Z]*")),
+            [
+                "./usr/share/doc/demo/NEWS",
+                "./usr/share/doc/demo/README",
+            ],
+        )
+        self.assertEqual(self.rpm.glob("usr/*/man1/*.gz"), [])
+        self.assertEqual(
+            self.rpm.glob("usr/share/man/man?/*.gz"), ["usr/share/man/man1/demo.1.gz"]
+        )
+
+    def test_without_file_tables(self):
+        data = build_rpm([], payload=compress(cpio(FILES), "gzip"))
+        with rpmfile.open(fileobj=io.BytesIO(data)) as rpm:
+            self.assertTrue(rpm.exists("/usr/share/doc/demo/NEWS"))
+            self.assertEqual(rpm.listdir("/usr/share"), ["doc", "man"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import rpmfile
+from rpmfile.cli import main
+from rpmfile.errors import RPMError
+
+from tests.synthetic import STRING_ARRAY, File, build_rpm
+from tests.test_stream import COMPRESSIONS, pipe
+
+FILES = [
+    File("/usr/share/demo/README", b"read me\n" * 1000),
+    File("/usr/bin/demo", bytes(range(256)) * 400, mode=0o100755),
+]
+WRONG = {"payloaddigest": (STRING_ARRAY, [b"0" * 64])}
+
+
+class CountingIO(io.BytesIO):
+    """A BytesIO counting the bytes read from it"""
+
+    bytes_read = 0
+
+    def read(self, size=-1):
+        data = super(CountingIO, self).read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def readinto(self, b):
+        n = super(CountingIO, self).readinto(b)
+        self.bytes_read += n
+        return n
+
+
+class VerifyTest(unittest.TestCase):
+    def members(self, data, **kwargs):
+        with rpmfile.open(fileobj=io.BytesIO(data), verify=True, **kwargs) as rpm:
+            return {m.name: f.read() for m, f in rpm.iter_members()}
+
+    def test_verify(self):
+        for compression in COMPRESSIONS:
+            data = build_rpm(FILES, compression=compression)
+            self.assertEqual(len(self.members(data)), 2, compression)
+
+    def test_decompressor_tools(self):
+        for compression in COMPRESSIONS:
+            data = build_rpm(FILES, compression=compression)
+            self.assertEqual(len(self.members(data, decompressor="auto")), 2)
+            data = build_rpm(FILES, compression=compression, extra_tags=WRONG)
+            with self.assertRaises(RPMError):
+                self.members(data, decompressor="auto")
+
+    def test_mismatch(self):
+        for compression in COMPRESSIONS:
+            data = build_rpm(FILES, compression=compression, extra_tags=WRONG)
+            with self.assertRaisesRegex(RPMError, "payload digest mismatch"):
+                self.members(data)
+
+    def test_gzip_index(self):
+        data = build_rpm(FILES, extra_tags=WRONG)
+        with self.assertRaises(RPMError):
+            self.members(data, checkpoint_interval=1024)
+
+    def test_no_extra_reads(self):
+        for compression in COMPRESSIONS:
+            data = build_rpm(FILES, compression=compression)
+            counts = []
+            for verify in (False, True):
+                fileobj = CountingIO(data)
+                with rpmfile.open(fileobj=fileobj, verify=verify) as rpm:
+                    for _ in rpm.iter_members():
+                        pass
+                counts.append(fileobj.bytes_read)
+            self.assertEqual(counts[0], counts[1], compression)
+
+    def test_stream(self):
+        with pipe(build_rpm(FILES, extra_tags=WRONG)) as fileobj:
+            with rpmfile.open(fileobj=fileobj, verify=True) as rpm:
+                with self.assertRaises(RPMError):
+                    for _ in rpm.iter_members():
+                        pass
+
+    def test_verify_payload(self):
+        with rpmfile.open(fileobj=io.BytesIO(build_rpm(FILES))) as rpm:
+            rpm.verify_payload()
+        data = build_rpm(FILES, extra_tags=WRONG)
+        with rpmfile.open(fileobj=io.BytesIO(data)) as rpm:
+            with self.assertRaises(RPMError):
+                rpm.verify_payload()
+
+    def test_cli(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        good = os.path.join(tempdir, "good.rpm")
+        bad = os.path.join(tempdir, "bad.rpm")
+        with open(good, "wb") as fileobj:
+            fileobj.write(build_rpm(FILES))
+        with open(bad, "wb") as fileobj:
+            fileobj.write(build_rpm(FILES, extra_tags=WRONG))
+        _args, output = main("-x", "--verify", "-C", tempdir, good)
+        self.assertEqual(len(output["extracted"]), 2)
+        with self.assertRaises(RPMError):
+            main("-x", "--verify", "-C", tempdir, bad)
+        with self.assertRaises(RPMError):
+            main("-x", "--verify", "-j", "1", "-C", tempdir, good, bad)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import random
+import unittest
+
+from rpmfile.version import EVR, latest, rpmvercmp, version_key
+
+CASES = [
+    ("1.0", "1.0", 0),
+    ("1.0", "2.0", -1),
+    ("2.0.1", "2.0", 1),
+    ("1.0010", "1.9", 1),
+    ("1.05", "1.5", 0),
+    ("1.0a", "1.0", 1),
+    ("1.0", "1.0a", -1),
+    ("a", "1", -1),
+    ("1.0~rc1", "1.0", -1),
+    ("1.0~rc1", "1.0~rc2", -1),
+    ("1.0~~", "1.0~", -1),
+    ("1.0^git1", "1.0", 1),
+    ("1.0^git1", "1.0.1", -1),
+    ("1.0^", "1.0", 1),
+    ("1.0^", "1.0~", 1),
+    ("1_0", "1.0", 0),
+    ("1.0.", "1.0", 0),
+    ("fc4", "fc.4", 0),
+    ("xyz10", "xyz.4", 1),
+    ("2.0é1", "2.0.1", 0),
+]
+
+
+def cmp(a, b):
+    return (a > b) - (a < b)
+
+
+class VersionTest(unittest.TestCase):
+    def test_rpmvercmp(self):
+        for a, b, expected in CASES:
+            self.assertEqual(rpmvercmp(a, b), expected, (a, b))
+            self.assertEqual(rpmvercmp(b, a), -expected, (b, a))
+
+    def test_keys(self):
+        for a, b, expected in CASES:
+            self.assertEqual(cmp(version_key(a), version_key(b)), expected, (a, b))
+        rng = random.Random(0)
+        alphabet = "01a9bZ.~^_-"
+        for _ in range(5000):
+            a = "".join(rng.choice(alphabet) for _ in range(rng.randrange(6)))
+            b = "".join(rng.choice(alphabet) for _ in range(rng.randrange(6)))
+            self.assertEqual(
+                cmp(version_key(a), version_key(b)), rpmvercmp(a, b), (a, b)
+            )
+
+    def test_evr(self):
+        evr = EVR.parse("2:1.0-3.fc40")
+        self.assertEqual((evr.epoch, evr.version, evr.release), (2, "1.0", "3.fc40"))
+        self.assertEqual(str(evr), "2:1.0-3.fc40")
+        self.assertEqual(str(EVR.parse("1.0")), "1.0")
+        self.assertEqual(EVR.parse("0:1.05-1"), EVR.parse("1.5-1"))
+        self.assertEqual(
+            [
+                str(e)
+                for e in sorted(
+                    EVR.parse(s)
+                    for s in ["1:0.1-1", "1.0-10", "1.0-9", "1.0~rc1-1", "1.0-9.1"]
+                )
+            ],
+            ["1.0~rc1-1", "1.0-9", "1.0-9.1", "1.0-10", "1:0.1-1"],
+        )
+
+    def test_latest(self):
+        packages = [
+            ("bash", "5.1-1", "bash-5.1"),
+            ("zsh", "5.9-1", "zsh-5.9"),
+            ("bash", "5.2-1", "bash-5.2"),
+            ("bash", "5.0-1", "bash-5.0"),
+            ("bash", "1:4.0-1", "bash-4.0"),
+            ("acl", EVR(None, "2.3", "1"), "acl-2.3"),
+        ]
+        self.assertEqual(
+            [p[2] for p in latest(packages)], ["acl-2.3", "bash-4.0", "zsh-5.9"]
+        )
+        self.assertEqual(
+            [p[2] for p in latest(packages, keep=2)],
+            ["acl-2.3", "bash-4.0", "bash-5.2", "zsh-5.9"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
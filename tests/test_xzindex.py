@@ -0,0 +1,95 @@
+import io
+import lzma
+import random
+import unittest
+
+import rpmfile
+from rpmfile import xzindex
+from rpmfile.errors import RPMError
+
+from tests.synthetic import File, build_rpm, cpio, xz_blocks
+
+rng = random.Random(0)
+FILES = [
+    File("/usr/share/demo/f%d" % i, rng.randbytes(rng.randint(0, 50000)) * 2)
+    for i in range(20)
+]
+BLOCK_SIZE = 64 * 1024
+
+
+def multiblock_rpm(files, block_size=BLOCK_SIZE):
+    return build_rpm(
+        files, compression="xz", payload=xz_blocks(cpio(files), block_size)
+    )
+
+
+class ReadIndexTest(unittest.TestCase):
+    def test_blocks(self):
+        data = rng.randbytes(300000)
+        compressed = xz_blocks(data, BLOCK_SIZE)
+        blocks = xzindex.read_index(io.BytesIO(compressed), len(compressed))
+        self.assertEqual(len(blocks), 5)
+        self.assertEqual(
+            [block.uncompressed_offset for block in blocks],
+            list(range(0, 300000, BLOCK_SIZE)),
+        )
+        self.assertEqual(sum(block.uncompressed_size for block in blocks), 300000)
+
+    def test_concatenated_streams(self):
+        compressed = (
+            lzma.compress(b"first") + b"\0" * 4 + xz_blocks(b"second" * 1000, 1000)
+        )
+        blocks = xzindex.read_index(io.BytesIO(compressed), len(compressed))
+        self.assertEqual(len(blocks), 7)
+        fileobj = xzindex.open_xz(io.BytesIO(compressed), threads=2)
+        self.assertEqual(fileobj.read(), b"first" + b"second" * 1000)
+
+    def test_not_xz(self):
+        with self.assertRaises(RPMError):
+            xzindex.read_index(io.BytesIO(b"\1" * 100), 100)
+
+    def test_corrupt_block(self):
+        data = rng.randbytes(200000)
+        compressed = bytearray(xz_blocks(data, BLOCK_SIZE))
+        compressed[100000] ^= 0xFF
+        fileobj = xzindex.open_xz(io.BytesIO(bytes(compressed)), threads=2)
+        with self.assertRaises(RPMError):
+            fileobj.read()
+
+
+class ParallelXZTest(unittest.TestCase):
+    def test_members(self):
+        with rpmfile.open(fileobj=io.BytesIO(multiblock_rpm(FILES)), threads=4) as rpm:
+            self.assertIsInstance(rpm.data_file.raw, xzindex._ParallelXZFile)
+            self.assertEqual(len(rpm.getmembers()), len(FILES))
+            # random access jumps between blocks
+            for entry in reversed(FILES):
+                with rpm.extractfile("." + entry.path) as fileobj:
+                    self.assertEqual(fileobj.read(), entry.data)
+            data = {"." + entry.path: entry.data for entry in FILES}
+            for member, fileobj in rpm.iter_members():
+                self.assertEqual(fileobj.read(), data[member.name])
+
+    def test_small_readahead(self):
+        data = rng.randbytes(500000)
+        compressed = xz_blocks(data, BLOCK_SIZE)
+        fileobj = io.BytesIO(compressed)
+        blocks = xzindex.read_index(fileobj, len(compressed))
+        reader = xzindex._ParallelXZFile(fileobj, blocks, 4, readahead=1)
+        self.assertEqual(io.BufferedReader(reader).read(), data)
+
+    def test_single_thread(self):
+        with rpmfile.open(fileobj=io.BytesIO(multiblock_rpm(FILES)), threads=1) as rpm:
+            self.assertIsInstance(rpm.data_file, lzma.LZMAFile)
+            self.assertEqual(len(rpm.getmembers()), len(FILES))
+
+    def test_single_block(self):
+        with rpmfile.open(
+            fileobj=io.BytesIO(build_rpm(FILES, compression="xz")), threads=4
+        ) as rpm:
+            self.assertIsInstance(rpm.data_file, lzma.LZMAFile)
+            self.assertEqual(len(rpm.getmembers()), len(FILES))
+
+
+if __name__ == "__main__":
+    unittest.main()